@@ -0,0 +1,395 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+采集录制与回放
+Hook 的性能只能在装了千牛的 Windows 电脑上现场观察。这里把采集到的原始内容连同时间录下来，
+之后在任何机器上（包括 Linux）用假剪贴板/假聊天窗口按原速或 N 倍速重放，走完整的
+HookEngine -> MessagePipeline -> 存储 流程，统计端到端延迟分位数、丢失/丢弃数和吞吐量，
+修改采集、解析或保存逻辑后可以离线对比。
+
+录制：HookSettings(capture_record_file='qianniu_capture_events.jsonl')，
+QianNiuHookStd / SimpleQianNiuHook 等所有走 HookEngine.run 的采集都会被记录，每行一个事件：
+    {"t": 相对录制开始的秒数, "kind": "clipboard" | "window_text",
+     "source": ..., "record_type": ..., "content": 采集内容, "reset": 窗口文本是否切换了会话}
+窗口文本的 content 是原样的新增部分，同一段记录依次拼接就是窗口全文，回放时按此重建假窗口。
+回放产生的记录、消息和去重索引默认写到临时目录（回放结束后删除），不会碰到 Hook 正在使用的文件。
+
+回放时的延迟：
+    capture    - 写入假剪贴板/假窗口 到 采集循环读到内容
+    end_to_end - 写入 到 流水线解析、去重并把消息分发到各个输出队列
+没被读到的事件计为 missed：剪贴板在读取前又被覆盖（内容丢失）；
+窗口文本则是两次轮询之间的多次追加被合并成一次读到（内容不丢失）。
+被满队列策略丢掉的记录计为 dropped。
+
+用法：
+    python capture_replay.py replay qianniu_capture_events.jsonl --speed 10
+    python capture_replay.py replay qianniu_capture_events.jsonl --speed 0 --queue-policy drop_newest --json report.json
+    python capture_replay.py synthesize synthetic_events.jsonl --events 500 --interval 0.2
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+from chat_format import qianniu_clipboard_detector, simple_chat_detector
+from clipboard_watcher import FakeClipboardBackend
+from hook_core import CaptureBackend, ClipboardCapture, HookEngine, HookSettings, WindowTextCapture
+from message_pipeline import POLICIES, POLICY_BLOCK
+from message_store import JsonlMessageStore, iter_messages
+
+DEFAULT_RECORD_FILE = "qianniu_capture_events.jsonl"
+
+KIND_CLIPBOARD = 'clipboard'
+KIND_WINDOW_TEXT = 'window_text'
+
+# 回放时按 record_type 选择与原 Hook 相同的格式判断
+DETECTORS = {
+    'qianniu_chat': qianniu_clipboard_detector,   # QianNiuHookStd
+    'text': simple_chat_detector,                 # SimpleQianNiuHook
+}
+
+PERCENTILES = [50, 90, 99]
+
+
+class CaptureRecorder:
+    """把采集循环读到的原始内容追加写入JSONL文件"""
+
+    def __init__(self, filename=DEFAULT_RECORD_FILE, fsync_every=20):
+        self.filename = filename
+        self.store = JsonlMessageStore(filename, fsync_every=fsync_every)
+        self.started = time.monotonic()
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def record(self, capture, content):
+        """记录一次采集（在格式判断之前调用）"""
+        event = {
+            't': round(time.monotonic() - self.started, 4),
+            'kind': KIND_WINDOW_TEXT if isinstance(capture, WindowTextCapture) else KIND_CLIPBOARD,
+            'source': capture.source,
+            'record_type': capture.record_type,
+            'content': content,
+        }
+        if isinstance(capture, WindowTextCapture):
+            event['reset'] = capture.metadata()['reset']
+        with self._lock:
+            self.store.append(event)
+            self.count += 1
+
+    def close(self):
+        self.store.close()
+
+
+class _FakeClipboard(FakeClipboardBackend):
+    """
+    回放用的假剪贴板：写入时同时记下事件编号，
+    读取时文本和事件编号在同一把锁里取出，不会把读到的内容算到后一个事件上
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._event = None
+        self.read_event = None
+
+    def show(self, event, index):
+        with self._condition:
+            self._text = event['content']
+            self._event = index
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def read_text(self):
+        with self._condition:
+            self.read_event = self._event
+            return self._text
+
+
+class _FakeWindow:
+    """
+    回放用的聊天窗口：保存当前这段记录的全部新增文本，读取时拼成全文
+    （轮询之间追加了几次都能完整读到，与真实窗口一致）；read_event 是读到的最后一个事件编号
+    """
+
+    def __init__(self):
+        self._parts = []
+        self._text = None
+        self._event = None
+        self.read_event = None
+        self._lock = threading.Lock()
+
+    def show(self, event, index):
+        with self._lock:
+            if event.get('reset', False):
+                self._parts = []
+            self._parts.append(event['content'])
+            self._text = None
+            self._event = index
+
+    def read_text(self):
+        with self._lock:
+            if self._text is None:
+                self._text = ''.join(self._parts)
+            self.read_event = self._event
+            return self._text
+
+
+class _ReplayCapture(CaptureBackend):
+    """包装真实的采集后端，记下每次读到的是第几个回放事件（由假剪贴板/假窗口在读取时给出）"""
+
+    def __init__(self, capture, fake, player):
+        self.capture = capture
+        self.fake = fake
+        self.player = player
+        self.source = capture.source
+        self.record_type = capture.record_type
+        self.event = None
+
+    def read(self, timeout):
+        captured = self.capture.read(timeout)
+        if captured is not None:
+            self.event = self.fake.read_event
+            self.player.captured_at.setdefault(self.event, time.perf_counter())
+        return captured
+
+    def metadata(self):
+        extra = dict(self.capture.metadata() or {})
+        extra['replay_event'] = self.event
+        return extra
+
+
+class _Player:
+    """回放状态：各事件各阶段的时间（time.perf_counter）"""
+
+    def __init__(self):
+        self.injected_at = {}
+        self.captured_at = {}
+        self.processed_at = {}
+        self.new_messages = 0
+
+    def on_processed(self, record, new_messages):
+        event = record.get('replay_event')
+        if event is not None:
+            self.processed_at.setdefault(event, time.perf_counter())
+        self.new_messages += len(new_messages)
+
+
+def load_events(filename=DEFAULT_RECORD_FILE):
+    """读取录制的事件，按时间排序"""
+    return sorted(iter_messages(filename), key=lambda event: event.get('t', 0))
+
+
+def latency_summary(seconds):
+    """延迟列表（秒）-> 分位数（毫秒），按最近秩取分位"""
+    if not seconds:
+        return {'count': 0}
+    ordered = sorted(seconds)
+    summary = {'count': len(ordered)}
+    for percentile in PERCENTILES:
+        rank = max(1, -(-len(ordered) * percentile // 100))
+        summary[f'p{percentile}'] = round(ordered[rank - 1] * 1000, 2)
+    summary['max'] = round(ordered[-1] * 1000, 2)
+    summary['avg'] = round(sum(ordered) / len(ordered) * 1000, 2)
+    return summary
+
+
+def replay_settings(output_dir, **options):
+    """回放用的 HookSettings：记录、消息和去重索引都写到 output_dir"""
+    os.makedirs(output_dir, exist_ok=True)
+    options.setdefault('messages_file', os.path.join(output_dir, 'messages.jsonl'))
+    options.setdefault('chat_file', os.path.join(output_dir, 'chat_messages.jsonl'))
+    options.setdefault('index_file', os.path.join(output_dir, 'chat_messages.idx'))
+    return HookSettings(**options)
+
+
+def _create_capture(kind, first_event, poll_interval):
+    """返回 (采集后端, 假剪贴板/假窗口, 格式判断)"""
+    source = first_event.get('source', kind)
+    record_type = first_event.get('record_type', 'text')
+    if kind == KIND_WINDOW_TEXT:
+        window = _FakeWindow()
+        capture = WindowTextCapture(window.read_text, poll_interval)
+        capture.source = source
+        capture.record_type = record_type
+        return capture, window, None
+
+    backend = _FakeClipboard()
+    capture = ClipboardCapture(backend, source, record_type)
+    return capture, backend, DETECTORS.get(record_type)
+
+
+def replay_events(events, speed=1.0, settings=None, grace=None, **options):
+    """
+    把录制的事件按时间重放进完整的 HookEngine 流水线，返回统计字典
+    speed：回放倍速，0 表示不等待、尽快注入（测最大吞吐）
+    settings：为 None 时在临时目录中回放（options 传给 replay_settings），结束后删除该目录，
+              返回结果中的 messages_file/chat_file 为 None
+    grace：注入完最后一个事件后，最多再等多少秒让采集循环读到它
+    """
+    if settings is None:
+        with tempfile.TemporaryDirectory(prefix='qianniu_replay_') as output_dir:
+            report = replay_events(events, speed, replay_settings(output_dir, **options), grace)
+        if report is not None:
+            report['messages_file'] = report['chat_file'] = None
+        return report
+
+    events = list(events)
+    if not events:
+        print("没有可回放的事件")
+        return None
+    kinds = {event.get('kind', KIND_CLIPBOARD) for event in events}
+    if len(kinds) > 1:
+        print(f"一次只能回放一种采集方式的事件，文件中有: {', '.join(sorted(kinds))}")
+        return None
+    kind = kinds.pop()
+
+    if grace is None:
+        grace = settings.poll_interval * 2 + 0.5
+    player = _Player()
+    engine = HookEngine(settings)
+    engine.pipeline.on_processed = player.on_processed
+    capture, fake, accept = _create_capture(kind, events[0], settings.poll_interval)
+    engine.start(_ReplayCapture(capture, fake, player), accept)
+
+    base = events[0].get('t', 0)
+    started = time.perf_counter()
+    for index, event in enumerate(events):
+        if speed:
+            delay = started + (event.get('t', 0) - base) / speed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        player.injected_at[index] = time.perf_counter()
+        fake.show(event, index)
+
+    # 等采集循环读到最后一个事件（剪贴板可能已被覆盖，最多等 grace 秒）
+    deadline = time.perf_counter() + grace
+    last = len(events) - 1
+    while last not in player.captured_at and time.perf_counter() < deadline:
+        time.sleep(0.005)
+    engine.stop()
+    finished = time.perf_counter()
+
+    pipeline_stats = engine.stats()
+    dropped = sum(queue['dropped'] for queue in pipeline_stats['queues'].values())
+    capture_latency = [player.captured_at[i] - player.injected_at[i] for i in player.captured_at]
+    end_to_end = [player.processed_at[i] - player.injected_at[i] for i in player.processed_at]
+    last_processed = max(player.processed_at.values(), default=finished)
+    duration = max(last_processed - started, 1e-9)
+    return {
+        'kind': kind,
+        'speed': speed,
+        'events': len(events),
+        'captured': len(player.captured_at),
+        'missed': len(events) - len(player.captured_at),
+        'rejected': engine.rejected,
+        'dropped': dropped,
+        'processed': pipeline_stats['processed'],
+        'messages': pipeline_stats['parsed_messages'],
+        'new_messages': player.new_messages,
+        'errors': pipeline_stats['errors'],
+        'duration': round(duration, 3),
+        'events_per_second': round(pipeline_stats['processed'] / duration, 1),
+        'messages_per_second': round(pipeline_stats['parsed_messages'] / duration, 1),
+        'latency_ms': {
+            'capture': latency_summary(capture_latency),
+            'end_to_end': latency_summary(end_to_end),
+        },
+        'pipeline': pipeline_stats,
+        'messages_file': settings.messages_file,
+        'chat_file': settings.chat_file,
+    }
+
+
+def replay_file(filename, speed=1.0, settings=None, grace=None, **options):
+    return replay_events(load_events(filename), speed, settings, grace, **options)
+
+
+def format_report(report):
+    """回放结果的文本汇总"""
+    missed_label = '合并读到' if report['kind'] == KIND_WINDOW_TEXT else '未读到'
+    lines = [f"回放 {report['events']} 个{report['kind']}事件（{report['speed'] or '不限'}倍速），"
+             f"用时 {report['duration']}s",
+             f"读到: {report['captured']}  {missed_label}: {report['missed']}  格式不符: {report['rejected']}  "
+             f"队列丢弃: {report['dropped']}  出错: {report['errors']}",
+             f"处理记录: {report['processed']} ({report['events_per_second']}/s)  "
+             f"解析消息: {report['messages']} ({report['messages_per_second']}/s)  新消息: {report['new_messages']}"]
+    for name, summary in report['latency_ms'].items():
+        if not summary['count']:
+            lines.append(f"{name:<11} 无数据")
+            continue
+        lines.append(f"{name:<11} " + '  '.join(f"p{p}={summary[f'p{p}']}ms" for p in PERCENTILES) +
+                     f"  max={summary['max']}ms  avg={summary['avg']}ms")
+    return '\n'.join(lines)
+
+
+def generate_events(count, interval=0.5, kind=KIND_CLIPBOARD, lines_per_event=20, window_lines=200, seed=0):
+    """
+    用合成聊天记录生成录制事件，没有真实录制时用于回放
+    clipboard：每次复制最近 window_lines 行（整窗复制，内容大量重叠）
+    window_text：每次只有新增的 lines_per_event 行（除第一次外以换行开头，依次拼接即窗口全文）
+    """
+    from synthetic_chat import iter_transcript_lines
+    lines = list(iter_transcript_lines(count * lines_per_event, seed))
+    events = []
+    for index in range(count):
+        end = (index + 1) * lines_per_event
+        event = {'t': round(index * interval, 4), 'kind': kind}
+        if kind == KIND_WINDOW_TEXT:
+            content = '\r\n'.join(lines[end - lines_per_event:end])
+            event.update(source=KIND_WINDOW_TEXT, record_type='new_message',
+                         content=content if index == 0 else '\r\n' + content, reset=index == 0)
+        else:
+            event.update(source=KIND_CLIPBOARD, record_type='qianniu_chat',
+                         content='\r\n'.join(lines[max(0, end - window_lines):end]))
+        events.append(event)
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hook采集录制回放")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = subparsers.add_parser('replay', help='回放录制的采集事件并统计延迟和吞吐')
+    replay_parser.add_argument('filename', nargs='?', default=DEFAULT_RECORD_FILE)
+    replay_parser.add_argument('--speed', type=float, default=1.0, help='回放倍速，0 表示尽快注入')
+    replay_parser.add_argument('--output-dir', help='回放产生的记录/消息/索引文件目录，默认临时目录（回放后删除）')
+    replay_parser.add_argument('--poll-interval', type=float, default=0.5)
+    replay_parser.add_argument('--queue-depth', type=int, default=1000)
+    replay_parser.add_argument('--queue-policy', choices=POLICIES, default=POLICY_BLOCK)
+    replay_parser.add_argument('--no-parse', action='store_true', help='只保存原始记录，不解析')
+    replay_parser.add_argument('--json', help='把统计结果写入JSON文件')
+
+    synth_parser = subparsers.add_parser('synthesize', help='生成合成的录制文件')
+    synth_parser.add_argument('filename', nargs='?', default=DEFAULT_RECORD_FILE)
+    synth_parser.add_argument('--events', type=int, default=500)
+    synth_parser.add_argument('--interval', type=float, default=0.5, help='事件间隔（秒）')
+    synth_parser.add_argument('--kind', choices=[KIND_CLIPBOARD, KIND_WINDOW_TEXT], default=KIND_CLIPBOARD)
+    synth_parser.add_argument('--seed', type=int, default=0)
+
+    args = parser.parse_args()
+
+    if args.command == 'synthesize':
+        with JsonlMessageStore(args.filename, fsync_every=1000) as store:
+            store.extend(generate_events(args.events, args.interval, args.kind, seed=args.seed))
+        print(f"已生成 {args.events} 个事件到 {args.filename}")
+        return
+
+    options = dict(poll_interval=args.poll_interval, queue_depth=args.queue_depth,
+                   queue_policy=args.queue_policy, parse_messages=not args.no_parse)
+    settings = replay_settings(args.output_dir, **options) if args.output_dir else None
+    report = replay_file(args.filename, args.speed, settings, **options)
+    if report is None:
+        return
+    print(format_report(report))
+    if args.output_dir:
+        print(f"回放输出目录: {args.output_dir}")
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
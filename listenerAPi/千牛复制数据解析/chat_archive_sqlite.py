@@ -0,0 +1,240 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛聊天记录 SQLite 归档（可选）
+把 parse_qianniu_chat_to_json 的输出写入带索引的 SQLite 数据库，
+按客户、时间范围、未读状态查询时不需要把整个文件读进内存
+
+用法：
+    python chat_archive_sqlite.py import qianniu_chat_messages.jsonl
+    python chat_archive_sqlite.py query --user tb123456 --start "2025-9-1 0:00:00" --unread
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+
+from chat_timestamps import default_normalizer
+from message_dedup import message_key
+from message_store import DEFAULT_CHAT_FILE, iter_messages
+
+DEFAULT_DB_FILE = "qianniu_chat.db"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    dedup_key BLOB NOT NULL UNIQUE,
+    username TEXT,
+    timestamp TEXT,
+    ts TEXT,
+    message TEXT,
+    status TEXT,
+    urls TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_username_ts ON messages (username, ts);
+CREATE INDEX IF NOT EXISTS idx_messages_ts ON messages (ts);
+CREATE INDEX IF NOT EXISTS idx_messages_status ON messages (status, username);
+"""
+
+
+def normalize_timestamp(value):
+    """
+    把 'YYYY-M-D H:MM:SS' 或 datetime 转成可排序的 'YYYY-MM-DD HH:MM:SS'
+    校验规则和年份范围与 chat_timestamps 相同，不存在的日期或范围外的年份返回None
+    """
+    if value is None:
+        return None
+    return default_normalizer.to_text(default_normalizer.to_epoch(value))
+
+
+class SqliteChatArchive:
+    """
+    SQLite 聊天记录归档
+
+    add() 先缓存，攒够 batch_size 条后在一个事务里批量写入；
+    相同的消息（见 message_dedup.message_key）只会保存一次。
+    实例可以直接作为 MessagePipeline 的 message_sinks 使用。
+    """
+
+    def __init__(self, filename=DEFAULT_DB_FILE, batch_size=500):
+        self.filename = filename
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    @staticmethod
+    def _row(message_data):
+        urls = message_data.get('urls')
+        return (
+            message_key(message_data),
+            message_data.get('username'),
+            message_data.get('timestamp'),
+            normalize_timestamp(message_data.get('timestamp')),
+            message_data.get('message'),
+            message_data.get('status'),
+            json.dumps(urls, ensure_ascii=False) if urls else None,
+        )
+
+    def _flush(self):
+        if not self._pending:
+            return 0
+        with self.conn:
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO messages '
+                '(dedup_key, username, timestamp, ts, message, status, urls) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                self._pending)
+        self._pending = []
+        return cursor.rowcount
+
+    def add(self, message_data):
+        """添加一条消息（缓存，批量写入）"""
+        with self._lock:
+            self._pending.append(self._row(message_data))
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    __call__ = add
+
+    def add_many(self, messages):
+        """批量添加消息，返回实际写入的条数（不含重复）"""
+        inserted = 0
+        with self._lock:
+            for message_data in messages:
+                self._pending.append(self._row(message_data))
+                if len(self._pending) >= self.batch_size:
+                    inserted += self._flush()
+            inserted += self._flush()
+        return inserted
+
+    def flush(self):
+        """写入缓存中的消息"""
+        with self._lock:
+            return self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @staticmethod
+    def _to_message(row):
+        message_data = {
+            'username': row['username'],
+            'timestamp': row['timestamp'],
+            'message': row['message'],
+            'status': row['status'],
+        }
+        if row['urls']:
+            message_data['urls'] = json.loads(row['urls'])
+        return message_data
+
+    def query(self, username=None, start=None, end=None, status=None, limit=None):
+        """
+        按条件查询消息，逐条返回（生成器），按时间排序
+        start/end 可以是 'YYYY-M-D H:MM:SS' 或 datetime，包含两端；无法识别时抛出 ValueError
+        """
+        bounds = {}
+        for name, value in (('start', start), ('end', end)):
+            if value is not None:
+                bounds[name] = normalize_timestamp(value)
+                if bounds[name] is None:
+                    raise ValueError(f"无法识别的时间 {name}={value!r}")
+        return self._query(username, bounds.get('start'), bounds.get('end'), status, limit)
+
+    def _query(self, username, start, end, status, limit):
+        self.flush()
+        conditions = []
+        params = []
+        if username is not None:
+            conditions.append('username = ?')
+            params.append(username)
+        if start is not None:
+            conditions.append('ts >= ?')
+            params.append(start)
+        if end is not None:
+            conditions.append('ts <= ?')
+            params.append(end)
+        if status is not None:
+            conditions.append('status = ?')
+            params.append(status)
+
+        sql = 'SELECT username, timestamp, message, status, urls FROM messages'
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        sql += ' ORDER BY ts, id'
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+
+        for row in self.conn.execute(sql, params):
+            yield self._to_message(row)
+
+    def customer_messages(self, username, start=None, end=None):
+        """某个客户的聊天记录"""
+        return self.query(username=username, start=start, end=end)
+
+    def unread_messages(self, username=None):
+        """未读消息"""
+        return self.query(username=username, status='未读')
+
+    def customers(self):
+        """所有客户及其消息数"""
+        self.flush()
+        rows = self.conn.execute(
+            'SELECT username, COUNT(*) AS count FROM messages GROUP BY username ORDER BY username')
+        return [(row['username'], row['count']) for row in rows]
+
+    def count(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM messages').fetchone()[0]
+
+
+def _timestamp_arg(value):
+    """argparse 参数类型：可识别的时间，否则报错"""
+    if normalize_timestamp(value) is None:
+        raise argparse.ArgumentTypeError(f"无法识别的时间: {value}（格式 YYYY-M-D H:MM:SS）")
+    return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千牛聊天记录 SQLite 归档")
+    parser.add_argument('--db', default=DEFAULT_DB_FILE, help='数据库文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    import_parser = subparsers.add_parser('import', help='导入解析后的JSONL消息')
+    import_parser.add_argument('filename', nargs='?', default=DEFAULT_CHAT_FILE)
+
+    query_parser = subparsers.add_parser('query', help='查询消息')
+    query_parser.add_argument('--user', help='客户用户名')
+    query_parser.add_argument('--start', type=_timestamp_arg, help='开始时间 YYYY-M-D H:MM:SS')
+    query_parser.add_argument('--end', type=_timestamp_arg, help='结束时间 YYYY-M-D H:MM:SS')
+    query_parser.add_argument('--unread', action='store_true', help='只看未读')
+    query_parser.add_argument('--limit', type=int)
+
+    args = parser.parse_args()
+
+    with SqliteChatArchive(args.db) as archive:
+        if args.command == 'import':
+            inserted = archive.add_many(iter_messages(args.filename))
+            print(f"已导入 {inserted} 条消息，数据库共 {archive.count()} 条")
+        elif args.command == 'query':
+            status = '未读' if args.unread else None
+            for message_data in archive.query(args.user, args.start, args.end, status, args.limit):
+                print(json.dumps(message_data, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+解析后聊天记录的列式导出
+按天分区、分块写出，便于 pandas 只读取需要的列：
+    输出目录/date=2025-09-19/part-00000.parquet   （安装了 pyarrow 时）
+    输出目录/date=2025-09-19/part-00000.csv       （否则）
+    输出目录/date=unknown/...                       （没有时间戳的消息，例如撤回）
+所有天合计最多缓存 max_buffered_rows 行，超过时先写出最久没有新消息的那天，
+按时间顺序导出几个月的记录时内存里通常只有当天的数据
+
+列：username, timestamp（时间类型）, message, status（分类）, urls
+
+用法：
+    python chat_export.py qianniu_chat_messages.jsonl chat_export --format parquet
+读取：
+    read_chat_export('chat_export', columns=['username', 'status'])
+"""
+
+import argparse
+import collections
+import csv
+import os
+
+from chat_timestamps import default_normalizer, epoch_to_datetime
+from message_store import DEFAULT_CHAT_FILE, iter_messages
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+COLUMNS = ['username', 'timestamp', 'message', 'status', 'urls']
+UNKNOWN_DAY = 'unknown'
+# CSV 列类型，读取时交给 pandas
+CSV_DTYPES = {'username': 'category', 'message': 'string', 'status': 'category', 'urls': 'string'}
+
+# add_many 每批转换多少个时间戳
+_EPOCH_BATCH = 1000
+
+
+class _CsvPartWriter:
+    extension = '.csv'
+
+    def write(self, path, rows):
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for username, timestamp, message, status, urls in rows:
+                writer.writerow([
+                    username,
+                    epoch_to_datetime(timestamp).strftime('%Y-%m-%d %H:%M:%S') if timestamp is not None else '',
+                    message,
+                    status or '',
+                    '\n'.join(urls) if urls else '',
+                ])
+
+
+class _ParquetPartWriter:
+    extension = '.parquet'
+
+    def __init__(self):
+        self.schema = pa.schema([
+            ('username', pa.dictionary(pa.int32(), pa.string())),
+            ('timestamp', pa.timestamp('s')),
+            ('message', pa.string()),
+            ('status', pa.dictionary(pa.int8(), pa.string())),
+            ('urls', pa.list_(pa.string())),
+        ])
+
+    def write(self, path, rows):
+        columns = list(zip(*rows))
+        arrays = [
+            pa.array(columns[0], pa.string()).dictionary_encode(),
+            # 时间戳已经是整数秒，直接作为 timestamp[s]
+            pa.array(columns[1], pa.timestamp('s')),
+            pa.array(columns[2], pa.string()),
+            pa.array(columns[3], pa.string()).dictionary_encode().cast(self.schema.field('status').type),
+            pa.array(columns[4], pa.list_(pa.string())),
+        ]
+        table = pa.Table.from_arrays(arrays, schema=self.schema)
+        pq.write_table(table, path, compression='zstd')
+
+
+class ChatColumnarExporter:
+    """
+    按天分区的列式导出器
+
+    每天的数据攒够 chunk_size 行写一个分块文件；所有天合计缓存超过 max_buffered_rows 行
+    （默认等于 chunk_size）时，写出最久没有新消息的那天，内存占用与导出的天数无关。
+    """
+
+    def __init__(self, output_dir, file_format='auto', chunk_size=50000, normalizer=None,
+                 max_buffered_rows=None):
+        if file_format == 'auto':
+            file_format = 'parquet' if PYARROW_AVAILABLE else 'csv'
+        if file_format == 'parquet' and not PYARROW_AVAILABLE:
+            raise RuntimeError("导出 parquet 需要安装 pyarrow: pip install pyarrow")
+        self.output_dir = output_dir
+        self.file_format = file_format
+        self.chunk_size = chunk_size
+        self.normalizer = normalizer or default_normalizer
+        self.writer = _ParquetPartWriter() if file_format == 'parquet' else _CsvPartWriter()
+        self.max_buffered_rows = max_buffered_rows or chunk_size
+        # 按最近一次收到消息的顺序排列，最前面是最久没有新消息的那天
+        self._buffers = collections.OrderedDict()
+        self._buffered = 0
+        self._part_numbers = {}
+        self.rows = 0
+        self.files = 0
+
+    def _next_path(self, day):
+        folder = os.path.join(self.output_dir, f"date={day}")
+        if day not in self._part_numbers:
+            os.makedirs(folder, exist_ok=True)
+            # 续写已有分区时不覆盖旧分块
+            existing = [name for name in os.listdir(folder) if name.startswith('part-')]
+            self._part_numbers[day] = len(existing)
+        number = self._part_numbers[day]
+        self._part_numbers[day] = number + 1
+        return os.path.join(folder, f"part-{number:05d}{self.writer.extension}")
+
+    def _flush_day(self, day):
+        rows = self._buffers.pop(day, None)
+        if rows:
+            self._buffered -= len(rows)
+            self.writer.write(self._next_path(day), rows)
+            self.files += 1
+
+    def _add(self, message_data, epoch):
+        day = epoch_to_datetime(epoch).strftime('%Y-%m-%d') if epoch is not None else UNKNOWN_DAY
+        rows = self._buffers.get(day)
+        if rows is None:
+            rows = self._buffers[day] = []
+        else:
+            self._buffers.move_to_end(day)
+        rows.append((
+            message_data.get('username'),
+            epoch,
+            message_data.get('message'),
+            message_data.get('status'),
+            message_data.get('urls') or [],
+        ))
+        self.rows += 1
+        self._buffered += 1
+        if len(rows) >= self.chunk_size:
+            self._flush_day(day)
+        elif self._buffered > self.max_buffered_rows:
+            self._flush_day(next(iter(self._buffers)))
+
+    def add(self, message_data):
+        """添加一条消息"""
+        self._add(message_data, self.normalizer.to_epoch(message_data.get('timestamp')))
+
+    __call__ = add
+
+    def add_many(self, messages):
+        """批量添加消息，时间戳按批转换"""
+        batch = []
+        for message_data in messages:
+            batch.append(message_data)
+            if len(batch) >= _EPOCH_BATCH:
+                self._add_batch(batch)
+                batch = []
+        self._add_batch(batch)
+
+    def _add_batch(self, batch):
+        epochs = self.normalizer.to_epochs(m.get('timestamp') for m in batch)
+        for message_data, epoch in zip(batch, epochs):
+            self._add(message_data, epoch)
+
+    def close(self):
+        """写出所有剩余数据"""
+        for day in list(self._buffers):
+            self._flush_day(day)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_chat_export(output_dir, columns=None, days=None):
+    """
+    用 pandas 读取导出目录，只读取需要的列和日期分区
+    days: 例如 ['2025-09-19']，为空时读取全部
+    """
+    import pandas as pd
+
+    frames = []
+    for name in sorted(os.listdir(output_dir)):
+        if not name.startswith('date='):
+            continue
+        day = name[len('date='):]
+        if days and day not in days:
+            continue
+        folder = os.path.join(output_dir, name)
+        for part in sorted(os.listdir(folder)):
+            path = os.path.join(folder, part)
+            if part.endswith('.parquet'):
+                frames.append(pd.read_parquet(path, columns=columns))
+            elif part.endswith('.csv'):
+                usecols = columns or COLUMNS
+                dtype = {column: CSV_DTYPES[column] for column in usecols if column in CSV_DTYPES}
+                parse_dates = ['timestamp'] if 'timestamp' in usecols else False
+                frames.append(pd.read_csv(path, usecols=usecols, dtype=dtype,
+                                          parse_dates=parse_dates, keep_default_na=False))
+    if not frames:
+        return pd.DataFrame(columns=columns or COLUMNS)
+    frame = pd.concat(frames, ignore_index=True)
+    for column in ('username', 'status'):
+        if column in frame.columns:
+            frame[column] = frame[column].astype('category')
+    return frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出解析后的聊天记录为按天分区的列式文件")
+    parser.add_argument('input', nargs='?', default=DEFAULT_CHAT_FILE, help='解析后的JSONL消息文件')
+    parser.add_argument('output_dir', nargs='?', default='chat_export', help='输出目录')
+    parser.add_argument('--format', choices=['auto', 'parquet', 'csv'], default='auto')
+    parser.add_argument('--chunk-size', type=int, default=50000, help='每个分块文件的最大行数')
+    parser.add_argument('--max-buffered-rows', type=int, default=None,
+                        help='所有天合计最多缓存的行数，默认等于 --chunk-size')
+    args = parser.parse_args()
+
+    with ChatColumnarExporter(args.output_dir, args.format, args.chunk_size,
+                              max_buffered_rows=args.max_buffered_rows) as exporter:
+        exporter.add_many(iter_messages(args.input))
+    print(f"已导出 {exporter.rows} 条消息，{exporter.files} 个文件 ({exporter.file_format}) 到 {args.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
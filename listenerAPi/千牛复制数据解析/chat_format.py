@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛聊天格式快速判断
+每次剪贴板变化都要判断一次，复制的可能是几MB的非聊天内容，
+所以只检查开头固定长度的窗口，规则预先编译，不切分全文、不整体转小写
+年份规则使用 chat_timestamps 中与解析器共用的年份范围，范围修改后自动重新编译
+"""
+
+import re
+
+from chat_timestamps import on_year_window_change
+
+# 默认只检查前 4096 个字符
+DEFAULT_WINDOW = 4096
+
+
+class ChatFormatDetector:
+    """
+    规则打分的格式判断器
+
+    rules: [(名称, 规则)]，规则可以是正则字符串/已编译正则（在窗口内 search），
+           也可以是函数 rule(窗口文本, 全文)，返回真假
+    threshold: 命中多少条规则算聊天格式
+    window: 只检查 text[:window]
+    """
+
+    def __init__(self, rules, threshold=1, window=DEFAULT_WINDOW):
+        self.threshold = threshold
+        self.window = window
+        self.rules = []
+        self.set_rules(rules)
+
+    def set_rules(self, rules):
+        """替换全部规则（整体替换，判断中的线程不会看到一半的规则）"""
+        compiled = []
+        for name, rule in rules:
+            if isinstance(rule, str):
+                rule = re.compile(rule)
+            if hasattr(rule, 'search'):
+                search = rule.search
+                compiled.append((name, lambda sample, text, search=search: search(sample) is not None))
+            else:
+                compiled.append((name, rule))
+        self.rules = compiled
+
+    def matched_rules(self, text):
+        """返回命中的规则名称（调试用，不提前结束）"""
+        sample = text[:self.window]
+        return [name for name, rule in self.rules if rule(sample, text)]
+
+    def __call__(self, text):
+        if not text:
+            return False
+        sample = text[:self.window]
+        hits = 0
+        for name, rule in self.rules:
+            if rule(sample, text):
+                hits += 1
+                if hits >= self.threshold:
+                    return True
+        return False
+
+
+def _has_user_line(sample, text):
+    """窗口内是否有包含 tb/syt 且长度大于6的行"""
+    for line in sample.split('\n'):
+        line = line.strip()
+        if len(line) > 6 and ('tb' in line or 'syt' in line):
+            return True
+    return False
+
+
+def year_pattern(min_year, max_year):
+    """年份范围（包含两端）-> 只匹配范围内年份的正则"""
+    return '(?:' + '|'.join(str(year) for year in range(max_year, min_year - 1, -1)) + ')'
+
+
+def qianniu_clipboard_rules(year):
+    """QianNiuHookStd 剪贴板判断：满足3项及以上；year 是年份正则"""
+    return [
+        ('length', lambda sample, text: len(text) > 20),  # 消息长度
+        ('colon', ':'),                                # 时间格式
+        ('tb', re.compile('tb', re.IGNORECASE)),       # 淘宝用户名
+        ('syt', re.compile('syt', re.IGNORECASE)),     # 系统消息
+        ('year', year),                                # 年份
+    ]
+
+
+def simple_chat_rules(year):
+    """SimpleQianNiuHook 判断：满足任意1项；year 是年份正则"""
+    return [
+        ('user_line', _has_user_line),
+        # 同一行里有 "年份-" 且有空格或冒号
+        ('date_line', re.compile(r'^(?=[^\n]*' + year + r'-)[^\n]*[ :]', re.MULTILINE)),
+        ('keyword', '客服|亲|订单|商品|价格|优惠|发货'),
+    ]
+
+
+qianniu_clipboard_detector = ChatFormatDetector([], threshold=3)
+simple_chat_detector = ChatFormatDetector([], threshold=1)
+
+
+def _apply_year_window(min_year, max_year):
+    year = year_pattern(min_year, max_year)
+    qianniu_clipboard_detector.set_rules(qianniu_clipboard_rules(year))
+    simple_chat_detector.set_rules(simple_chat_rules(year))
+
+
+on_year_window_change(_apply_year_window)
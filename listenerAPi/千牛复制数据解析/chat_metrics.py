@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛客服实时指标
+按解析器输出的消息流增量累计，每条消息 O(1)，定期把快照写到磁盘，看板直接读快照：
+    - 首次响应时间：客户发消息后到客服第一次回复的间隔（分桶直方图 + 平均/最大）
+    - 未读积压：每个客户当前有多少条客服消息标记为"未读"
+      （客户再发消息或出现"已读"说明之前的消息都已读，积压清零）
+    - 撤回率：撤回消息 / 全部消息
+
+客户/客服的判断与 chat_sessions 相同：用户名含 ':' 的是客服子账号，客服消息归到最近出现的客户。
+最近出现的客户随快照保存，重启后继续归属；还没出现过客户时的客服消息不计入未读积压，快照里也不列出。
+
+用法：
+    python chat_metrics.py build qianniu_chat_messages.jsonl -o qianniu_metrics.json
+    python chat_metrics.py show qianniu_metrics.json
+"""
+
+import argparse
+import bisect
+import json
+import os
+import threading
+import time
+
+from chat_sessions import is_agent_name
+from chat_timestamps import to_epoch
+from message_store import DEFAULT_CHAT_FILE, iter_messages
+
+try:
+    from readcliper import RECALL_TEXT, TRANSFER_SEP
+except ImportError:
+    RECALL_TEXT = '撤回了一条消息'
+    TRANSFER_SEP = ' --> '
+
+DEFAULT_METRICS_FILE = "qianniu_metrics.json"
+
+# 首次响应时间分桶上界（秒），最后一个桶是"更长"
+RESPONSE_BUCKETS = [10, 30, 60, 120, 300, 600, 1800, 3600]
+
+STATUS_UNREAD = '未读'
+STATUS_READ = '已读'
+
+
+class _CustomerStats:
+    __slots__ = ('messages', 'agent_messages', 'recalls', 'unread', 'waiting_since',
+                 'responses', 'response_total', 'last_timestamp')
+
+    def __init__(self):
+        self.messages = 0
+        self.agent_messages = 0
+        self.recalls = 0
+        self.unread = 0
+        # 客户消息还没有客服回复时，记录第一条未回复消息的时间
+        self.waiting_since = None
+        self.responses = 0
+        self.response_total = 0
+        self.last_timestamp = None
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls()
+        for name in cls.__slots__:
+            setattr(stats, name, data.get(name, getattr(stats, name)))
+        return stats
+
+
+class ServiceMetrics:
+    """
+    客服指标累加器
+
+    add(message) 每条消息 O(1)；snapshot() 返回可JSON序列化的快照，save() 原子写入文件。
+    snapshot_file/snapshot_interval：设置后 add 时每隔 snapshot_interval 秒自动写一次快照。
+    实例可以直接作为 MessagePipeline 的 message_sinks 使用。
+    """
+
+    def __init__(self, snapshot_file=None, snapshot_interval=10.0, is_agent=is_agent_name):
+        self.snapshot_file = snapshot_file
+        self.snapshot_interval = snapshot_interval
+        self.is_agent = is_agent
+        self.customers = {}
+        self.messages = 0
+        self.recalls = 0
+        self.responses = 0
+        self.response_total = 0
+        self.response_max = 0
+        self.response_buckets = [0] * (len(RESPONSE_BUCKETS) + 1)
+        self.unread_total = 0
+        self._current_customer = None
+        self._last_save = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _stats(self, customer):
+        stats = self.customers.get(customer)
+        if stats is None:
+            stats = self.customers[customer] = _CustomerStats()
+        return stats
+
+    def _record_response(self, stats, latency):
+        latency = max(latency, 0)
+        stats.responses += 1
+        stats.response_total += latency
+        self.responses += 1
+        self.response_total += latency
+        self.response_max = max(self.response_max, latency)
+        self.response_buckets[bisect.bisect_left(RESPONSE_BUCKETS, latency)] += 1
+
+    def _clear_unread(self, customer, stats):
+        if customer is not None:
+            self.unread_total -= stats.unread
+        stats.unread = 0
+
+    def add(self, message_data):
+        """累计一条消息"""
+        with self._lock:
+            username = message_data.get('username') or ''
+            from_agent = not username or self.is_agent(username) or TRANSFER_SEP in username
+            if not from_agent:
+                self._current_customer = username
+            customer = self._current_customer
+            stats = self._stats(customer)
+            epoch = to_epoch(message_data.get('timestamp'))
+            status = message_data.get('status')
+
+            self.messages += 1
+            stats.messages += 1
+            if epoch is not None:
+                stats.last_timestamp = message_data.get('timestamp')
+
+            if message_data.get('message') == RECALL_TEXT and message_data.get('timestamp') is None:
+                self.recalls += 1
+                stats.recalls += 1
+            elif from_agent:
+                if TRANSFER_SEP not in username:
+                    stats.agent_messages += 1
+                    if stats.waiting_since is not None and epoch is not None:
+                        self._record_response(stats, epoch - stats.waiting_since)
+                        stats.waiting_since = None
+                if status == STATUS_UNREAD:
+                    stats.unread += 1
+                    if customer is not None:
+                        self.unread_total += 1
+                elif status == STATUS_READ:
+                    self._clear_unread(customer, stats)
+            else:
+                # 客户发了消息，说明之前的客服消息都已读
+                self._clear_unread(customer, stats)
+                if stats.waiting_since is None and epoch is not None:
+                    stats.waiting_since = epoch
+
+            if self.snapshot_file and time.monotonic() - self._last_save >= self.snapshot_interval:
+                self._save(self.snapshot_file)
+
+    __call__ = add
+
+    def add_many(self, messages):
+        for message_data in messages:
+            self.add(message_data)
+
+    def _snapshot(self):
+        return {
+            'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'messages': self.messages,
+            'recalls': self.recalls,
+            'recall_rate': self.recalls / self.messages if self.messages else 0.0,
+            'responses': self.responses,
+            'response_avg': self.response_total / self.responses if self.responses else None,
+            'response_max': self.response_max,
+            'response_total': self.response_total,
+            'response_buckets': {
+                'bounds': RESPONSE_BUCKETS,
+                'counts': list(self.response_buckets),
+            },
+            'unread_total': self.unread_total,
+            'waiting_customers': sum(1 for s in self.customers.values() if s.waiting_since is not None),
+            'customers': {customer: stats.to_dict() for customer, stats in self.customers.items()
+                          if customer is not None},
+            'current_customer': self._current_customer,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            return self._snapshot()
+
+    def _save(self, filename):
+        data = self._snapshot()
+        tmp_filename = filename + '.tmp'
+        with open(tmp_filename, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        # 先写临时文件再替换，看板不会读到写了一半的快照
+        os.replace(tmp_filename, filename)
+        self._last_save = time.monotonic()
+
+    def save(self, filename=None):
+        """把快照写到文件"""
+        with self._lock:
+            self._save(filename or self.snapshot_file)
+
+    def close(self):
+        if self.snapshot_file:
+            self.save()
+
+    @classmethod
+    def load(cls, filename, **kwargs):
+        """从快照恢复累加器，重启后继续累计"""
+        metrics = cls(**kwargs)
+        if not os.path.exists(filename):
+            return metrics
+        with open(filename, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        metrics.messages = data['messages']
+        metrics.recalls = data['recalls']
+        metrics.responses = data['responses']
+        metrics.response_total = data['response_total']
+        metrics.response_max = data['response_max']
+        metrics.response_buckets = list(data['response_buckets']['counts'])
+        metrics.unread_total = data['unread_total']
+        metrics.customers = {customer: _CustomerStats.from_dict(stats)
+                             for customer, stats in data['customers'].items()}
+        # 旧快照没有这个字段
+        metrics._current_customer = data.get('current_customer')
+        return metrics
+
+
+def format_snapshot(data, top=10):
+    """快照的文本汇总"""
+    lines = [f"快照时间: {data['generated_at']}",
+             f"消息数: {data['messages']}  撤回: {data['recalls']} ({data['recall_rate']:.2%})"]
+    if data['responses']:
+        lines.append(f"首次响应: {data['responses']} 次，平均 {data['response_avg']:.0f} 秒，"
+                     f"最长 {data['response_max']} 秒")
+        bounds = data['response_buckets']['bounds']
+        labels = [f"<={bound}s" for bound in bounds] + [f">{bounds[-1]}s"]
+        lines.append('  ' + '  '.join(f"{label}:{count}" for label, count
+                                       in zip(labels, data['response_buckets']['counts'])))
+    lines.append(f"未读积压: {data['unread_total']}  等待回复的客户: {data['waiting_customers']}")
+    backlog = sorted(((stats['unread'], customer) for customer, stats in data['customers'].items()
+                      if stats['unread']), reverse=True)[:top]
+    for unread, customer in backlog:
+        lines.append(f"  {customer}: {unread} 条未读")
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千牛客服指标（首次响应、未读积压、撤回率）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='从解析后的JSONL消息生成快照')
+    build_parser.add_argument('input', nargs='?', default=DEFAULT_CHAT_FILE)
+    build_parser.add_argument('-o', '--output', default=DEFAULT_METRICS_FILE)
+
+    show_parser = subparsers.add_parser('show', help='显示快照')
+    show_parser.add_argument('filename', nargs='?', default=DEFAULT_METRICS_FILE)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        metrics = ServiceMetrics()
+        metrics.add_many(iter_messages(args.input))
+        metrics.save(args.output)
+        print(format_snapshot(metrics.snapshot()))
+        print(f"快照已保存到 {args.output}")
+    elif args.command == 'show':
+        with open(args.filename, 'r', encoding='utf-8') as f:
+            print(format_snapshot(json.load(f)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+紧凑的消息记录
+parse_qianniu_chat_to_json 的每条消息是一个 dict，键名和 tb… 用户名、状态字符串在几十万条记录里重复保存。
+ChatMessage 用 __slots__ 保存字段，用户名、状态和 URL 前缀全部驻留（同样的字符串只有一份），
+需要长时间在内存里保存大量消息时（会话切分、批量重新解析）使用，写文件前再转回 dict：
+
+    record = ChatMessage.from_dict(message_data)
+    record.to_dict() == message_data   # 无损，包括键的顺序、缺失的键和额外的键
+
+ChatMessage 也支持 record.get('username') / record['username']，可以直接传给 message_key 等只读取字段的函数。
+"""
+
+import sys
+
+FIELDS = ('username', 'timestamp', 'message', 'status', 'urls')
+
+
+class _Missing:
+    """字段缺失（区别于值为 None），pickle 后仍是同一个对象"""
+
+    def __reduce__(self):
+        return '_MISSING'
+
+    def __repr__(self):
+        return '<missing>'
+
+
+_MISSING = _Missing()
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def _split_url(url):
+    """URL 拆成 (驻留的前缀, 后缀)，前缀到最后一个 '/' 或 '=' 为止"""
+    cut = max(url.rfind('/'), url.rfind('=')) + 1
+    return sys.intern(url[:cut]), url[cut:]
+
+
+class ChatMessage:
+    """一条聊天消息（紧凑表示）"""
+
+    # _urls: 扁平的 (前缀, 后缀, 前缀, 后缀, ...) 元组；extra: 五个标准字段之外的键，没有时为 None
+    __slots__ = ('username', 'timestamp', 'message', 'status', '_urls', 'extra')
+
+    def __init__(self, username, timestamp, message, status=None, urls=_MISSING, extra=None):
+        self.username = _intern(username)
+        self.timestamp = timestamp
+        self.message = message
+        self.status = _intern(status)
+        if urls is _MISSING or urls is None:
+            self._urls = urls
+        else:
+            parts = []
+            for url in urls:
+                parts.extend(_split_url(url))
+            self._urls = tuple(parts)
+        self.extra = extra
+
+    @property
+    def urls(self):
+        """URL 列表；消息没有 urls 字段时为 None"""
+        parts = self._urls
+        if parts is _MISSING or parts is None:
+            return None
+        return [parts[i] + parts[i + 1] for i in range(0, len(parts), 2)]
+
+    @classmethod
+    def from_dict(cls, message_data):
+        """从解析器输出的 dict 创建"""
+        extra = {key: value for key, value in message_data.items() if key not in FIELDS}
+        keys = tuple(message_data)
+        canonical = tuple(key for key in FIELDS if key in message_data) + tuple(extra)
+        if keys != canonical:
+            # 键顺序与解析器输出不同时记下原始顺序，to_dict 按原样还原
+            extra['__order__'] = keys
+        return cls(message_data.get('username', _MISSING),
+                   message_data.get('timestamp', _MISSING),
+                   message_data.get('message', _MISSING),
+                   message_data.get('status', _MISSING),
+                   message_data.get('urls', _MISSING),
+                   extra or None)
+
+    def to_dict(self):
+        """转回解析器输出的 dict 形式"""
+        message_data = {}
+        for key in ('username', 'timestamp', 'message', 'status'):
+            value = getattr(self, key)
+            if value is not _MISSING:
+                message_data[key] = value
+        if self._urls is not _MISSING:
+            message_data['urls'] = self.urls
+        if self.extra:
+            message_data.update(self.extra)
+            order = message_data.pop('__order__', None)
+            if order is not None:
+                return {key: message_data[key] for key in order}
+        return message_data
+
+    def get(self, key, default=None):
+        if key in FIELDS:
+            value = self.urls if key == 'urls' else getattr(self, key)
+            if key == 'urls' and self._urls is _MISSING:
+                return default
+            return default if value is _MISSING else value
+        if self.extra and key in self.extra and key != '__order__':
+            return self.extra[key]
+        return default
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __eq__(self, other):
+        if isinstance(other, ChatMessage):
+            other = other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"ChatMessage({self.to_dict()!r})"
+
+    def __reduce__(self):
+        # 按字段序列化；pickle 会复用同一个用户名/前缀对象，进程间传递也更小
+        return _restore, (self.username, self.timestamp, self.message, self.status, self._urls, self.extra)
+
+
+def _restore(username, timestamp, message, status, urls, extra):
+    record = ChatMessage.__new__(ChatMessage)
+    record.username = _intern(username)
+    record.timestamp = timestamp
+    record.message = message
+    record.status = _intern(status)
+    if isinstance(urls, tuple):
+        urls = tuple(sys.intern(part) if i % 2 == 0 else part for i, part in enumerate(urls))
+    record._urls = urls
+    record.extra = extra
+    return record
+
+
+def to_records(messages):
+    """dict 列表 -> ChatMessage 列表"""
+    return [ChatMessage.from_dict(message_data) for message_data in messages]
+
+
+def to_dicts(records):
+    """ChatMessage 列表 -> dict 列表"""
+    return [record.to_dict() for record in records]
+
+
+def parse_qianniu_chat_records(text_content):
+    """与 parse_qianniu_chat_to_json 相同，返回 ChatMessage 列表"""
+    from readcliper import parse_qianniu_chat_to_json
+    return to_records(parse_qianniu_chat_to_json(text_content))
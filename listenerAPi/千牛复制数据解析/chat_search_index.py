@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛聊天记录全文检索
+保存解析后的消息时增量建立倒排索引，按订单号、商品编号、关键词查找历史对话不再需要扫描整个文件。
+
+分词：
+    - 中文等非ASCII字符：按连续字符的 2-gram（"发货了" -> 发货 货了）
+    - ASCII 字母数字（订单号、商品ID、英文）：小写后按 3-gram，短于3的整体作为一个词
+倒排表存放在 SQLite 的 WITHOUT ROWID 表里，按 (gram, 消息编号) 聚簇，同一个 gram 的文档在磁盘上连续。
+查询时只取文档数最少的几个 gram 求交集，再用原文校验，结果与子串匹配一致。
+
+用法：
+    python chat_search_index.py build qianniu_chat_messages.jsonl
+    python chat_search_index.py query 3921456678123
+    python chat_search_index.py query 发货 退货 --user tb10000123 --limit 50
+"""
+
+import argparse
+import json
+import re
+import sqlite3
+import threading
+import time
+
+from chat_timestamps import to_epochs
+from message_dedup import message_key
+from message_store import DEFAULT_CHAT_FILE, iter_messages
+
+DEFAULT_INDEX_DB = "qianniu_chat_search.db"
+
+# 查询时最多用几个最稀有的 gram 求交集，其余由原文校验
+QUERY_GRAMS = 3
+
+_RUN_RE = re.compile(r'[a-z0-9]+|[^\x00-\x7f\s　-〿＀-／：-＠]+')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS docs (
+    id INTEGER PRIMARY KEY,
+    dedup_key BLOB NOT NULL UNIQUE,
+    username TEXT,
+    timestamp TEXT,
+    epoch INTEGER,
+    message TEXT,
+    urls TEXT,
+    search_text TEXT
+);
+CREATE TABLE IF NOT EXISTS postings (
+    gram TEXT NOT NULL,
+    doc INTEGER NOT NULL,
+    PRIMARY KEY (gram, doc)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grams (
+    gram TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+"""
+
+
+def _run_grams(run):
+    """一段连续字符的 n-gram：ASCII 用3-gram，其他用2-gram"""
+    n = 3 if run.isascii() else 2
+    if len(run) <= n:
+        return [run]
+    return [run[i:i + n] for i in range(len(run) - n + 1)]
+
+
+def tokenize(text):
+    """文本 -> 去重后的 gram 集合"""
+    grams = set()
+    for run in _RUN_RE.findall(text.lower()):
+        grams.update(_run_grams(run))
+    return grams
+
+
+def _query_grams(term):
+    """
+    查询词的 gram：只使用能保证命中的 gram
+    （短于 n 的片段在文档中可能是更长片段的一部分，不能用来查倒排表）
+    """
+    grams = set()
+    for run in _RUN_RE.findall(term.lower()):
+        n = 3 if run.isascii() else 2
+        if len(run) >= n:
+            grams.update(_run_grams(run))
+    return grams
+
+
+def _search_text(message_data):
+    parts = [message_data.get('message') or '']
+    parts.extend(message_data.get('urls') or [])
+    return '\n'.join(parts).lower()
+
+
+class ChatSearchIndex:
+    """
+    聊天记录倒排索引
+
+    add() 先缓存，攒够 batch_size 条后在一个事务里写入消息和倒排表；
+    相同的消息（见 message_dedup.message_key）只会索引一次。
+    实例可以直接作为 MessagePipeline 的 message_sinks 使用。
+    """
+
+    def __init__(self, filename=DEFAULT_INDEX_DB, batch_size=500):
+        self.filename = filename
+        self.batch_size = batch_size
+        self._pending = []
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(filename, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+    def _flush(self):
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, []
+        epochs = to_epochs(m.get('timestamp') for m in pending)
+        inserted = 0
+        df = {}
+        postings = []
+        with self.conn:
+            for message_data, epoch in zip(pending, epochs):
+                urls = message_data.get('urls')
+                search_text = _search_text(message_data)
+                cursor = self.conn.execute(
+                    'INSERT OR IGNORE INTO docs '
+                    '(dedup_key, username, timestamp, epoch, message, urls, search_text) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (message_key(message_data), message_data.get('username'), message_data.get('timestamp'),
+                     epoch, message_data.get('message'),
+                     json.dumps(urls, ensure_ascii=False) if urls else None, search_text))
+                if not cursor.rowcount:
+                    continue
+                inserted += 1
+                doc = cursor.lastrowid
+                for gram in tokenize(search_text):
+                    postings.append((gram, doc))
+                    df[gram] = df.get(gram, 0) + 1
+            # 按 gram 排序后写入，B 树按顺序插入，比逐条随机插入快得多
+            postings.sort()
+            self.conn.executemany('INSERT INTO postings (gram, doc) VALUES (?, ?)', postings)
+            self.conn.executemany(
+                'INSERT INTO grams (gram, df) VALUES (?, ?) '
+                'ON CONFLICT (gram) DO UPDATE SET df = df + excluded.df',
+                df.items())
+        return inserted
+
+    def add(self, message_data):
+        """添加一条消息（缓存，批量写入）"""
+        with self._lock:
+            self._pending.append(message_data)
+            if len(self._pending) >= self.batch_size:
+                self._flush()
+
+    __call__ = add
+
+    def add_many(self, messages):
+        """批量添加消息，返回实际索引的条数（不含重复）"""
+        inserted = 0
+        with self._lock:
+            for message_data in messages:
+                self._pending.append(message_data)
+                if len(self._pending) >= self.batch_size:
+                    inserted += self._flush()
+            inserted += self._flush()
+        return inserted
+
+    def flush(self):
+        with self._lock:
+            return self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def count(self):
+        self.flush()
+        return self.conn.execute('SELECT COUNT(*) FROM docs').fetchone()[0]
+
+    def _candidates(self, grams):
+        """文档数最少的几个 gram 求交集，按消息编号从新到旧返回"""
+        placeholders = ','.join('?' * len(grams))
+        rows = self.conn.execute(
+            f'SELECT gram, df FROM grams WHERE gram IN ({placeholders})', list(grams)).fetchall()
+        if len(rows) < len(grams):
+            # 有 gram 从未出现过，不可能命中
+            return iter(())
+        rarest = [gram for gram, df in sorted(rows, key=lambda row: row[1])[:QUERY_GRAMS]]
+        sql = 'SELECT doc FROM postings WHERE gram = ?'
+        for _ in rarest[1:]:
+            sql += ' AND doc IN (SELECT doc FROM postings WHERE gram = ?)'
+        sql += ' ORDER BY doc DESC'
+        return (row[0] for row in self.conn.execute(sql, rarest))
+
+    def search(self, query, username=None, limit=20):
+        """
+        查找包含所有查询词（空格分隔，不区分大小写）的消息，从新到旧返回
+        查询词都太短（单个汉字、两个字母）无法用索引时退化为顺序扫描
+        """
+        self.flush()
+        terms = [term.lower() for term in query.split()]
+        if not terms:
+            return []
+        grams = set()
+        for term in terms:
+            grams |= _query_grams(term)
+
+        columns = 'SELECT id, username, timestamp, message, urls, search_text FROM docs'
+        if grams:
+            rows = (self.conn.execute(columns + ' WHERE id = ?', (doc,)).fetchone()
+                    for doc in self._candidates(grams))
+        else:
+            rows = self.conn.execute(columns + ' ORDER BY id DESC')
+
+        results = []
+        for doc, doc_username, timestamp, message, urls, search_text in rows:
+            if username is not None and doc_username != username:
+                continue
+            if all(term in search_text for term in terms):
+                message_data = {'username': doc_username, 'timestamp': timestamp, 'message': message}
+                if urls:
+                    message_data['urls'] = json.loads(urls)
+                results.append(message_data)
+                if limit and len(results) >= limit:
+                    break
+        return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千牛聊天记录全文检索")
+    parser.add_argument('--db', default=DEFAULT_INDEX_DB, help='索引数据库文件')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help='把解析后的JSONL消息加入索引（可重复执行，只添加新消息）')
+    build_parser.add_argument('filename', nargs='?', default=DEFAULT_CHAT_FILE)
+
+    query_parser = subparsers.add_parser('query', help='搜索消息')
+    query_parser.add_argument('terms', nargs='+', help='查询词，多个词需要同时出现')
+    query_parser.add_argument('--user', help='只看某个客户')
+    query_parser.add_argument('--limit', type=int, default=20)
+
+    args = parser.parse_args()
+
+    with ChatSearchIndex(args.db) as index:
+        if args.command == 'build':
+            inserted = index.add_many(iter_messages(args.filename))
+            print(f"已索引 {inserted} 条新消息，共 {index.count()} 条")
+        elif args.command == 'query':
+            started = time.perf_counter()
+            results = index.search(' '.join(args.terms), args.user, args.limit)
+            elapsed = (time.perf_counter() - started) * 1000
+            for message_data in results:
+                print(json.dumps(message_data, ensure_ascii=False))
+            print(f"找到 {len(results)} 条，用时 {elapsed:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
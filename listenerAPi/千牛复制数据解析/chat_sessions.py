@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛聊天记录会话切分（在线）
+parse_qianniu_chat_to_json 输出的消息是一维列表，客户、客服子账号、转交、撤回混在一起。
+这里逐条接收消息，按 (客户, 会话) 分组：
+    - 客户消息：用户名不含 ':' 也不是转交记录
+    - 客服消息（子账号 "店铺:客服"）、转交记录、没有时间戳的撤回：归到最近出现的客户
+    - 同一客户两条消息间隔超过 idle_gap 秒就开始新会话（只按该客户自己的消息时间判断）
+只保存进行中的会话。不同客户的消息时间可以交错或乱序（粘贴的历史记录、导出会话），
+所以会话是否结束不按全局最新时间判断，而是按到达顺序：
+    - 会话最近一次收到消息已过去 idle_gap 秒（实际时间，实时采集时与消息时间一致）
+    - 进行中的会话超过 max_open 个时，最久没有收到消息的会话先输出
+add() 时会顺带检查；客户不再说话、也没有新消息到来时，由调用方定期调用 expire()。
+
+用法：
+    python chat_sessions.py qianniu_chat_messages.jsonl -o qianniu_conversations.jsonl --idle-gap 1800
+
+    sessionizer = ConversationSessionizer(idle_gap=1800, on_close=print)
+    for message_data in messages:
+        sessionizer.add(message_data)
+    sessionizer.flush()
+"""
+
+import argparse
+import threading
+import time
+from collections import OrderedDict
+
+from chat_records import ChatMessage
+from chat_timestamps import to_epoch
+from message_store import DEFAULT_CHAT_FILE, JsonlMessageStore, iter_messages
+
+try:
+    from readcliper import TRANSFER_SEP
+except ImportError:
+    TRANSFER_SEP = ' --> '
+
+DEFAULT_CONVERSATIONS_FILE = "qianniu_conversations.jsonl"
+DEFAULT_IDLE_GAP = 30 * 60
+DEFAULT_MAX_OPEN = 10000
+
+
+def is_agent_name(username):
+    """客服子账号的用户名形如 '店铺:客服'"""
+    return ':' in username
+
+
+class _Session:
+    __slots__ = ('customer', 'start', 'end', 'start_time', 'end_time', 'messages', 'agents', 'transfers',
+                 'arrived')
+
+    def __init__(self, customer):
+        self.customer = customer
+        self.start = None
+        self.end = None
+        self.start_time = None
+        self.end_time = None
+        self.messages = []
+        self.agents = []
+        self.transfers = []
+        # 最近一次收到消息的实际时间（clock()）
+        self.arrived = None
+
+    def to_dict(self):
+        return {
+            'customer': self.customer,
+            'start': self.start_time,
+            'end': self.end_time,
+            'message_count': len(self.messages),
+            'agents': self.agents,
+            'transfers': self.transfers,
+            'messages': [record.to_dict() for record in self.messages],
+        }
+
+
+class ConversationSessionizer:
+    """
+    在线会话切分
+
+    add(message) 返回因此结束的会话列表；expire() 输出已空闲超过 idle_gap 的会话；
+    flush() 输出所有进行中的会话。
+    on_close(会话字典) 在每个会话结束时调用，实例可以直接作为 MessagePipeline 的 message_sinks 使用。
+    is_agent(username) 判断客服账号，默认用户名含 ':' 的是客服。
+    max_open：最多同时保存多少个进行中的会话；clock：到达时间的时钟，默认 time.monotonic。
+    """
+
+    def __init__(self, idle_gap=DEFAULT_IDLE_GAP, on_close=None, is_agent=is_agent_name,
+                 max_open=DEFAULT_MAX_OPEN, clock=time.monotonic):
+        self.idle_gap = idle_gap
+        self.on_close = on_close
+        self.is_agent = is_agent
+        self.max_open = max_open
+        self.clock = clock
+        # 按最近收到消息的先后排列，最久没有消息的会话在最前面
+        self._sessions = OrderedDict()
+        self._current_customer = None
+        self._lock = threading.Lock()
+        self.closed = 0
+
+    def __len__(self):
+        """进行中的会话数"""
+        return len(self._sessions)
+
+    def _customer_of(self, username):
+        if username and not self.is_agent(username) and TRANSFER_SEP not in username:
+            self._current_customer = username
+            return username, False
+        return self._current_customer, True
+
+    def _close(self, customer, closed):
+        session = self._sessions.pop(customer)
+        conversation = session.to_dict()
+        self.closed += 1
+        closed.append(conversation)
+        if self.on_close:
+            self.on_close(conversation)
+
+    def _expire(self, now, closed):
+        """按到达顺序关闭空闲超过 idle_gap 的会话，以及超出 max_open 的最久未活动会话"""
+        sessions = self._sessions
+        while sessions:
+            customer, session = next(iter(sessions.items()))
+            if len(sessions) <= self.max_open and now - session.arrived <= self.idle_gap:
+                break
+            self._close(customer, closed)
+
+    def add(self, message_data):
+        """加入一条消息，返回因此结束的会话"""
+        closed = []
+        with self._lock:
+            username = message_data.get('username') or ''
+            customer, from_agent = self._customer_of(username)
+            epoch = to_epoch(message_data.get('timestamp'))
+
+            session = self._sessions.get(customer)
+            if (session is not None and epoch is not None and session.end is not None and
+                    epoch - session.end > self.idle_gap):
+                self._close(customer, closed)
+                session = None
+            if session is None:
+                session = _Session(customer)
+                self._sessions[customer] = session
+            now = self.clock()
+            session.arrived = now
+            self._sessions.move_to_end(customer)
+
+            # 进行中的会话可能很多，消息用紧凑表示保存，结束时再转回 dict
+            session.messages.append(ChatMessage.from_dict(message_data))
+            if TRANSFER_SEP in username:
+                source, target = username.split(TRANSFER_SEP, 1)
+                session.transfers.append({'from': source, 'to': target,
+                                          'timestamp': message_data.get('timestamp')})
+            elif from_agent and username and username not in session.agents:
+                session.agents.append(username)
+
+            if epoch is not None:
+                if session.start is None or epoch < session.start:
+                    session.start = epoch
+                    session.start_time = message_data.get('timestamp')
+                if session.end is None or epoch >= session.end:
+                    session.end = epoch
+                    session.end_time = message_data.get('timestamp')
+            self._expire(now, closed)
+        return closed
+
+    __call__ = add
+
+    def add_many(self, messages):
+        closed = []
+        for message_data in messages:
+            closed.extend(self.add(message_data))
+        return closed
+
+    def expire(self, now=None):
+        """没有新消息时关闭空闲超过 idle_gap 的会话，返回结束的会话；now 默认取 clock()"""
+        closed = []
+        with self._lock:
+            self._expire(self.clock() if now is None else now, closed)
+        return closed
+
+    def flush(self):
+        """输入结束：输出所有进行中的会话"""
+        closed = []
+        with self._lock:
+            for customer in list(self._sessions):
+                self._close(customer, closed)
+            self._current_customer = None
+        return closed
+
+
+def iter_conversations(messages, idle_gap=DEFAULT_IDLE_GAP, is_agent=is_agent_name, max_open=DEFAULT_MAX_OPEN):
+    """逐条消息输入，边切分边产出结束的会话"""
+    sessionizer = ConversationSessionizer(idle_gap, is_agent=is_agent, max_open=max_open)
+    for message_data in messages:
+        for conversation in sessionizer.add(message_data):
+            yield conversation
+    for conversation in sessionizer.flush():
+        yield conversation
+
+
+def main():
+    parser = argparse.ArgumentParser(description="把解析后的聊天消息按客户切分成会话")
+    parser.add_argument('input', nargs='?', default=DEFAULT_CHAT_FILE, help='解析后的JSONL消息文件')
+    parser.add_argument('-o', '--output', default=DEFAULT_CONVERSATIONS_FILE, help='会话输出文件（JSONL）')
+    parser.add_argument('--idle-gap', type=int, default=DEFAULT_IDLE_GAP, help='会话空闲多少秒算结束')
+    parser.add_argument('--max-open', type=int, default=DEFAULT_MAX_OPEN, help='最多同时保存多少个进行中的会话')
+    args = parser.parse_args()
+
+    count = 0
+    with JsonlMessageStore(args.output, fsync_every=1000) as store:
+        for conversation in iter_conversations(iter_messages(args.input), args.idle_gap,
+                                               max_open=args.max_open):
+            store.append(conversation)
+            count += 1
+    print(f"已输出 {count} 个会话到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛时间戳批量校验和转换
+千牛的时间戳是 'YYYY-M-D H:MM:SS' 格式的本地时间字符串，按字符串比较时
+'2025-9-2' 会排在 '2025-10-1' 后面。这里把一批时间戳一次性转成整数秒
+（按本地时间计算，不做时区换算），排序、范围查询、去重直接比较整数。
+
+    to_epochs(['2025-9-19 10:00:00', None, 'abc'])  -> [1758276000, None, None]
+    to_datetime64(...)                               -> numpy datetime64[s] 数组（需要 numpy）
+    attach_epochs(messages)                          -> 每条消息加上 'epoch' 字段
+
+年份范围默认 2020-2030。解析器判断消息头和这里的模块级函数（default_normalizer）共用同一个范围，
+用 set_year_window 统一修改；多进程解析时把 get_year_window() 作为参数传给子进程
+（spawn 方式启动的子进程不会继承修改后的模块状态）。
+单独创建的 TimestampNormalizer(year_window) 使用自己的范围。
+"""
+
+import re
+from datetime import datetime, timedelta
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_YEAR_WINDOW = (2020, 2030)
+
+# 整批时间戳用换行连接后只做一次正则扫描：每个匹配正好吃掉一行（含换行符），
+# 结果与输入一一对应，不是时间戳的行各组为空字符串
+_BATCH_RE = re.compile(
+    r'[ \t]*(\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{1,2}):(\d{1,2})[ \t]*\n|[^\n]*\n')
+
+_DAYS_BEFORE_MONTH = (
+    (0, 0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334),
+    (0, 0, 31, 60, 91, 121, 152, 182, 213, 244, 274, 305, 335),
+)
+_DAYS_IN_MONTH = (
+    (0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+    (0, 31, 29, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31),
+)
+
+
+def _is_leap(year):
+    return year % 4 == 0 and (year % 100 != 0 or year % 400 == 0)
+
+
+def _days_before_year(year):
+    """1970-01-01 到 year-01-01 的天数"""
+    y = year - 1
+    return y * 365 + y // 4 - y // 100 + y // 400 - 719162
+
+
+class TimestampNormalizer:
+    """
+    时间戳批量转换器
+
+    每个年份的起始秒数预先算好，转换时只做查表和整数运算，不创建 datetime 对象。
+    不存在的日期（例如 2025-2-30）和年份范围外的时间戳返回None。
+    """
+
+    def __init__(self, year_window=DEFAULT_YEAR_WINDOW):
+        self.set_year_window(year_window)
+
+    def set_year_window(self, year_window):
+        """修改允许的年份范围（包含两端）"""
+        min_year, max_year = year_window
+        # 年份 -> (该年1月1日的秒数, 每月之前的天数, 每月天数)
+        years = {}
+        for year in range(min_year, max_year + 1):
+            leap = _is_leap(year)
+            years[year] = (_days_before_year(year) * 86400,
+                           _DAYS_BEFORE_MONTH[leap], _DAYS_IN_MONTH[leap])
+        self.min_year, self.max_year = min_year, max_year
+        self._years = years
+
+    def _epoch(self, year, month, day, hour, minute, second):
+        year_info = self._years.get(year)
+        if (year_info is None or not 1 <= month <= 12 or
+                hour > 23 or minute > 59 or second > 59):
+            return None
+        year_start, days_before_month, days_in_month = year_info
+        if not 1 <= day <= days_in_month[month]:
+            return None
+        return (year_start + (days_before_month[month] + day - 1) * 86400 +
+                hour * 3600 + minute * 60 + second)
+
+    def to_epoch(self, value):
+        """单个时间戳 -> 整数秒，无法识别返回None"""
+        return self.to_epochs([value])[0]
+
+    def to_epochs(self, values):
+        """
+        一批时间戳 -> 整数秒列表，与输入一一对应
+        values 中可以有 None、datetime 和任意字符串
+        """
+        values = list(values)
+        texts = []
+        for value in values:
+            if isinstance(value, str) and '\n' not in value and '\r' not in value:
+                texts.append(value)
+            else:
+                texts.append('')
+        epoch = self._epoch
+        results = [epoch(*map(int, groups)) if groups[0] else None
+                   for groups in _BATCH_RE.findall('\n'.join(texts) + '\n')]
+        for index, value in enumerate(values):
+            if isinstance(value, datetime):
+                results[index] = epoch(value.year, value.month, value.day,
+                                       value.hour, value.minute, value.second)
+        return results
+
+    def attach_epochs(self, messages, key='epoch'):
+        """给解析后的消息批量加上整数秒字段（原地修改），返回消息列表"""
+        messages = list(messages)
+        for message_data, epoch in zip(messages, self.to_epochs(m.get('timestamp') for m in messages)):
+            message_data[key] = epoch
+        return messages
+
+    def to_datetime64(self, values):
+        """一批时间戳 -> numpy datetime64[s] 数组，无法识别的为 NaT"""
+        if not NUMPY_AVAILABLE:
+            raise RuntimeError("to_datetime64 需要安装 numpy: pip install numpy")
+        epochs = self.to_epochs(values)
+        array = np.array([e if e is not None else np.iinfo(np.int64).min for e in epochs], dtype=np.int64)
+        return array.astype('datetime64[s]')
+
+    def to_text(self, epoch):
+        """整数秒 -> 可排序的 'YYYY-MM-DD HH:MM:SS'"""
+        if epoch is None:
+            return None
+        return epoch_to_datetime(epoch).strftime('%Y-%m-%d %H:%M:%S')
+
+
+_EPOCH_START = datetime(1970, 1, 1)
+
+
+def epoch_to_datetime(epoch):
+    """整数秒 -> datetime（本地时间，不带时区）"""
+    return _EPOCH_START + timedelta(seconds=epoch)
+
+
+default_normalizer = TimestampNormalizer()
+# 年份范围变化时需要同步的回调（解析器），见 on_year_window_change
+_year_window_listeners = []
+
+
+def get_year_window():
+    """当前共用的年份范围 (min_year, max_year)"""
+    return default_normalizer.min_year, default_normalizer.max_year
+
+
+def set_year_window(min_year, max_year):
+    """修改解析器和 default_normalizer 共用的年份范围（包含两端），默认 2020-2030"""
+    default_normalizer.set_year_window((min_year, max_year))
+    for listener in _year_window_listeners:
+        listener(min_year, max_year)
+
+
+def use_year_window(year_window):
+    """进程池子进程按任务参数设置年份范围，与当前相同时不做任何事"""
+    if tuple(year_window) != get_year_window():
+        set_year_window(*year_window)
+
+
+def on_year_window_change(listener):
+    """注册 listener(min_year, max_year)，立即按当前范围调用一次"""
+    _year_window_listeners.append(listener)
+    listener(*get_year_window())
+
+
+to_epochs = default_normalizer.to_epochs
+to_epoch = default_normalizer.to_epoch
+to_datetime64 = default_normalizer.to_datetime64
+attach_epochs = default_normalizer.attach_epochs
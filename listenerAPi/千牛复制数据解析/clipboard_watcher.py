@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板变化监听
+把"剪贴板是否变化"和"读取剪贴板内容"拆成可替换的后端：
+    1. Win32ClipboardBackend  - 剪贴板序号（GetClipboardSequenceNumber），变化检测几乎零开销
+    2. PyperclipBackend       - 进程内读取文本，比较内容判断变化
+    3. PowerShellBackend      - 通过常驻 powershell 辅助进程读取，最后的兜底方案
+    4. FakeClipboardBackend   - 内存中的假剪贴板，用于在Linux上测试
+采集循环在 hook_core.ClipboardCapture 中，直接使用这里的后端
+"""
+
+import sys
+import threading
+import time
+
+
+class ClipboardBackend:
+    """剪贴板后端基类"""
+
+    name = 'base'
+    # wait_for_change 默认实现的轮询间隔（秒）
+    poll_interval = 0.5
+
+    def get_sequence(self):
+        """返回当前剪贴板的变化标识，剪贴板内容变化后标识随之变化"""
+        raise NotImplementedError
+
+    def read_text(self):
+        """读取剪贴板文本"""
+        raise NotImplementedError
+
+    def text_for_sequence(self, sequence):
+        """返回变化标识对应的剪贴板文本"""
+        return self.read_text()
+
+    def wait_for_change(self, last_sequence, timeout):
+        """
+        等待剪贴板变化
+        返回新的变化标识；超时仍未变化返回None
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            sequence = self.get_sequence()
+            if sequence != last_sequence:
+                return sequence
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            time.sleep(min(self.poll_interval, remaining))
+
+
+class Win32ClipboardBackend(ClipboardBackend):
+    """
+    Windows 原生剪贴板后端（ctypes）
+    GetClipboardSequenceNumber 在剪贴板每次变化时递增，检查它不需要打开剪贴板，
+    只有序号变化时才真正读取文本。
+    """
+
+    name = 'win32'
+    poll_interval = 0.05
+
+    CF_UNICODETEXT = 13
+
+    def __init__(self):
+        import ctypes
+        from ctypes import wintypes
+
+        self._ctypes = ctypes
+        self.user32 = ctypes.windll.user32
+        self.kernel32 = ctypes.windll.kernel32
+
+        self.user32.GetClipboardSequenceNumber.restype = wintypes.DWORD
+        self.user32.OpenClipboard.argtypes = [wintypes.HWND]
+        self.user32.OpenClipboard.restype = wintypes.BOOL
+        self.user32.GetClipboardData.argtypes = [wintypes.UINT]
+        self.user32.GetClipboardData.restype = wintypes.HANDLE
+        self.kernel32.GlobalLock.argtypes = [wintypes.HGLOBAL]
+        self.kernel32.GlobalLock.restype = wintypes.LPVOID
+        self.kernel32.GlobalUnlock.argtypes = [wintypes.HGLOBAL]
+
+    def get_sequence(self):
+        return self.user32.GetClipboardSequenceNumber()
+
+    def read_text(self):
+        # 剪贴板可能正被其他程序占用，稍等重试
+        for _ in range(5):
+            if self.user32.OpenClipboard(None):
+                break
+            time.sleep(0.01)
+        else:
+            return ""
+        try:
+            handle = self.user32.GetClipboardData(self.CF_UNICODETEXT)
+            if not handle:
+                return ""
+            pointer = self.kernel32.GlobalLock(handle)
+            if not pointer:
+                return ""
+            try:
+                return self._ctypes.wstring_at(pointer)
+            finally:
+                self.kernel32.GlobalUnlock(handle)
+        finally:
+            self.user32.CloseClipboard()
+
+
+class PyperclipBackend(ClipboardBackend):
+    """进程内读取剪贴板（pyperclip），以文本内容作为变化标识"""
+
+    name = 'pyperclip'
+    poll_interval = 0.2
+
+    def __init__(self):
+        import pyperclip
+        self._paste = pyperclip.paste
+
+    def get_sequence(self):
+        return self.read_text()
+
+    def read_text(self):
+        return self._paste() or ""
+
+    def text_for_sequence(self, sequence):
+        return sequence
+
+
+class PowerShellBackend(ClipboardBackend):
+    """通过常驻 powershell 辅助进程读取剪贴板（见 powershell_helper），只在其他后端都不可用时使用"""
+
+    name = 'powershell'
+    poll_interval = 0.5
+
+    def __init__(self, helper=None):
+        if helper is None:
+            from powershell_helper import get_helper
+            helper = get_helper()
+        self.helper = helper
+
+    def read_text(self):
+        return self.helper.get_clipboard().strip()
+
+    def get_sequence(self):
+        return self.read_text()
+
+    def text_for_sequence(self, sequence):
+        return sequence
+
+
+class FakeClipboardBackend(ClipboardBackend):
+    """内存中的假剪贴板，set_text 会立即唤醒等待中的监听"""
+
+    name = 'fake'
+
+    def __init__(self, text=""):
+        self._text = text
+        self._sequence = 0
+        self._condition = threading.Condition()
+
+    def set_text(self, text):
+        """模拟复制"""
+        with self._condition:
+            self._text = text
+            self._sequence += 1
+            self._condition.notify_all()
+
+    def get_sequence(self):
+        with self._condition:
+            return self._sequence
+
+    def read_text(self):
+        with self._condition:
+            return self._text
+
+    def wait_for_change(self, last_sequence, timeout):
+        with self._condition:
+            if self._condition.wait_for(lambda: self._sequence != last_sequence, timeout):
+                return self._sequence
+            return None
+
+
+def create_clipboard_backend(prefer=None):
+    """
+    按开销从低到高选择可用的剪贴板后端
+    prefer 可指定后端名称：win32 / pyperclip / powershell / fake
+    所有后端都不可用时抛出 RuntimeError
+    """
+    factories = [
+        ('win32', Win32ClipboardBackend),
+        ('pyperclip', PyperclipBackend),
+        ('powershell', PowerShellBackend),
+    ]
+    if prefer == 'fake':
+        return FakeClipboardBackend()
+    if prefer:
+        factories = [item for item in factories if item[0] == prefer] or factories
+    for name, factory in factories:
+        if name == 'win32' and sys.platform != 'win32':
+            continue
+        try:
+            return factory()
+        except Exception as e:
+            print(f"⚠️ 剪贴板后端 {name} 不可用: {e}")
+    raise RuntimeError("没有可用的剪贴板后端：需要 Windows、pyperclip 或 powershell")
+
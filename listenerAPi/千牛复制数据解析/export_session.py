@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛全店聊天记录导出会话（见 千牛数据分析.md）
+在客户列表里逐个按 ↓ 切换客户，全选聊天记录并 Ctrl+C，复制内容交给 HookEngine 保存和解析。
+
+    - 每导出一个客户就往检查点文件追加一行。程序中断后重新运行仍从列表顶部开始，
+      按客户ID跳过已导出的客户（千牛会按最新消息重新排序客户列表，不能按位置跳转）
+    - 复制失败的位置记入失败列表，走完一遍后回到顶部再走一遍重试（最多 max_passes 遍）
+    - 不再固定 sleep：复制后等待剪贴板变化（见 clipboard_watcher），
+      内容和上一个客户相同说明聊天框还没刷新，短暂等待后重新复制
+    - 连续几次按 ↓ 后复制到的都是同一个客户，说明已经到列表末尾
+
+用法（先在千牛里选中客户列表的第一个客户）：
+    python export_session.py --max-customers 500
+"""
+
+import argparse
+import collections
+import hashlib
+import time
+from datetime import datetime
+
+from clipboard_watcher import FakeClipboardBackend, create_clipboard_backend
+from hook_core import HookEngine, HookSettings
+from message_store import JsonlMessageStore, iter_messages
+from powershell_helper import get_helper
+
+try:
+    from readcliper import TRANSFER_SEP, parse_qianniu_chat_to_json
+except ImportError as e:
+    parse_qianniu_chat_to_json = None
+    TRANSFER_SEP = ' --> '
+    print(f"⚠️ 聊天记录解析不可用，客户按内容摘要识别: {e}")
+
+DEFAULT_CHECKPOINT_FILE = "qianniu_export_checkpoint.jsonl"
+
+# SendKeys 按键
+KEY_DOWN = '{DOWN}'
+KEY_UP_N = '{UP %d}'
+KEY_SELECT_ALL = '^a'
+KEY_COPY = '^c'
+
+
+class ExportCheckpoint:
+    """
+    导出检查点：每个已导出的客户一行 {"position", "customer", "messages", "time"}
+    只追加、每行 fsync，中断时最多丢失正在导出的那个客户
+    """
+
+    def __init__(self, filename=DEFAULT_CHECKPOINT_FILE):
+        self.filename = filename
+        self.done = set()
+        self.position = 0
+        for record in iter_messages(filename):
+            self.done.add(record['customer'])
+            self.position = max(self.position, record['position'] + 1)
+        self._store = JsonlMessageStore(filename, fsync_every=1)
+
+    def __contains__(self, customer_id):
+        return customer_id in self.done
+
+    def mark_done(self, position, customer_id, message_count):
+        self.done.add(customer_id)
+        self.position = max(self.position, position + 1)
+        self._store.append({
+            'position': position,
+            'customer': customer_id,
+            'messages': message_count,
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        })
+
+    def close(self):
+        self._store.close()
+
+
+class KeySender:
+    """按键发送基类，keys 使用 SendKeys 语法"""
+
+    def send(self, keys):
+        raise NotImplementedError
+
+
+class PowerShellKeySender(KeySender):
+    """通过常驻 powershell 辅助进程的 SendKeys 发送按键"""
+
+    def __init__(self, helper=None):
+        self.helper = helper or get_helper()
+
+    def send(self, keys):
+        self.helper.send_keys(keys)
+
+
+class FakeKeySender(KeySender):
+    """
+    模拟千牛客户列表，用于在Linux上测试
+    transcripts: 每个客户的聊天记录文本；Ctrl+C 时把当前客户的记录写入假剪贴板
+    """
+
+    def __init__(self, transcripts, clipboard=None):
+        self.transcripts = list(transcripts)
+        self.clipboard = clipboard or FakeClipboardBackend()
+        self.position = 0
+        self.sent = []
+
+    def send(self, keys):
+        self.sent.append(keys)
+        if keys.startswith(('{DOWN', '{UP')):
+            count = int(keys[1:-1].split()[1]) if ' ' in keys else 1
+            if keys.startswith('{UP'):
+                count = -count
+            self.position = max(0, min(self.position + count, len(self.transcripts) - 1))
+        elif keys == KEY_COPY:
+            self.clipboard.set_text(self.transcripts[self.position])
+
+
+def identify_customer(text, messages=None):
+    """
+    从复制的聊天记录里找客户ID：出现次数最多、不含 ':'（子账号）也不是转交记录的用户名
+    找不到时返回None
+    """
+    if messages is None:
+        messages = parse_qianniu_chat_to_json(text) if parse_qianniu_chat_to_json else []
+    counts = collections.Counter(
+        m['username'] for m in messages
+        if m.get('username') and ':' not in m['username'] and TRANSFER_SEP not in m['username'])
+    if not counts:
+        return None
+    return counts.most_common(1)[0][0]
+
+
+def _content_id(text):
+    """找不到客户ID时用内容摘要代替（列表重新排序后仍然不变，不能用位置）"""
+    return 'digest-' + hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+
+class ExportSession:
+    """
+    客户列表遍历导出
+
+    keys: KeySender；clipboard: 剪贴板后端；engine: 保存和解析复制内容的 HookEngine
+    copy_timeout: 每次复制等待剪贴板变化的最长时间
+    copy_retries: 聊天框还没刷新时重新复制的次数
+    end_after: 连续多少次复制到重复客户就认为到了列表末尾
+    max_passes: 有失败时最多从顶部走几遍客户列表（第一遍之后的都是重试）
+    """
+
+    def __init__(self, keys, clipboard=None, engine=None, checkpoint=None,
+                 copy_timeout=2.0, copy_retries=3, retry_delay=0.2, end_after=3, max_passes=2):
+        self.keys = keys
+        self.clipboard = clipboard or create_clipboard_backend()
+        self.engine = engine or HookEngine(HookSettings())
+        self.checkpoint = checkpoint or ExportCheckpoint()
+        self.copy_timeout = copy_timeout
+        self.copy_retries = copy_retries
+        self.retry_delay = retry_delay
+        self.end_after = end_after
+        self.max_passes = max_passes
+        self.position = 0
+        self.last_text = None
+        self.exported = 0
+        self.skipped = 0
+        self.failed = 0
+        # 本遍复制失败的客户：{"position", "customer"（复制不到内容时为None）, "reason"}
+        self.failures = []
+
+    def copy_chat(self):
+        """
+        全选并复制当前聊天记录，等待剪贴板变化
+        返回新内容；内容与上一个客户相同或超时返回None
+        """
+        for attempt in range(self.copy_retries + 1):
+            sequence = self.clipboard.get_sequence()
+            self.keys.send(KEY_SELECT_ALL)
+            self.keys.send(KEY_COPY)
+            new_sequence = self.clipboard.wait_for_change(sequence, self.copy_timeout)
+            if new_sequence is not None:
+                text = self.clipboard.text_for_sequence(new_sequence)
+                if text and text != self.last_text:
+                    return text
+            # 聊天框还没切换到新客户，稍等后重新复制
+            time.sleep(self.retry_delay * (attempt + 1))
+        return None
+
+    def export_current(self):
+        """导出当前选中的客户，返回是否复制到新内容（失败的客户记入 failures）"""
+        text = self.copy_chat()
+        if text is None:
+            self.failures.append({'position': self.position, 'customer': None, 'reason': 'copy_timeout'})
+            return False
+        self.last_text = text
+        messages = parse_qianniu_chat_to_json(text) if parse_qianniu_chat_to_json else []
+        customer_id = identify_customer(text, messages) or _content_id(text)
+        if customer_id in self.checkpoint:
+            self.skipped += 1
+            return True
+        try:
+            self.engine.handle(text, source='export_session', record_type='qianniu_chat')
+        except Exception as e:
+            print(f"[{self.position + 1}] {customer_id}: 保存失败: {e}")
+            self.failures.append({'position': self.position, 'customer': customer_id, 'reason': str(e)})
+            return True
+        self.checkpoint.mark_done(self.position, customer_id, len(messages))
+        self.exported += 1
+        print(f"[{self.position + 1}] {customer_id}: {len(messages)} 条消息")
+        return True
+
+    def _walk(self, max_customers):
+        """从当前选中的客户往下走到列表末尾或达到 max_customers"""
+        misses = 0
+        while max_customers is None or self.exported < max_customers:
+            if self.export_current():
+                misses = 0
+            else:
+                misses += 1
+                if misses >= self.end_after:
+                    # 末尾几次复制不到新内容是因为到了列表末尾，不算失败
+                    del self.failures[-misses:]
+                    print("连续多次没有复制到新客户，认为已到列表末尾")
+                    return
+            self.keys.send(KEY_DOWN)
+            self.position += 1
+
+    def _to_top(self):
+        """回到客户列表顶部"""
+        if self.position:
+            self.keys.send(KEY_UP_N % self.position)
+        self.position = 0
+        self.last_text = None
+
+    def run(self, max_customers=None):
+        """
+        从当前选中的客户（应为列表第一个）遍历到末尾，已在检查点中的客户跳过；
+        有失败时回到顶部再走一遍，直到没有失败、达到 max_passes、max_customers 或 Ctrl+C
+        """
+        if self.checkpoint.done:
+            print(f"检查点中已导出 {len(self.checkpoint.done)} 个客户，从列表顶部开始，已导出的按客户ID跳过")
+        started = time.monotonic()
+        try:
+            for pass_index in range(self.max_passes):
+                if pass_index:
+                    print(f"第 {pass_index + 1} 遍：重试 {len(self.failures)} 个失败的客户")
+                    self._to_top()
+                    self.failures = []
+                self._walk(max_customers)
+                self.failed += len(self.failures)
+                if not self.failures or (max_customers is not None and self.exported >= max_customers):
+                    break
+        except KeyboardInterrupt:
+            print("\n导出中断，下次运行会按检查点跳过已导出的客户")
+        print(f"导出 {self.exported} 个客户，跳过 {self.skipped} 个，失败 {self.failed} 次，"
+              f"用时 {time.monotonic() - started:.1f} 秒")
+        for failure in self.failures:
+            print(f"  仍然失败: 第 {failure['position'] + 1} 个 {failure['customer'] or '(未复制到内容)'}: "
+                  f"{failure['reason']}")
+
+    def close(self):
+        self.checkpoint.close()
+        self.engine.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千牛客户列表遍历导出聊天记录")
+    parser.add_argument('--checkpoint', default=DEFAULT_CHECKPOINT_FILE, help='检查点文件')
+    parser.add_argument('--max-customers', type=int, help='最多导出多少个客户')
+    parser.add_argument('--copy-timeout', type=float, default=2.0, help='每次复制等待剪贴板变化的秒数')
+    parser.add_argument('--max-passes', type=int, default=2, help='有失败时最多从顶部走几遍客户列表')
+    parser.add_argument('--start-delay', type=float, default=3.0, help='开始前等待几秒，用于切换到千牛窗口')
+    args = parser.parse_args()
+
+    print(f"{args.start_delay} 秒后开始，请切换到千牛并选中客户列表的第一个客户...")
+    time.sleep(args.start_delay)
+    session = ExportSession(PowerShellKeySender(), checkpoint=ExportCheckpoint(args.checkpoint),
+                            copy_timeout=args.copy_timeout, max_passes=args.max_passes)
+    try:
+        session.run(args.max_customers)
+    finally:
+        session.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛Hook公共引擎
+三个Hook（pywin32 / ctypes / pyperclip）只负责找窗口和提供采集后端，
+采集循环、去重、格式判断、保存和解析都在这里实现一次：
+
+    采集后端 --> HookEngine（去重、格式判断、回调）--> MessagePipeline --> 存储
+
+采集后端：
+    ClipboardCapture  - 剪贴板变化（见 clipboard_watcher）
+    WindowTextCapture - 聊天窗口文本的新增部分（见 transcript_diff）
+"""
+
+import threading
+import time
+from datetime import datetime
+
+from clipboard_watcher import create_clipboard_backend
+from message_dedup import DEFAULT_INDEX_FILE, MessageDedupIndex
+from message_pipeline import POLICY_BLOCK, MessagePipeline
+from message_store import DEFAULT_CHAT_FILE, DEFAULT_STORE_FILE, JsonlMessageStore
+from transcript_diff import TranscriptDiff
+
+try:
+    from readcliper import QianniuChatStreamParser, parse_qianniu_chat_to_json
+except ImportError as e:
+    # readcliper 依赖 pyperclip/pillow，缺少时只保存原始记录，不解析
+    QianniuChatStreamParser = parse_qianniu_chat_to_json = None
+    print(f"⚠️ 聊天记录解析不可用: {e}")
+
+
+class HookSettings:
+    """Hook可调参数，三个Hook共用"""
+
+    def __init__(self, poll_interval=0.5, batch_size=20, queue_depth=1000, queue_policy=POLICY_BLOCK,
+                 messages_file=DEFAULT_STORE_FILE, chat_file=DEFAULT_CHAT_FILE,
+                 index_file=DEFAULT_INDEX_FILE, parse_messages=True, store_full_content=False,
+                 parser_stats_file=None, search_index_file=None,
+                 conversations_file=None, session_idle_gap=30 * 60,
+                 metrics_file=None, metrics_interval=10.0, capture_record_file=None,
+                 sqlite_archive_file=None):
+        # 采集轮询/等待间隔（秒）
+        self.poll_interval = poll_interval
+        # 存储每多少条记录fsync一次
+        self.batch_size = batch_size
+        # 流水线每个队列的长度和满队列策略
+        self.queue_depth = queue_depth
+        self.queue_policy = queue_policy
+        # 原始记录、解析后消息和去重索引文件
+        self.messages_file = messages_file
+        self.chat_file = chat_file
+        self.index_file = index_file
+        # 是否解析聊天记录（需要 readcliper）
+        self.parse_messages = parse_messages
+        # 是否在每条记录里保存完整文本（旧格式）；默认只保存新增部分，
+        # 窗口文本记录附带 offset/reset，文件大小只随新消息线性增长
+        self.store_full_content = store_full_content
+        # 设置后解析时统计规则命中和耗时（见 parser_profile），stop() 时写入该文件
+        self.parser_stats_file = parser_stats_file
+        # 设置后解析出的新消息同时加入全文检索索引（见 chat_search_index）
+        self.search_index_file = search_index_file
+        # 设置后解析出的新消息按客户切分成会话，结束的会话写入该文件（见 chat_sessions）
+        self.conversations_file = conversations_file
+        self.session_idle_gap = session_idle_gap
+        # 设置后累计客服指标，每 metrics_interval 秒把快照写入该文件（见 chat_metrics）
+        self.metrics_file = metrics_file
+        self.metrics_interval = metrics_interval
+        # 设置后把采集到的原始内容和时间记录到该文件，用于离线回放（见 capture_replay）
+        self.capture_record_file = capture_record_file
+        # 设置后解析出的新消息同时写入 SQLite 归档（见 chat_archive_sqlite）
+        self.sqlite_archive_file = sqlite_archive_file
+
+
+class CaptureBackend:
+    """采集后端基类"""
+
+    source = 'base'
+    record_type = 'text'
+
+    def read(self, timeout):
+        """
+        等待新内容，最多等待 timeout 秒
+        返回 (新内容, 完整内容)，没有新内容返回None
+        """
+        raise NotImplementedError
+
+    def metadata(self):
+        """最近一次 read 返回内容的附加字段，会写入记录"""
+        return None
+
+
+class ClipboardCapture(CaptureBackend):
+    """剪贴板采集：剪贴板变化且与上次内容不同时返回"""
+
+    def __init__(self, backend=None, source='clipboard', record_type='qianniu_chat'):
+        self.backend = backend or create_clipboard_backend()
+        self.source = source
+        self.record_type = record_type
+        self.last_sequence = None
+        self.last_text = ""
+
+    def read(self, timeout):
+        sequence = self.backend.wait_for_change(self.last_sequence, timeout)
+        if sequence is None:
+            return None
+        self.last_sequence = sequence
+        text = self.backend.text_for_sequence(sequence)
+        if not text or text == self.last_text:
+            return None
+        self.last_text = text
+        return text, text
+
+
+class WindowTextCapture(CaptureBackend):
+    """
+    窗口文本采集：只返回聊天窗口新追加的文本
+    新增部分原样返回（不去空白），同一段记录的各次新增按 offset 依次拼接就是窗口全文；
+    只有空白的新增先暂存，拼到下一次新增的前面
+    """
+
+    source = 'window_text'
+    record_type = 'new_message'
+
+    def __init__(self, read_text, poll_interval=0.5):
+        self.read_text = read_text
+        self.poll_interval = poll_interval
+        self.transcript = TranscriptDiff()
+        self._held = ""
+        self._held_offset = 0
+        self._held_reset = False
+        self._offset = 0
+        self._reset = False
+
+    def read(self, timeout):
+        current_text = self.read_text()
+        if current_text:
+            new_text = self.transcript.feed(current_text)
+            if new_text:
+                transcript = self.transcript
+                if transcript.last_reset or not self._held:
+                    # 切换了会话时，暂存的空白属于上一段记录，丢弃
+                    self._held = ""
+                    self._held_offset = transcript.last_offset
+                    self._held_reset = transcript.last_reset
+                self._held += new_text
+                if self._held.strip():
+                    new_text, self._held = self._held, ""
+                    self._offset, self._reset = self._held_offset, self._held_reset
+                    return new_text, current_text
+        time.sleep(min(self.poll_interval, timeout))
+        return None
+
+    def metadata(self):
+        return {'offset': self._offset, 'reset': self._reset}
+
+
+class HookEngine:
+    """
+    Hook公共引擎
+
+    run(capture) 在当前线程循环采集，start(capture) 在后台线程采集。
+    每条采集记录先交给 message_callback（同步，应当很快），再提交到后台流水线保存和解析。
+    """
+
+    def __init__(self, settings=None, message_callback=None):
+        self.settings = settings or HookSettings()
+        self.message_callback = message_callback
+        self.is_running = False
+        self.thread = None
+        self.captured = 0
+        self.rejected = 0
+        self._stores = []
+        self.parser_profile = None
+        self.sessionizer = None
+        self.recorder = None
+        if self.settings.capture_record_file:
+            from capture_replay import CaptureRecorder
+            self.recorder = CaptureRecorder(self.settings.capture_record_file)
+        self.pipeline = self._create_pipeline()
+        self._pipeline_started = False
+        self._lock = threading.Lock()
+
+    def _create_pipeline(self):
+        settings = self.settings
+        raw_store = JsonlMessageStore(settings.messages_file, fsync_every=settings.batch_size)
+        self._stores.append(raw_store)
+        options = {
+            'record_sinks': [raw_store.append],
+            'queue_size': settings.queue_depth,
+            'policy': settings.queue_policy,
+        }
+        if settings.parse_messages and parse_qianniu_chat_to_json:
+            chat_store = JsonlMessageStore(settings.chat_file, fsync_every=settings.batch_size)
+            self._stores.append(chat_store)
+            options['message_sinks'] = [chat_store.append]
+            if settings.search_index_file:
+                from chat_search_index import ChatSearchIndex
+                search_index = ChatSearchIndex(settings.search_index_file)
+                self._stores.append(search_index)
+                options['message_sinks'].append(search_index.add)
+            if settings.sqlite_archive_file:
+                from chat_archive_sqlite import SqliteChatArchive
+                archive = SqliteChatArchive(settings.sqlite_archive_file)
+                self._stores.append(archive)
+                options['message_sinks'].append(archive.add)
+            if settings.conversations_file:
+                from chat_sessions import ConversationSessionizer
+                conversation_store = JsonlMessageStore(settings.conversations_file, fsync_every=settings.batch_size)
+                self._stores.append(conversation_store)
+                self.sessionizer = ConversationSessionizer(settings.session_idle_gap, on_close=conversation_store.append)
+                options['message_sinks'].append(self.sessionizer.add)
+            if settings.metrics_file:
+                from chat_metrics import ServiceMetrics
+                # 从上次的快照继续累计
+                metrics = ServiceMetrics.load(settings.metrics_file, snapshot_file=settings.metrics_file,
+                                              snapshot_interval=settings.metrics_interval)
+                self._stores.append(metrics)
+                options['message_sinks'].append(metrics.add)
+            options['parse'] = parse_qianniu_chat_to_json
+            # 窗口文本记录只有新增部分，按段增量解析，跨两次采集的消息不会丢
+            options['stream_parser'] = QianniuChatStreamParser
+            if settings.parser_stats_file:
+                from parser_profile import ParserProfile
+                self.parser_profile = ParserProfile()
+                options['parse'] = self.parser_profile.parse
+            options['dedup_index'] = MessageDedupIndex(settings.index_file)
+        return MessagePipeline(**options)
+
+    def on_message(self, callback):
+        """设置消息回调函数"""
+        self.message_callback = callback
+
+    def _ensure_pipeline(self):
+        with self._lock:
+            if not self._pipeline_started:
+                self.pipeline.start()
+                self._pipeline_started = True
+
+    def handle(self, content, full_content=None, source='manual_copy', record_type='manual', extra=None):
+        """处理一条采集内容：组装记录、回调、提交保存，返回记录"""
+        self._ensure_pipeline()
+        message_data = {
+            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'content': content,
+        }
+        if self.settings.store_full_content:
+            message_data['full_content'] = full_content if full_content is not None else content
+        message_data['source'] = source
+        message_data['type'] = record_type
+        if extra:
+            message_data.update(extra)
+        self.captured += 1
+        if self.message_callback:
+            self.message_callback(message_data)
+        self.pipeline.submit(message_data)
+        return message_data
+
+    def run(self, capture, accept=None):
+        """
+        在当前线程循环采集，直到 stop() 或 Ctrl+C
+        accept(text) 返回False的内容不保存（例如非千牛格式的剪贴板）
+        """
+        self._ensure_pipeline()
+        self.is_running = True
+        while self.is_running:
+            try:
+                captured = capture.read(self.settings.poll_interval)
+                if captured is None:
+                    if self.sessionizer is not None:
+                        # 没有新内容时也要结束空闲的会话，客户不再说话时会话不会一直挂着
+                        self.sessionizer.expire()
+                    continue
+                content, full_content = captured
+                if self.recorder is not None:
+                    # 在格式判断之前记录，回放时被拒绝的内容同样会被拒绝
+                    self.recorder.record(capture, content)
+                if accept and not accept(full_content):
+                    self.rejected += 1
+                    continue
+                self.handle(content, full_content, capture.source, capture.record_type, capture.metadata())
+
+            except KeyboardInterrupt:
+                print("停止监控")
+                break
+            except Exception as e:
+                print(f"监控过程中出错: {e}")
+                time.sleep(1)
+        self.is_running = False
+
+    def start(self, capture, accept=None):
+        """在后台线程中采集"""
+        self.thread = threading.Thread(target=self.run, args=(capture, accept))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self, timeout=5):
+        """停止采集，保存完队列中的记录后关闭存储"""
+        self.is_running = False
+        if self.thread and self.thread is not threading.current_thread():
+            self.thread.join(timeout)
+        if self._pipeline_started:
+            finished = self.pipeline.stop(timeout)
+            self._pipeline_started = False
+            if not finished:
+                # 输出线程还在写入，这时关闭存储会让剩下的写入失败；未登记的消息下次复制时会重新保存
+                print(f"⚠️ 流水线 {timeout} 秒内没有处理完，未关闭存储")
+                return
+        if self.sessionizer is not None:
+            # 先按空闲时间结束会话，剩下进行中的会话也写出，下次启动重新开始切分
+            self.sessionizer.expire()
+            self.sessionizer.flush()
+        for store in self._stores:
+            store.close()
+        if self.pipeline.dedup_index is not None:
+            self.pipeline.dedup_index.close()
+        if self.parser_profile is not None:
+            self.parser_profile.save(self.settings.parser_stats_file)
+        if self.recorder is not None:
+            self.recorder.close()
+
+    def stats(self):
+        """采集和流水线统计"""
+        result = self.pipeline.stats()
+        result['captured'] = self.captured
+        result['rejected'] = self.rejected
+        if self.parser_profile is not None:
+            result['parser'] = self.parser_profile.to_dict()
+        return result
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+剪贴板图片存储（按内容寻址）
+文件名取自像素数据的摘要：同一张截图复制多少次都只保存一个文件，
+同一秒内复制的不同图片也不会互相覆盖。
+PNG/WebP 编码放在后台线程，调用方可以先做别的事（比如读取剪贴板文本），
+再等待编码结果；只有文件确实写入后才拿到文件名。
+"""
+
+import atexit
+import hashlib
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 格式 -> (Pillow格式名, 扩展名, 保存参数)
+IMAGE_FORMATS = {
+    'png': ('PNG', '.png', {}),
+    'webp': ('WEBP', '.webp', {'lossless': True}),
+}
+
+
+def image_digest(image):
+    """像素数据摘要（包含模式和尺寸），相同像素的图片摘要相同"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode('ascii'))
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class ClipboardImageStore:
+    """
+    按内容寻址的图片存储
+
+    submit(image) 立即返回 Future，结果为文件名（编码失败时为 None）；
+    put(image) 等待编码完成后返回文件名。已存在的图片直接复用，新图片在后台线程编码写入。
+    """
+
+    def __init__(self, folder, image_format='png', workers=1, prefix='clipboard_image_'):
+        if image_format not in IMAGE_FORMATS:
+            raise ValueError(f"不支持的图片格式: {image_format}")
+        self.folder = folder
+        self.prefix = prefix
+        self.pil_format, self.extension, self.save_options = IMAGE_FORMATS[image_format]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='image-encode')
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.saved = 0
+        self.reused = 0
+        self.failed = 0
+
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        # 启动时登记已有文件，不读取文件内容
+        self._known = set(name for name in os.listdir(folder)
+                          if name.startswith(prefix) and name.endswith(self.extension))
+
+    def _encode(self, image, filename):
+        filepath = os.path.join(self.folder, filename)
+        tmp_filepath = filepath + '.tmp'
+        try:
+            image.save(tmp_filepath, self.pil_format, **self.save_options)
+            os.replace(tmp_filepath, filepath)
+            with self._lock:
+                self.saved += 1
+            return filename
+        except Exception as e:
+            with self._lock:
+                self.failed += 1
+                self._known.discard(filename)
+            if os.path.exists(tmp_filepath):
+                os.remove(tmp_filepath)
+            print(f"保存图像失败: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(filename, None)
+
+    def submit(self, image):
+        """登记一张图片，返回 Future：编码写入成功后结果为文件名，失败为 None"""
+        filename = f"{self.prefix}{image_digest(image)}{self.extension}"
+        with self._lock:
+            pending = self._pending.get(filename)
+            if pending is not None:
+                # 同一张图片正在编码，等同一个结果
+                self.reused += 1
+                return pending
+            if filename in self._known:
+                self.reused += 1
+                future = Future()
+                future.set_result(filename)
+                return future
+            self._known.add(filename)
+            # 复制一份，避免调用方之后修改图片
+            future = self._executor.submit(self._encode, image.copy(), filename)
+            self._pending[filename] = future
+        return future
+
+    def put(self, image):
+        """登记一张图片，等待编码完成后返回文件名；编码失败返回 None"""
+        return self.submit(image).result()
+
+    def flush(self):
+        """等待所有后台编码完成"""
+        with self._lock:
+            futures = list(self._pending.values())
+        for future in futures:
+            future.result()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'saved': self.saved,
+                'reused': self.reused,
+                'failed': self.failed,
+                'pending': len(self._pending),
+            }
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_image_store(folder, image_format='png'):
+    """获取（并缓存）指定文件夹的图片存储，程序退出前会等待编码完成"""
+    key = (os.path.abspath(folder), image_format)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = ClipboardImageStore(folder, image_format)
+            _stores[key] = store
+        return store
+
+
+@atexit.register
+def _close_stores():
+    for store in _stores.values():
+        store.close()
@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛解析消息去重索引
+以 (用户名, 时间戳, 消息摘要) 为键，重复复制的聊天片段只保留一次
+撤回消息没有时间戳、内容固定，先用 tag_recalls 加上 after 字段（前一条消息的时间），同一用户的多次撤回才能区分
+索引单独持久化为键文件，启动时只加载键，不需要重新扫描历史消息
+"""
+
+import hashlib
+import os
+import threading
+
+from message_store import DEFAULT_CHAT_FILE, JsonlMessageStore, iter_messages
+
+DEFAULT_INDEX_FILE = "qianniu_chat_messages.idx"
+
+
+def message_key(message_data):
+    """计算消息去重键：(用户名, 时间戳, 消息内容+URL) 的摘要，撤回消息再加上 after 字段"""
+    digest = hashlib.blake2b(digest_size=16)
+    for value in (message_data.get('username'), message_data.get('timestamp'), message_data.get('message')):
+        digest.update(str(value).encode('utf-8'))
+        digest.update(b'\0')
+    for url in message_data.get('urls') or ():
+        digest.update(url.encode('utf-8'))
+        digest.update(b'\0')
+    after = message_data.get('after')
+    if after is not None:
+        # 只有撤回消息有这个字段，其他消息的键与以前相同
+        digest.update(b'after\0' + after.encode('utf-8'))
+    return digest.digest()
+
+
+def tag_recalls(messages, previous=None):
+    """
+    给没有时间戳的消息（撤回）加上 after 字段："前一条有时间戳的消息的时间#之后第几条"，
+    同一用户在不同位置的撤回去重键不同，同一位置重复复制时键不变
+    previous：上一批返回的状态，同一段聊天记录分批解析时接着传入；返回本批结束时的状态
+    """
+    timestamp, count = previous or (None, 0)
+    for message_data in messages:
+        if message_data.get('timestamp') is not None:
+            timestamp, count = message_data['timestamp'], 0
+        else:
+            message_data['after'] = f"{timestamp}#{count}"
+            count += 1
+    return timestamp, count
+
+
+class MessageDedupIndex:
+    """
+    持久化的消息去重索引
+
+    内存中是键的集合，判断和登记都是O(1)；新键追加写入索引文件。
+    filename 为空时只在内存中去重。
+    """
+
+    def __init__(self, filename=DEFAULT_INDEX_FILE):
+        self.filename = filename
+        self._keys = set()
+        self._lock = threading.Lock()
+        self._file = None
+        if filename:
+            self._load()
+            self._file = open(filename, 'a', encoding='ascii')
+
+    def _load(self):
+        if not os.path.exists(self.filename):
+            return
+        with open(self.filename, 'r', encoding='ascii') as f:
+            for line in f:
+                line = line.strip()
+                # 跳过写入中断产生的不完整行
+                if len(line) == 32:
+                    self._keys.add(bytes.fromhex(line))
+
+    def __len__(self):
+        return len(self._keys)
+
+    def __contains__(self, message_data):
+        return message_key(message_data) in self._keys
+
+    def contains_key(self, key):
+        return key in self._keys
+
+    def add(self, message_data):
+        """登记一条消息，是新消息返回True，重复返回False"""
+        return self.add_key(message_key(message_data))
+
+    def add_key(self, key):
+        """登记一个已算好的去重键（见 message_key），是新键返回True"""
+        with self._lock:
+            if key in self._keys:
+                return False
+            self._keys.add(key)
+            if self._file:
+                self._file.write(key.hex() + '\n')
+                self._file.flush()
+        return True
+
+    def filter_new(self, messages):
+        """过滤出没见过的消息并登记，保持原顺序"""
+        return [message_data for message_data in messages if self.add(message_data)]
+
+    def sync(self):
+        """索引文件落盘"""
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+                self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def merge_new_messages(messages, index, store):
+    """
+    把解析出的消息合并进存储：只追加索引里没有的消息，返回新增的消息
+    先写存储再登记索引，中途退出最多产生重复，不会丢消息
+    """
+    new_messages = []
+    tag_recalls(messages)
+    for message_data in messages:
+        if message_data in index:
+            continue
+        store.append(message_data)
+        index.add(message_data)
+        new_messages.append(message_data)
+    return new_messages
+
+
+def rebuild_index(store_filename=DEFAULT_CHAT_FILE, index_filename=DEFAULT_INDEX_FILE):
+    """索引文件丢失或损坏时，根据存储文件重建索引，返回索引条数"""
+    if os.path.exists(index_filename):
+        os.remove(index_filename)
+    with MessageDedupIndex(index_filename) as index:
+        for message_data in iter_messages(store_filename):
+            index.add(message_data)
+        return len(index)
+
+
+def open_chat_archive(store_filename=DEFAULT_CHAT_FILE, index_filename=DEFAULT_INDEX_FILE):
+    """打开解析消息的存储和对应的去重索引"""
+    return MessageDedupIndex(index_filename), JsonlMessageStore(store_filename)
+
+
+if __name__ == "__main__":
+    count = rebuild_index()
+    print(f"索引已重建: {count} 条")
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+消息处理流水线
+采集线程只负责把记录放进有界队列，解析、去重和保存都在后台线程完成：
+
+    采集 --> [采集队列] --> 解析+去重 --> [每个输出一个队列] --> 输出（保存/打印/...）
+
+队列满时的策略：
+    block       - 阻塞采集线程直到有空位（可设置超时，超时按丢弃计）
+    drop_newest - 丢弃新来的记录
+    drop_oldest - 丢弃队列中最旧的记录
+每个队列都记录深度、最大深度、丢弃数和阻塞时间，用于观察背压
+
+窗口文本记录（带 reset 字段）只含新增部分，一条消息的标题和正文可能分在两条记录里：
+设置了 stream_parser 时这类记录按段喂给同一个增量解析器，reset 时先结束上一段，停止时结束最后一段；
+剪贴板记录是完整的复制内容，仍然用 parse 一次解析。
+
+去重分两步：解析后只检查索引并把键标记为"处理中"，第一个消息输出（主存储）写入成功后才登记到索引；
+被队列丢弃、写入失败或退出时还在队列里的消息不会登记，再次复制同样的聊天记录时会重新输出。
+其余消息输出（会话、指标、检索等）由主存储线程在登记之后转发，重新输出的消息不会被它们重复累计。
+"""
+
+import queue
+import threading
+import time
+
+from message_dedup import message_key, tag_recalls
+
+POLICY_BLOCK = 'block'
+POLICY_DROP_NEWEST = 'drop_newest'
+POLICY_DROP_OLDEST = 'drop_oldest'
+POLICIES = (POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST)
+
+# 停止信号
+_STOP = object()
+
+
+class BoundedChannel:
+    """带满队列策略和统计的有界队列"""
+
+    def __init__(self, name, maxsize=1000, policy=POLICY_BLOCK, put_timeout=None, on_drop=None):
+        if policy not in POLICIES:
+            raise ValueError(f"未知的队列策略: {policy}")
+        self.name = name
+        self.policy = policy
+        self.put_timeout = put_timeout
+        # 记录被丢弃（新记录放不进去或旧记录被挤掉）时调用 on_drop(记录)
+        self.on_drop = on_drop
+        self.queue = queue.Queue(maxsize)
+        self.accepted = 0
+        self.dropped = 0
+        self.blocked_seconds = 0.0
+        self.max_depth = 0
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        """放入一条记录，被丢弃时返回False"""
+        if self.policy == POLICY_BLOCK:
+            started = time.perf_counter()
+            try:
+                self.queue.put(item, timeout=self.put_timeout)
+                accepted = True
+            except queue.Full:
+                accepted = False
+            waited = time.perf_counter() - started
+        elif self.policy == POLICY_DROP_NEWEST:
+            waited = 0.0
+            try:
+                self.queue.put_nowait(item)
+                accepted = True
+            except queue.Full:
+                accepted = False
+        else:
+            waited = 0.0
+            accepted = True
+            while True:
+                try:
+                    self.queue.put_nowait(item)
+                    break
+                except queue.Full:
+                    try:
+                        evicted = self.queue.get_nowait()
+                    except queue.Empty:
+                        continue
+                    with self._lock:
+                        self.dropped += 1
+                    if self.on_drop:
+                        self.on_drop(evicted)
+
+        depth = self.queue.qsize()
+        with self._lock:
+            self.blocked_seconds += waited
+            if accepted:
+                self.accepted += 1
+            else:
+                self.dropped += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+        if not accepted and self.on_drop:
+            self.on_drop(item)
+        return accepted
+
+    def close(self, timeout=None):
+        """放入停止信号（不受满队列策略影响，队列满时等待），timeout 秒内放不进去返回False"""
+        try:
+            self.queue.put(_STOP, timeout=timeout)
+        except queue.Full:
+            return False
+        return True
+
+    def get(self):
+        return self.queue.get()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'depth': self.queue.qsize(),
+                'max_depth': self.max_depth,
+                'accepted': self.accepted,
+                'dropped': self.dropped,
+                'blocked_seconds': round(self.blocked_seconds, 4),
+            }
+
+
+class MessagePipeline:
+    """
+    采集 -> 解析 -> 去重 -> 输出 的后台流水线
+
+    record_sinks:  接收原始采集记录的回调列表，例如 JsonlMessageStore.append
+    message_sinks: 接收解析并去重后的聊天消息的回调列表，第一个是主存储，写入成功后消息才登记到去重索引，
+                   去重时其余输出在登记之后才收到消息
+    parse:         把采集记录的 content 解析成消息列表的函数，为空时不解析
+    stream_parser: 创建增量解析器的函数（见 readcliper.QianniuChatStreamParser），窗口文本记录用它按段解析
+    dedup_index:   去重索引（需要有 contains_key/add_key 方法，见 message_dedup.MessageDedupIndex），为空时不去重
+    on_processed:  每条采集记录解析、去重并分发到输出队列后调用 on_processed(record, new_messages)
+    """
+
+    def __init__(self, record_sinks=None, message_sinks=None, parse=None, dedup_index=None,
+                 queue_size=1000, policy=POLICY_BLOCK, put_timeout=None, on_processed=None,
+                 stream_parser=None):
+        self.parse = parse
+        self.stream_parser = stream_parser
+        # 当前窗口文本段的增量解析器，以及最近喂给它的记录
+        self._stream = None
+        self._stream_record = None
+        self._stream_recalls = None
+        self.dedup_index = dedup_index
+        self.on_processed = on_processed
+        self.capture_channel = BoundedChannel('capture', queue_size, policy, put_timeout)
+        names = set()
+        self.record_sinks = [(sink, BoundedChannel(_sink_name('record', sink, names), queue_size, policy, put_timeout))
+                             for sink in record_sinks or []]
+        self.message_sinks = [(sink, BoundedChannel(_sink_name('message', sink, names), queue_size, policy, put_timeout))
+                              for sink in message_sinks or []]
+        if self.message_sinks and dedup_index is not None:
+            # 主存储队列里的记录是 (消息, 去重键)，被丢弃时释放"处理中"的键
+            self.message_sinks[0][1].on_drop = lambda item: self._release(item[1])
+        # 已通过去重检查、还没写入主存储的键
+        self._pending = set()
+        self.processed = 0
+        self.parsed_messages = 0
+        self.duplicates = 0
+        self.errors = 0
+        self._threads = []
+        self._lock = threading.Lock()
+
+    def submit(self, record):
+        """采集线程调用：提交一条采集记录，被丢弃时返回False"""
+        return self.capture_channel.put(record)
+
+    def _parse_record(self, record):
+        """解析一条采集记录：窗口文本按段增量解析，其他记录整段解析"""
+        if not self.parse or not record.get('content'):
+            return []
+        if self.stream_parser is None or 'reset' not in record:
+            messages = self.parse(record['content'])
+            tag_recalls(messages)
+            return messages
+        messages = []
+        if self._stream is None:
+            self._stream = self.stream_parser()
+        elif record['reset']:
+            # 切换了会话：上一段最后一条消息到这里才结束
+            messages = self._stream.close()
+            tag_recalls(messages, self._stream_recalls)
+            self._stream_recalls = None
+        self._stream_record = record
+        new_messages = self._stream.feed(record['content'])
+        self._stream_recalls = tag_recalls(new_messages, self._stream_recalls)
+        return messages + new_messages
+
+    def _process(self):
+        while True:
+            record = self.capture_channel.get()
+            if record is _STOP:
+                break
+            try:
+                for sink, channel in self.record_sinks:
+                    channel.put(record)
+                self._dispatch(record, self._parse_record(record))
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"处理采集记录失败: {e}")
+
+        if self._stream is not None:
+            # 停止时结束最后一段窗口文本
+            try:
+                messages = self._stream.close()
+                tag_recalls(messages, self._stream_recalls)
+                self._dispatch(self._stream_record, messages, counted=False)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"处理采集记录失败: {e}")
+            self._stream = None
+
+        # 去重时其余消息输出的队列由主存储线程在转发完之后关闭
+        forwarded = self.message_sinks[1:] if self.dedup_index is not None else []
+        for sink, channel in self.record_sinks + self.message_sinks:
+            if (sink, channel) not in forwarded:
+                channel.close()
+
+    def _dispatch(self, record, messages, counted=True):
+        """去重并把新消息分发到输出队列；counted=False 时不计入处理的记录数"""
+        new_messages = messages
+        keys = None
+        if self.dedup_index is not None:
+            new_messages, keys = self._reserve(messages)
+
+        with self._lock:
+            if counted:
+                self.processed += 1
+            self.parsed_messages += len(messages)
+            self.duplicates += len(messages) - len(new_messages)
+
+        if keys is not None and not self.message_sinks:
+            for key in keys:
+                self._commit(key)
+        for index, message_data in enumerate(new_messages):
+            if keys is not None and self.message_sinks:
+                # 其余输出等主存储写入、登记后再由 _drain_sink 转发
+                self.message_sinks[0][1].put((message_data, keys[index]))
+                continue
+            for sink, channel in self.message_sinks:
+                channel.put(message_data)
+        if self.on_processed:
+            self.on_processed(record, new_messages)
+
+    def _reserve(self, messages):
+        """去重检查：返回 (新消息, 对应的键)，键标记为处理中，同一条消息不会同时输出两次"""
+        new_messages = []
+        keys = []
+        with self._lock:
+            for message_data in messages:
+                key = message_key(message_data)
+                if key in self._pending or self.dedup_index.contains_key(key):
+                    continue
+                self._pending.add(key)
+                new_messages.append(message_data)
+                keys.append(key)
+        return new_messages, keys
+
+    def _commit(self, key):
+        """主存储已写入：登记到去重索引"""
+        self.dedup_index.add_key(key)
+        self._release(key)
+
+    def _release(self, key):
+        with self._lock:
+            self._pending.discard(key)
+
+    def _drain_sink(self, sink, channel, commit=False):
+        while True:
+            item = channel.get()
+            if item is _STOP:
+                if commit:
+                    for _, forward_channel in self.message_sinks[1:]:
+                        forward_channel.close()
+                break
+            if commit:
+                item, key = item
+            try:
+                sink(item)
+            except Exception as e:
+                with self._lock:
+                    self.errors += 1
+                print(f"输出 {channel.name} 失败: {e}")
+                if commit:
+                    self._release(key)
+                continue
+            if commit:
+                self._commit(key)
+                for _, forward_channel in self.message_sinks[1:]:
+                    forward_channel.put(item)
+
+    def start(self):
+        """启动后台线程"""
+        self._threads = [threading.Thread(target=self._process, name='pipeline-process')]
+        primary = self.message_sinks[0][1] if self.message_sinks and self.dedup_index is not None else None
+        for sink, channel in self.record_sinks + self.message_sinks:
+            self._threads.append(threading.Thread(
+                target=self._drain_sink, args=(sink, channel, channel is primary), name=f'pipeline-{channel.name}'))
+        for thread in self._threads:
+            thread.daemon = True
+            thread.start()
+
+    def stop(self, timeout=None):
+        """
+        处理完已提交的记录后停止，返回是否所有后台线程都已结束
+        输出卡住、采集队列一直是满的时，最多等待 timeout 秒（停止信号也放不进去时返回False）
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        if not self.capture_channel.close(timeout):
+            return False
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(deadline - time.monotonic(), 0))
+        return not any(thread.is_alive() for thread in self._threads)
+
+    def stats(self):
+        """返回流水线统计"""
+        with self._lock:
+            result = {
+                'processed': self.processed,
+                'parsed_messages': self.parsed_messages,
+                'duplicates': self.duplicates,
+                'errors': self.errors,
+            }
+        result['queues'] = {'capture': self.capture_channel.stats()}
+        for sink, channel in self.record_sinks + self.message_sinks:
+            result['queues'][channel.name] = channel.stats()
+        return result
+
+
+def _sink_name(kind, sink, used):
+    """生成不重复的输出队列名称，用于统计"""
+    base = f"{kind}:{getattr(sink, '__name__', None) or type(sink).__name__}"
+    name = base
+    index = 2
+    while name in used:
+        name = f"{base}#{index}"
+        index += 1
+    used.add(name)
+    return name
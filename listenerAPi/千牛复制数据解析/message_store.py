@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛消息追加存储（JSONL）
+每条消息一行JSON，只追加写入，不再读取/重写整个文件
+支持批量fsync、压缩整理、按大小轮转，以及流式读取
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from datetime import datetime
+
+DEFAULT_STORE_FILE = "qianniu_messages.jsonl"
+# parse_qianniu_chat_to_json 解析后的消息
+DEFAULT_CHAT_FILE = "qianniu_chat_messages.jsonl"
+
+
+class JsonlMessageStore:
+    """
+    追加写入的JSONL消息存储
+
+    每次写入只追加一行，耗时与历史记录数量无关。
+    fsync 按批进行：累计 fsync_every 条或距上次超过 fsync_interval 秒时落盘一次。
+    max_bytes 不为空时，文件超过该大小会自动轮转。
+    """
+
+    def __init__(self, filename=DEFAULT_STORE_FILE, fsync_every=20, fsync_interval=1.0, max_bytes=None):
+        self.filename = filename
+        self.fsync_every = fsync_every
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._file = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self._open()
+
+    def _open(self):
+        folder = os.path.dirname(self.filename)
+        if folder and not os.path.exists(folder):
+            os.makedirs(folder)
+        self._file = open(self.filename, 'a', encoding='utf-8')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+
+    def append(self, record):
+        """追加一条消息"""
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self._lock:
+            self._file.write(line)
+            self._unsynced += 1
+            if (self._unsynced >= self.fsync_every or
+                    time.monotonic() - self._last_sync >= self.fsync_interval):
+                self._sync()
+            else:
+                self._file.flush()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def extend(self, records):
+        """批量追加消息，最后统一落盘一次"""
+        with self._lock:
+            for record in records:
+                self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+                self._unsynced += 1
+            self._sync()
+            if self.max_bytes and self._file.tell() >= self.max_bytes:
+                self._rotate()
+
+    def sync(self):
+        """立即落盘"""
+        with self._lock:
+            if self._file and self._unsynced:
+                self._sync()
+
+    def close(self):
+        """落盘并关闭文件"""
+        with self._lock:
+            if self._file:
+                self._sync()
+                self._file.close()
+                self._file = None
+
+    def _rotate(self):
+        self._sync()
+        self._file.close()
+        rotated = rotate_file(self.filename)
+        self._open()
+        return rotated
+
+    def rotate(self):
+        """把当前文件改名归档，之后写入新文件，返回归档文件名"""
+        with self._lock:
+            return self._rotate()
+
+    def compact(self):
+        """整理当前文件，去掉损坏的行，返回 (保留条数, 丢弃条数)"""
+        with self._lock:
+            self._sync()
+            self._file.close()
+            try:
+                return compact_file(self.filename)
+            finally:
+                self._open()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def iter_messages(filename=DEFAULT_STORE_FILE):
+    """
+    流式读取JSONL消息，一次只读一行
+    写入中断产生的不完整行会被跳过
+    """
+    if not os.path.exists(filename):
+        return
+    with open(filename, 'r', encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                continue
+
+
+def compact_file(filename):
+    """重写JSONL文件，只保留能解析的记录，返回 (保留条数, 丢弃条数)"""
+    kept = dropped = 0
+    if not os.path.exists(filename):
+        return kept, dropped
+    tmp_filename = filename + '.tmp'
+    with open(filename, 'r', encoding='utf-8') as src, \
+            open(tmp_filename, 'w', encoding='utf-8') as dst:
+        for line in src:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                dropped += 1
+                continue
+            dst.write(json.dumps(record, ensure_ascii=False) + '\n')
+            kept += 1
+        dst.flush()
+        os.fsync(dst.fileno())
+    os.replace(tmp_filename, filename)
+    return kept, dropped
+
+
+def rotate_file(filename):
+    """把文件改名为带时间戳的归档文件，返回归档文件名（文件不存在时返回None）"""
+    if not os.path.exists(filename):
+        return None
+    base, ext = os.path.splitext(filename)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    rotated = f"{base}.{timestamp}{ext}"
+    index = 1
+    while os.path.exists(rotated):
+        rotated = f"{base}.{timestamp}_{index}{ext}"
+        index += 1
+    os.replace(filename, rotated)
+    return rotated
+
+
+def import_json_list(json_filename, store):
+    """把旧版 qianniu_messages.json（整个列表）导入JSONL存储，返回导入条数"""
+    with open(json_filename, 'r', encoding='utf-8') as f:
+        messages = json.load(f)
+    store.extend(messages)
+    return len(messages)
+
+
+def main():
+    """命令行：整理、轮转、导入和查看JSONL消息文件"""
+    parser = argparse.ArgumentParser(description="千牛消息JSONL存储工具")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    compact_parser = subparsers.add_parser('compact', help='去掉损坏的行')
+    compact_parser.add_argument('filename', nargs='?', default=DEFAULT_STORE_FILE)
+
+    rotate_parser = subparsers.add_parser('rotate', help='归档当前文件')
+    rotate_parser.add_argument('filename', nargs='?', default=DEFAULT_STORE_FILE)
+
+    import_parser = subparsers.add_parser('import', help='导入旧版JSON列表文件')
+    import_parser.add_argument('json_filename')
+    import_parser.add_argument('filename', nargs='?', default=DEFAULT_STORE_FILE)
+
+    cat_parser = subparsers.add_parser('cat', help='逐条输出消息')
+    cat_parser.add_argument('filename', nargs='?', default=DEFAULT_STORE_FILE)
+
+    args = parser.parse_args()
+
+    if args.command == 'compact':
+        kept, dropped = compact_file(args.filename)
+        print(f"整理完成: 保留 {kept} 条, 丢弃 {dropped} 条")
+    elif args.command == 'rotate':
+        rotated = rotate_file(args.filename)
+        print(f"已归档到 {rotated}" if rotated else f"{args.filename} 不存在")
+    elif args.command == 'import':
+        with JsonlMessageStore(args.filename) as store:
+            count = import_json_list(args.json_filename, store)
+        print(f"已导入 {count} 条消息到 {args.filename}")
+    elif args.command == 'cat':
+        for record in iter_messages(args.filename):
+            print(json.dumps(record, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+大段聊天记录并行解析
+一次复制几十MB的聊天记录时，parse_qianniu_chat_to_json 只能用一个核。
+这里把原文在"安全的消息开始行"处切成几段，用进程池分别解析，再按顺序拼接，结果与串行解析完全一致。
+
+安全切分点：classify_line 判断为新消息开始（is_start），且本行不以 '20' 开头。
+    - 组装器在任何状态下遇到这样的行，处理后的状态都与新建的组装器相同
+      （正文中遇到会先结束上一条消息，这一步由上一段的 close() 完成）
+    - 本行不以 '20' 开头，上一行就不会按两行格式把它当作时间行
+只在目标位置附近逐行查找切分点，切分本身几乎不花时间。
+年份范围（见 chat_timestamps.set_year_window）随每个任务传给子进程，spawn 方式启动的子进程结果也与串行一致。
+
+用法：
+    python parallel_parse.py 聊天记录.txt -o parsed_messages.jsonl -j 4
+    python parallel_parse.py --synthetic 1000000 --check
+
+    messages = parse_qianniu_chat_parallel(text, workers=4)
+"""
+
+import argparse
+import os
+import time
+from multiprocessing import Pool
+
+from chat_timestamps import get_year_window, use_year_window
+from message_store import JsonlMessageStore
+from readcliper import classify_line, parse_qianniu_chat_to_json
+
+# 每段至少这么多字符，再小的话进程间传输的开销比解析还大，直接串行
+MIN_CHUNK_CHARS = 1024 * 1024
+
+
+def _parse_chunk(task):
+    """子进程：按传入的年份范围解析一段"""
+    chunk, year_window = task
+    use_year_window(year_window)
+    return parse_qianniu_chat_to_json(chunk)
+
+
+def _is_safe_start(line):
+    """这一行（已去除首尾空白）能否作为独立解析的一段的第一行"""
+    return classify_line(line)[1] and not line.startswith('20')
+
+
+def find_split_points(text, parts):
+    """
+    把 text 大致等分成 parts 段，返回每个切分点（安全切分行的起始下标）
+    切分点前面紧挨着一个 '\\r\\n'；附近找不到安全切分点时段数会少于 parts
+    """
+    points = []
+    length = len(text)
+    position = 0
+    for index in range(1, parts):
+        target = max(length * index // parts, position)
+        newline = text.find('\r\n', target)
+        while newline != -1:
+            line_start = newline + 2
+            line_end = text.find('\r\n', line_start)
+            if line_end == -1:
+                line_end = length
+            if _is_safe_start(text[line_start:line_end].strip()):
+                points.append(line_start)
+                position = line_start
+                break
+            newline = text.find('\r\n', line_end) if line_end < length else -1
+        else:
+            # 后面再也没有安全切分点
+            break
+    return points
+
+
+def split_transcript(text, parts):
+    """按安全切分点把原文切成若干段，每段单独解析后依次拼接等于整体解析"""
+    chunks = []
+    start = 0
+    for point in find_split_points(text, parts):
+        # 去掉切分点前的 '\r\n'，各段按 '\r\n' 分行的结果与整体分行一致
+        chunks.append(text[start:point - 2])
+        start = point
+    chunks.append(text[start:])
+    return chunks
+
+
+def parse_qianniu_chat_parallel(text_content, workers=None, pool=None, min_chunk_chars=MIN_CHUNK_CHARS):
+    """
+    与 parse_qianniu_chat_to_json 相同，大文本用多进程解析
+    workers：切成几段，默认CPU核数
+    pool：可传入已有的 multiprocessing.Pool 复用进程（Hook 长时间运行时避免每次启动进程）
+    """
+    if not text_content:
+        return []
+    workers = workers or os.cpu_count() or 1
+    parts = min(workers, len(text_content) // min_chunk_chars)
+    if parts < 2:
+        return parse_qianniu_chat_to_json(text_content)
+
+    chunks = split_transcript(text_content, parts)
+    if len(chunks) < 2:
+        return parse_qianniu_chat_to_json(text_content)
+
+    year_window = get_year_window()
+    tasks = [(chunk, year_window) for chunk in chunks]
+    if pool is not None:
+        results = pool.map(_parse_chunk, tasks, chunksize=1)
+    else:
+        with Pool(processes=len(chunks)) as new_pool:
+            results = new_pool.map(_parse_chunk, tasks, chunksize=1)
+
+    messages = []
+    for chunk_messages in results:
+        messages.extend(chunk_messages)
+    return messages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多进程解析大段千牛聊天记录")
+    parser.add_argument('filename', nargs='?', help='聊天记录文本文件（剪贴板原文，\\r\\n 换行）')
+    parser.add_argument('--synthetic', type=int, help='改用合成数据，指定行数')
+    parser.add_argument('-o', '--output', help='解析结果保存为JSONL文件')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认CPU核数')
+    parser.add_argument('--check', action='store_true', help='同时串行解析，检查结果是否一致并对比耗时')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from synthetic_chat import generate_transcript
+        text = generate_transcript(args.synthetic)
+    elif args.filename:
+        with open(args.filename, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    else:
+        parser.error('需要指定文件或 --synthetic')
+
+    started = time.perf_counter()
+    messages = parse_qianniu_chat_parallel(text, args.workers)
+    elapsed = time.perf_counter() - started
+    print(f"并行解析: {len(messages)} 条消息，用时 {elapsed:.3f}s")
+
+    if args.check:
+        started = time.perf_counter()
+        expected = parse_qianniu_chat_to_json(text)
+        serial_elapsed = time.perf_counter() - started
+        print(f"串行解析: {len(expected)} 条消息，用时 {serial_elapsed:.3f}s")
+        if messages == expected:
+            print(f"结果一致，加速 {serial_elapsed / elapsed:.2f} 倍")
+        else:
+            print("错误: 并行解析结果与串行不一致")
+
+    if args.output:
+        with JsonlMessageStore(args.output, fsync_every=1000) as store:
+            for message_data in messages:
+                store.append(message_data)
+        print(f"已保存到 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
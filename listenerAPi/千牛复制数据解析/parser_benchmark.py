@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录解析基准测试
+用合成数据测量 parse_qianniu_chat_to_json 和增量解析器、多进程解析的
+行/秒、消息/秒和峰值内存，修改解析规则后用来检查性能回退
+
+用法：
+    python parser_benchmark.py                         # 1k / 100k / 1M 行
+    python parser_benchmark.py --sizes 1000 50000 --repeat 5 --json result.json
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+from parallel_parse import parse_qianniu_chat_parallel
+from readcliper import QianniuChatStreamParser, parse_qianniu_chat_to_json
+from synthetic_chat import generate_transcript
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+
+def _parse_full(text):
+    return len(parse_qianniu_chat_to_json(text))
+
+
+def _parse_stream(text, chunk_size=64 * 1024):
+    parser = QianniuChatStreamParser()
+    count = 0
+    for start in range(0, len(text), chunk_size):
+        count += len(parser.feed(text[start:start + chunk_size]))
+    return count + len(parser.close())
+
+
+def _parse_parallel(text):
+    return len(parse_qianniu_chat_parallel(text))
+
+
+PARSERS = {
+    'full': _parse_full,
+    'stream': _parse_stream,
+    'parallel': _parse_parallel,
+}
+
+
+def benchmark(parse, text, line_count, repeat=3):
+    """返回一次基准测试的结果字典：取 repeat 次中最快的一次计时，另跑一次测峰值内存"""
+    best = None
+    message_count = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        message_count = parse(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    # tracemalloc 会拖慢解析，单独跑一次只用来测内存
+    tracemalloc.start()
+    parse(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'lines': line_count,
+        'messages': message_count,
+        'seconds': round(best, 4),
+        'lines_per_second': round(line_count / best) if best else None,
+        'messages_per_second': round(message_count / best) if best else None,
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+    }
+
+
+def run(sizes=None, parsers=None, repeat=3, seed=0):
+    results = []
+    for size in sizes or DEFAULT_SIZES:
+        text = generate_transcript(size, seed)
+        for name in parsers or list(PARSERS):
+            result = benchmark(PARSERS[name], text, size, repeat)
+            result['parser'] = name
+            results.append(result)
+            print(f"{name:>6} {size:>9} 行: {result['seconds']:>8.3f}s  "
+                  f"{result['lines_per_second']:>9} 行/s  {result['messages_per_second']:>8} 消息/s  "
+                  f"峰值内存 {result['peak_memory_mb']} MB")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="千牛聊天记录解析基准测试")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='测试的行数')
+    parser.add_argument('--parser', choices=list(PARSERS), nargs='+', default=list(PARSERS))
+    parser.add_argument('--repeat', type=int, default=3, help='每项重复次数，取最快一次')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='把结果写入JSON文件，便于前后对比')
+    args = parser.parse_args()
+
+    results = run(args.sizes, args.parser, args.repeat, args.seed)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存到 {args.json}")
+
+
+if __name__ == "__main__":
+    main()
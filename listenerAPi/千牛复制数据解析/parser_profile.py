@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天记录解析插桩
+统计每条规则命中多少行、每类行的分类花了多少时间，用来排查解析变慢或消息切分错误。
+
+parse_qianniu_chat_to_json 本身不做任何统计（关闭时零开销）；需要时改用 ParserProfile.parse。
+它调用的就是 readcliper.classify_line 和 _MessageBuilder（只在外面包一层计时），
+规则命中根据分类结果判断，不复制解析规则，输出与 parse_qianniu_chat_to_json 完全一致。
+
+用法：
+    python parser_profile.py 聊天记录.txt --stats parser_stats.json
+    python parser_profile.py --synthetic 100000
+
+    profile = ParserProfile()
+    messages = profile.parse(text)
+    print(profile.summary())
+"""
+
+import argparse
+import json
+import time
+
+from readcliper import LINE_HEADER, TRANSFER_SEP, _MessageBuilder, _assemble, classify_line
+
+# 规则命中（按行或按消息计数）
+HIT_RULES = [
+    'blank',            # 空行
+    'recall',           # 撤回消息
+    'header',           # 用户名 空格 时间
+    'glued_header',     # 用户名直接连接时间
+    'two_line_header',  # 用户名一行、时间一行
+    'transfer',         # a --> b 时间
+    'skip',             # 跳过的系统提示（SKIP_KEYWORDS、¥、电影）
+    'status',           # 已读/未读/发送中
+    'url',              # URL 行
+    'body',             # 普通正文
+]
+# 计时：classify_line 的耗时按该行命中的规则累计，另加消息组装
+TIMED_STAGES = [rule for rule in HIT_RULES if rule != 'two_line_header'] + ['builder']
+
+
+def line_rule(record):
+    """classify_line 的结果 -> 命中的规则名"""
+    tag, is_start, line, value = record
+    if tag != LINE_HEADER:
+        return tag
+    username = value[0]
+    if TRANSFER_SEP in username:
+        return 'transfer'
+    # 行已去除首尾空白，用户名从行首开始，后面紧跟时间就是无空格连接
+    return 'header' if line[len(username):len(username) + 1].isspace() else 'glued_header'
+
+
+class _CountingBuilder(_MessageBuilder):
+    """统计进入两行格式（用户名一行、时间一行）的次数"""
+
+    def __init__(self, out):
+        super().__init__(out)
+        self.two_line_headers = 0
+
+    def push(self, record, next_is_time):
+        super().push(record, next_is_time)
+        if self.state == self._TIMESTAMP:
+            self.two_line_headers += 1
+
+
+class ParserProfile:
+    """
+    解析统计：hits[规则] 命中次数，times[阶段] 累计纳秒
+    同一个实例可以多次 parse，统计累加
+    """
+
+    def __init__(self):
+        self.hits = dict.fromkeys(HIT_RULES, 0)
+        self.times = dict.fromkeys(TIMED_STAGES, 0)
+        self.lines = 0
+        self.messages = 0
+        self.calls = 0
+        self.total_ns = 0
+
+    def classify_line(self, line):
+        """调用 readcliper.classify_line，附带统计"""
+        started = time.perf_counter_ns()
+        record = classify_line(line)
+        elapsed = time.perf_counter_ns() - started
+        rule = line_rule(record)
+        self.hits[rule] += 1
+        self.times[rule] += elapsed
+        return record
+
+    def parse(self, text_content):
+        """与 parse_qianniu_chat_to_json 相同，附带统计"""
+        if not text_content:
+            return []
+        parse_started = time.perf_counter_ns()
+        messages = []
+        classify = self.classify_line
+        records = [classify(line.strip()) for line in text_content.split('\r\n')]
+
+        started = time.perf_counter_ns()
+        builder = _CountingBuilder(messages)
+        _assemble(records, builder)
+        self.times['builder'] += time.perf_counter_ns() - started
+
+        self.hits['two_line_header'] += builder.two_line_headers
+        self.lines += len(records)
+        self.messages += len(messages)
+        self.calls += 1
+        self.total_ns += time.perf_counter_ns() - parse_started
+        return messages
+
+    __call__ = parse
+
+    def to_dict(self):
+        return {
+            'calls': self.calls,
+            'lines': self.lines,
+            'messages': self.messages,
+            'total_ms': round(self.total_ns / 1e6, 3),
+            'hits': dict(self.hits),
+            'times_ms': {stage: round(ns / 1e6, 3) for stage, ns in self.times.items()},
+        }
+
+    def summary(self):
+        """文本汇总"""
+        lines = [f"解析 {self.calls} 次，{self.lines} 行，{self.messages} 条消息，"
+                 f"共 {self.total_ns / 1e6:.1f} ms"]
+        lines.append("规则命中:")
+        for rule in HIT_RULES:
+            lines.append(f"  {rule:<16}{self.hits[rule]:>10}")
+        lines.append("阶段耗时（分类耗时按命中规则）:")
+        total = sum(self.times.values()) or 1
+        for stage in TIMED_STAGES:
+            ns = self.times[stage]
+            lines.append(f"  {stage:<16}{ns / 1e6:>10.2f} ms {ns * 100 / total:>6.1f}%")
+        return '\n'.join(lines)
+
+    def save(self, filename):
+        """导出统计到JSON文件"""
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="聊天记录解析规则命中和耗时统计")
+    parser.add_argument('filename', nargs='?', help='聊天记录文本文件（剪贴板原文，\\r\\n 换行）')
+    parser.add_argument('--synthetic', type=int, help='改用合成数据，指定行数')
+    parser.add_argument('--stats', help='统计结果保存到JSON文件')
+    args = parser.parse_args()
+
+    if args.synthetic:
+        from synthetic_chat import generate_transcript
+        text = generate_transcript(args.synthetic)
+    elif args.filename:
+        with open(args.filename, 'r', encoding='utf-8', newline='') as f:
+            text = f.read()
+    else:
+        parser.error('需要指定文件或 --synthetic')
+
+    profile = ParserProfile()
+    profile.parse(text)
+    print(profile.summary())
+    if args.stats:
+        profile.save(args.stats)
+        print(f"统计已保存到 {args.stats}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻 PowerShell 辅助进程
+每次 subprocess.run(['powershell', ...]) 都要启动一个新的解释器（300-800ms），
+这里只启动一次 powershell，之后通过 stdin/stdout 管道发送命令，每次操作只需几毫秒。
+
+协议（每行一条，字段用制表符分隔，参数和结果都是 UTF-8 的 base64）：
+    请求: <编号>\\t<操作>\\t<参数>
+    响应: <编号>\\t<ok|error>\\t<结果>
+操作: ping / clip_get / clip_set / sendkeys
+
+在Linux上可以用桩进程测试管道和协议：
+    PowerShellHelper(command=stub_helper_command())
+"""
+
+import atexit
+import base64
+import itertools
+import queue
+import subprocess
+import sys
+import threading
+
+# 辅助进程的循环脚本：逐行读取请求，执行后写回一行响应
+_HELPER_SCRIPT = r'''
+Add-Type -AssemblyName System.Windows.Forms
+while ($true) {
+    $line = [Console]::In.ReadLine()
+    if ($line -eq $null) { break }
+    $parts = $line.Split("`t")
+    $id = $parts[0]
+    $op = $parts[1]
+    $arg = ""
+    if ($parts.Length -gt 2 -and $parts[2]) {
+        $arg = [Text.Encoding]::UTF8.GetString([Convert]::FromBase64String($parts[2]))
+    }
+    $out = ""
+    try {
+        switch ($op) {
+            "ping" { $out = "pong" }
+            "clip_get" { $out = [System.Windows.Forms.Clipboard]::GetText() }
+            "clip_set" { [System.Windows.Forms.Clipboard]::SetText($arg) }
+            "sendkeys" { [System.Windows.Forms.SendKeys]::SendWait($arg) }
+            default { throw "unknown op: $op" }
+        }
+        $status = "ok"
+    } catch {
+        $status = "error"
+        $out = $_.Exception.Message
+    }
+    if ($out -eq $null) { $out = "" }
+    $encoded = [Convert]::ToBase64String([Text.Encoding]::UTF8.GetBytes([string]$out))
+    [Console]::Out.WriteLine($id + "`t" + $status + "`t" + $encoded)
+    [Console]::Out.Flush()
+}
+'''
+
+
+class HelperError(Exception):
+    """辅助进程执行命令失败"""
+
+
+def _encode(text):
+    return base64.b64encode(text.encode('utf-8')).decode('ascii')
+
+
+def _decode(data):
+    return base64.b64decode(data).decode('utf-8') if data else ""
+
+
+def powershell_helper_command():
+    """启动常驻 powershell 的命令行（STA 线程，剪贴板操作需要）"""
+    encoded = base64.b64encode(_HELPER_SCRIPT.encode('utf-16-le')).decode('ascii')
+    return ['powershell', '-NoProfile', '-NoLogo', '-NonInteractive', '-Sta',
+            '-EncodedCommand', encoded]
+
+
+def stub_helper_command():
+    """用 Python 实现同一协议的桩进程，用于在没有 powershell 的环境测试"""
+    return [sys.executable, '-u', __file__, '--stub']
+
+
+class PowerShellHelper:
+    """
+    常驻辅助进程客户端（线程安全）
+
+    第一次调用时启动进程；进程退出或响应超时会被终止，下一次调用时重新启动。
+    """
+
+    def __init__(self, command=None, timeout=5.0):
+        self.command = command or powershell_helper_command()
+        self.timeout = timeout
+        self.process = None
+        self._responses = None
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.restarts = 0
+
+    def _start(self):
+        creationflags = getattr(subprocess, 'CREATE_NO_WINDOW', 0)
+        self.process = subprocess.Popen(
+            self.command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            encoding='ascii',
+            bufsize=1,
+            creationflags=creationflags,
+        )
+        self._responses = queue.Queue()
+        # 后台线程读取响应，主线程可以带超时等待
+        reader = threading.Thread(target=self._read_responses,
+                                  args=(self.process.stdout, self._responses))
+        reader.daemon = True
+        reader.start()
+
+    @staticmethod
+    def _read_responses(stdout, responses):
+        for line in stdout:
+            responses.put(line.rstrip('\n'))
+        responses.put(None)
+
+    def _kill(self):
+        if self.process is not None:
+            try:
+                self.process.kill()
+                self.process.wait(1)
+            except Exception:
+                pass
+            self.process = None
+
+    def call(self, op, arg=""):
+        """执行一个操作，返回结果文本；失败抛出 HelperError"""
+        with self._lock:
+            if self.process is None or self.process.poll() is not None:
+                if self.process is not None:
+                    self.restarts += 1
+                self._start()
+            request_id = str(next(self._ids))
+            try:
+                self.process.stdin.write(f"{request_id}\t{op}\t{_encode(arg)}\n")
+                self.process.stdin.flush()
+            except OSError as e:
+                self._kill()
+                raise HelperError(f"辅助进程已退出: {e}")
+
+            while True:
+                try:
+                    line = self._responses.get(timeout=self.timeout)
+                except queue.Empty:
+                    self._kill()
+                    raise HelperError(f"辅助进程响应超时: {op}")
+                if line is None:
+                    self._kill()
+                    raise HelperError("辅助进程已退出")
+                response_id, status, payload = (line.split('\t') + ['', ''])[:3]
+                # 超时后迟到的旧响应直接丢弃
+                if response_id != request_id:
+                    continue
+                self.calls += 1
+                if status != 'ok':
+                    raise HelperError(_decode(payload))
+                return _decode(payload)
+
+    def ping(self):
+        return self.call('ping') == 'pong'
+
+    def get_clipboard(self):
+        return self.call('clip_get')
+
+    def set_clipboard(self, text):
+        self.call('clip_set', text)
+
+    def send_keys(self, keys):
+        """发送按键，使用 SendKeys 语法，例如 '^c'、'{DOWN 3}'"""
+        self.call('sendkeys', keys)
+
+    def close(self):
+        with self._lock:
+            if self.process is not None:
+                try:
+                    self.process.stdin.close()
+                    self.process.wait(1)
+                except Exception:
+                    pass
+                self._kill()
+
+
+_helper = None
+_helper_lock = threading.Lock()
+
+
+def get_helper():
+    """获取进程内共用的辅助进程，程序退出时关闭"""
+    global _helper
+    with _helper_lock:
+        if _helper is None:
+            _helper = PowerShellHelper()
+        return _helper
+
+
+@atexit.register
+def _close_helper():
+    if _helper is not None:
+        _helper.close()
+
+
+def _stub_main():
+    """桩进程：内存剪贴板、记录收到的按键，协议与 powershell 脚本一致"""
+    clipboard = ""
+    keys = []
+    for line in sys.stdin:
+        parts = line.rstrip('\n').split('\t')
+        request_id, op = parts[0], parts[1]
+        arg = _decode(parts[2]) if len(parts) > 2 else ""
+        status, out = 'ok', ""
+        if op == 'ping':
+            out = 'pong'
+        elif op == 'clip_get':
+            out = clipboard
+        elif op == 'clip_set':
+            clipboard = arg
+        elif op == 'sendkeys':
+            keys.append(arg)
+            # 模拟 Ctrl+C：把按键记录复制到剪贴板，便于测试确认按键已送达
+            if arg == '^c':
+                clipboard = '\n'.join(keys)
+        else:
+            status, out = 'error', f"unknown op: {op}"
+        sys.stdout.write(f"{request_id}\t{status}\t{_encode(out)}\n")
+        sys.stdout.flush()
+
+
+if __name__ == "__main__":
+    if '--stub' in sys.argv:
+        _stub_main()
+    else:
+        helper = get_helper()
+        print('ping:', helper.ping())
+        print('clipboard:', helper.get_clipboard()[:100])
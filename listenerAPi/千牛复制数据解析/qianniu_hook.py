@@ -10,10 +10,8 @@ import win32con
 import win32clipboard as clipboard
 import ctypes
 from ctypes import wintypes
-import time
-import json
-from datetime import datetime
-import os
+
+from hook_core import HookEngine, WindowTextCapture
 
 # Windows API常量
 WM_GETTEXT = 0x000D
@@ -22,12 +20,11 @@ WM_COPY = 0x0301
 WM_PASTE = 0x0302
 
 class QianNiuHook:
-    def __init__(self):
+    def __init__(self, settings=None):
         self.qianniu_hwnd = None
         self.chat_hwnd = None
-        self.message_callback = None
-        self.is_running = False
-        self.last_message = ""
+        # 采集循环、保存、解析由公共引擎完成
+        self.engine = HookEngine(settings)
         
     def find_qianniu_window(self):
         """查找千牛主窗口"""
@@ -94,39 +91,13 @@ class QianNiuHook:
             return
         
         print("开始监控聊天消息...")
-        self.is_running = True
-        
-        while self.is_running:
-            try:
-                # 获取当前聊天内容
-                current_text = self.get_window_text(self.chat_hwnd)
-                
-                if current_text and current_text != self.last_message:
-                    # 检测到新消息
-                    new_message = current_text.replace(self.last_message, "").strip()
-                    
-                    if new_message and self.message_callback:
-                        message_data = {
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': new_message,
-                            'full_content': current_text
-                        }
-                        self.message_callback(message_data)
-                    
-                    self.last_message = current_text
-                
-                time.sleep(0.5)  # 降低CPU占用
-                
-            except KeyboardInterrupt:
-                print("停止监控")
-                break
-            except Exception as e:
-                print(f"监控过程中出错: {e}")
-                time.sleep(1)
+        capture = WindowTextCapture(lambda: self.get_window_text(self.chat_hwnd),
+                                    self.engine.settings.poll_interval)
+        self.engine.run(capture)
     
     def on_message(self, callback):
         """设置消息回调函数"""
-        self.message_callback = callback
+        self.engine.on_message(callback)
     
     def start(self):
         """启动Hook"""
@@ -145,32 +116,10 @@ class QianNiuHook:
     
     def stop(self):
         """停止Hook"""
-        self.is_running = False
+        self.engine.stop()
         print("千牛Hook已停止")
 
 
-def save_message_to_json(message_data, filename="qianniu_messages.json"):
-    """保存消息到JSON文件"""
-    try:
-        # 读取现有数据
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
-        else:
-            messages = []
-        
-        # 添加新消息
-        messages.append(message_data)
-        
-        # 保存回文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
-        
-        print(f"消息已保存到 {filename}")
-    except Exception as e:
-        print(f"保存消息失败: {e}")
-
-
 def main():
     """主函数"""
     print("=== 千牛PC端Hook获取聊天消息 ===")
@@ -186,9 +135,6 @@ def main():
     def handle_message(message_data):
         print(f"\n[新消息] {message_data['timestamp']}")
         print(f"内容: {message_data['content']}")
-        
-        # 保存到JSON文件
-        save_message_to_json(message_data)
     
     hook.on_message(handle_message)
     
@@ -6,128 +6,55 @@
 """
 
 import time
-import json
-import os
 from datetime import datetime
 import threading
-import subprocess
-import sys
 
-# 添加已有的剪贴板功能
-import pyperclip
-from PIL import ImageGrab
+from chat_format import simple_chat_detector
+from clipboard_watcher import create_clipboard_backend
+from hook_core import ClipboardCapture, HookEngine
+from powershell_helper import get_helper
 
 class SimpleQianNiuHook:
-    def __init__(self):
-        self.is_running = False
-        self.message_callback = None
-        self.last_clipboard_text = ""
+    def __init__(self, settings=None):
         self.monitor_thread = None
-        self.messages_file = "qianniu_messages.json"
+        # 剪贴板后端：优先用剪贴板序号检测变化，不必每次读取全文
+        self.clipboard_backend = create_clipboard_backend()
+        # 自动复制后等待剪贴板变化的最长时间（秒）
+        self.copy_timeout = 3.0
+        self.key_helper = get_helper()
+        # 采集循环、保存、解析由公共引擎完成
+        self.engine = HookEngine(settings)
         
     def on_message(self, callback):
         """设置消息回调函数"""
-        self.message_callback = callback
+        self.engine.on_message(callback)
     
     def get_clipboard_text(self):
         """获取剪贴板文本"""
         try:
-            text = pyperclip.paste()
-            return text if text else ""
+            return self.clipboard_backend.read_text()
         except Exception as e:
             print(f"获取剪贴板失败: {e}")
             return ""
     
     def monitor_clipboard(self):
         """监控剪贴板变化"""
-        print("开始监控剪贴板，请复制千牛聊天消息...")
-        
-        while self.is_running:
-            try:
-                current_text = self.get_clipboard_text()
-                
-                # 检测新内容
-                if current_text and current_text != self.last_clipboard_text:
-                    # 检查是否是聊天消息格式
-                    if self.is_chat_message_format(current_text):
-                        message_data = {
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': current_text,
-                            'source': 'clipboard',
-                            'type': 'text'
-                        }
-                        
-                        print(f"\n[检测到新消息] {message_data['timestamp']}")
-                        print(f"内容: {current_text[:100]}...")
-                        
-                        if self.message_callback:
-                            self.message_callback(message_data)
-                        
-                        self.save_message(message_data)
-                    
-                    self.last_clipboard_text = current_text
-                
-                time.sleep(0.5)  # 降低CPU占用
-                
-            except Exception as e:
-                print(f"监控过程中出错: {e}")
-                time.sleep(1)
+        print(f"开始监控剪贴板，请复制千牛聊天消息... (后端: {self.clipboard_backend.name})")
+        capture = ClipboardCapture(self.clipboard_backend, 'clipboard', 'text')
+        # 只保存聊天消息格式的内容
+        self.engine.run(capture, accept=self.is_chat_message_format)
     
     def is_chat_message_format(self, text):
         """判断是否是聊天消息格式"""
-        # 千牛聊天记录的特征
-        lines = text.strip().split('\n')
-        
-        # 检查是否包含用户名和时间格式
-        for line in lines:
-            line = line.strip()
-            if ('tb' in line and len(line) > 6) or ('syt' in line and len(line) > 6):
-                return True
-            if '2025-' in line and (' ' in line or ':' in line):
-                return True
-        
-        # 检查是否包含典型的聊天内容
-        chat_keywords = ['客服', '亲', '订单', '商品', '价格', '优惠', '发货']
-        for keyword in chat_keywords:
-            if keyword in text:
-                return True
-        
-        return False
-    
-    def save_message(self, message_data):
-        """保存消息到JSON文件"""
-        try:
-            # 读取现有数据
-            if os.path.exists(self.messages_file):
-                with open(self.messages_file, 'r', encoding='utf-8') as f:
-                    messages = json.load(f)
-            else:
-                messages = []
-            
-            # 添加新消息
-            messages.append(message_data)
-            
-            # 保存回文件
-            with open(self.messages_file, 'w', encoding='utf-8') as f:
-                json.dump(messages, f, ensure_ascii=False, indent=2)
-            
-            print(f"消息已保存到 {self.messages_file}")
-        except Exception as e:
-            print(f"保存消息失败: {e}")
+        # 用户名行、日期行或聊天关键词满足任意一项，只检查开头一段，规则见 chat_format
+        return simple_chat_detector(text)
     
     def simulate_hotkey_copy(self):
         """模拟快捷键复制当前聊天内容"""
         try:
-            # 使用PowerShell发送Ctrl+A和Ctrl+C
-            ps_script = '''
-            Add-Type -AssemblyName System.Windows.Forms
-            [System.Windows.Forms.SendKeys]::SendWait("^a")
-            Start-Sleep -Milliseconds 500
-            [System.Windows.Forms.SendKeys]::SendWait("^c")
-            Start-Sleep -Milliseconds 500
-            '''
-            
-            subprocess.run(['powershell', '-Command', ps_script], check=True)
+            # 通过常驻 PowerShell 辅助进程发送Ctrl+A和Ctrl+C，不再每次启动 powershell
+            self.key_helper.send_keys("^a")
+            self.key_helper.send_keys("^c")
             return True
         except Exception as e:
             print(f"模拟快捷键失败: {e}")
@@ -137,33 +64,28 @@ class SimpleQianNiuHook:
         """自动复制聊天内容"""
         print("正在尝试自动复制聊天内容...")
         
-        # 尝试模拟快捷键复制
+        # 尝试模拟快捷键复制，复制后等待剪贴板变化，不再固定等待
+        sequence = self.clipboard_backend.get_sequence()
         if self.simulate_hotkey_copy():
-            time.sleep(1)  # 等待复制完成
-            current_text = self.get_clipboard_text()
+            new_sequence = self.clipboard_backend.wait_for_change(sequence, self.copy_timeout)
+            if new_sequence is None:
+                print("等待复制超时")
+                return False
+            current_text = self.clipboard_backend.text_for_sequence(new_sequence)
             
             if current_text and self.is_chat_message_format(current_text):
-                message_data = {
-                    'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                    'content': current_text,
-                    'source': 'auto_copy',
-                    'type': 'text'
-                }
-                
-                print(f"\n[自动获取聊天内容] {message_data['timestamp']}")
+                print(f"\n[自动获取聊天内容] {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
                 print(f"内容: {current_text[:100]}...")
                 
-                if self.message_callback:
-                    self.message_callback(message_data)
-                
-                self.save_message(message_data)
+                # 回调和保存由引擎完成
+                self.engine.handle(current_text, source='auto_copy', record_type='text')
                 return True
         
         return False
     
     def start_monitoring(self):
         """开始监控"""
-        self.is_running = True
+        self.engine.is_running = True
         self.monitor_thread = threading.Thread(target=self.monitor_clipboard)
         self.monitor_thread.daemon = True
         self.monitor_thread.start()
@@ -171,9 +93,10 @@ class SimpleQianNiuHook:
     
     def stop_monitoring(self):
         """停止监控"""
-        self.is_running = False
+        self.engine.is_running = False
         if self.monitor_thread:
             self.monitor_thread.join(timeout=2)
+        self.engine.stop()
         print("监控已停止")
 
 
@@ -7,14 +7,15 @@
 """
 
 import subprocess
-import time
 import json
-from datetime import datetime
-import os
 import ctypes
 from ctypes import wintypes
 import threading
 
+from chat_format import qianniu_clipboard_detector
+from clipboard_watcher import create_clipboard_backend
+from hook_core import ClipboardCapture, HookEngine, WindowTextCapture
+
 try:
     # 尝试使用标准库中的ctypes来获取窗口信息
     import ctypes
@@ -61,13 +62,14 @@ except Exception as e:
 
 
 class QianNiuHookStd:
-    def __init__(self):
+    def __init__(self, settings=None):
         self.qianniu_hwnd = None
         self.chat_hwnd = None
-        self.message_callback = None
-        self.is_running = False
-        self.last_message = ""
         self.monitoring_thread = None
+        # 剪贴板后端：优先用剪贴板序号检测变化，PowerShell 只作兜底
+        self.clipboard_backend = create_clipboard_backend()
+        # 采集循环、保存、解析由公共引擎完成
+        self.engine = HookEngine(settings)
         
     def find_qianniu_window_ctypes(self):
         """使用ctypes查找千牛窗口"""
@@ -184,14 +186,7 @@ class QianNiuHookStd:
     def get_clipboard_text(self):
         """获取剪贴板文本"""
         try:
-            # 使用PowerShell获取剪贴板内容
-            result = subprocess.run(
-                ['powershell', '-Command', 'Get-Clipboard'],
-                capture_output=True,
-                text=True,
-                encoding='utf-8'
-            )
-            return result.stdout.strip()
+            return self.clipboard_backend.read_text()
         except Exception as e:
             print(f"获取剪贴板失败: {e}")
             return ""
@@ -215,84 +210,21 @@ class QianNiuHookStd:
             return
         
         print("正在监控窗口文本变化...")
-        self.is_running = True
-        
-        while self.is_running:
-            try:
-                current_text = self.get_window_text_ctypes(self.chat_hwnd)
-                
-                if current_text and current_text != self.last_message:
-                    # 检测新消息
-                    new_message = current_text.replace(self.last_message, "").strip()
-                    
-                    if new_message and self.message_callback:
-                        message_data = {
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': new_message,
-                            'full_content': current_text,
-                            'source': 'window_text',
-                            'type': 'new_message'
-                        }
-                        self.message_callback(message_data)
-                    
-                    self.last_message = current_text
-                
-                time.sleep(0.5)
-                
-            except KeyboardInterrupt:
-                print("停止监控")
-                break
-            except Exception as e:
-                print(f"监控过程中出错: {e}")
-                time.sleep(1)
+        capture = WindowTextCapture(lambda: self.get_window_text_ctypes(self.chat_hwnd),
+                                    self.engine.settings.poll_interval)
+        self.engine.run(capture)
     
     def _monitor_clipboard(self):
         """监控剪贴板"""
-        print("正在监控剪贴板变化...")
-        self.is_running = True
-        
-        while self.is_running:
-            try:
-                current_clipboard = self.get_clipboard_text()
-                
-                if current_clipboard and current_clipboard != self.last_message:
-                    # 检查是否是千牛聊天消息格式
-                    if self._is_qianniu_chat_format(current_clipboard):
-                        message_data = {
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': current_clipboard,
-                            'full_content': current_clipboard,
-                            'source': 'clipboard',
-                            'type': 'qianniu_chat'
-                        }
-                        
-                        if self.message_callback:
-                            self.message_callback(message_data)
-                    
-                    self.last_message = current_clipboard
-                
-                time.sleep(0.5)
-                
-            except KeyboardInterrupt:
-                print("停止监控")
-                break
-            except Exception as e:
-                print(f"监控过程中出错: {e}")
-                time.sleep(1)
+        print(f"正在监控剪贴板变化... (后端: {self.clipboard_backend.name})")
+        capture = ClipboardCapture(self.clipboard_backend, 'clipboard', 'qianniu_chat')
+        # 只保存千牛聊天消息格式的内容
+        self.engine.run(capture, accept=self._is_qianniu_chat_format)
     
     def _is_qianniu_chat_format(self, text):
         """检查是否是千牛聊天格式"""
-        # 千牛聊天消息的特征
-        indicators = [
-            'tb' in text.lower(),  # 淘宝
-            'syt' in text.lower(),  # 系统消息
-            ':' in text,  # 时间格式
-            '2024' in text or '2025' in text,  # 年份
-            len(text) > 20  # 消息长度
-        ]
-        
-        # 如果包含多个特征，则认为是聊天消息
-        return sum(indicators) >= 3
+        # 千牛聊天消息的特征（tb/syt/时间/年份/长度）满足3项，只检查开头一段，规则见 chat_format
+        return qianniu_clipboard_detector(text)
     
     def find_qianniu_window(self):
         """查找千牛窗口（综合方法）"""
@@ -312,7 +244,7 @@ class QianNiuHookStd:
     
     def on_message(self, callback):
         """设置消息回调函数"""
-        self.message_callback = callback
+        self.engine.on_message(callback)
     
     def start(self):
         """启动Hook"""
@@ -331,9 +263,10 @@ class QianNiuHookStd:
     
     def stop(self):
         """停止Hook"""
-        self.is_running = False
+        self.engine.is_running = False
         if self.monitoring_thread:
             self.monitoring_thread.join()
+        self.engine.stop()
         print("千牛Hook已停止")
     
     def start_monitoring(self):
@@ -343,28 +276,6 @@ class QianNiuHookStd:
         self.monitoring_thread.start()
 
 
-def save_message_to_json(message_data, filename="qianniu_messages.json"):
-    """保存消息到JSON文件"""
-    try:
-        # 读取现有数据
-        if os.path.exists(filename):
-            with open(filename, 'r', encoding='utf-8') as f:
-                messages = json.load(f)
-        else:
-            messages = []
-        
-        # 添加新消息
-        messages.append(message_data)
-        
-        # 保存回文件
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(messages, f, ensure_ascii=False, indent=2)
-        
-        print(f"消息已保存到 {filename}")
-    except Exception as e:
-        print(f"保存消息失败: {e}")
-
-
 def interactive_mode():
     """交互模式"""
     print("=== 千牛PC端Hook获取聊天消息 ===")
@@ -372,21 +283,19 @@ def interactive_mode():
     print("2. 请打开一个聊天会话窗口")
     print("3. 按Ctrl+C停止监控")
     print("4. 输入 'c' 复制当前剪贴板内容")
-    print("5. 输入 'h' 显示帮助")
+    print("5. 输入 's' 查看处理队列统计")
+    print("6. 输入 'h' 显示帮助")
     print("=" * 40)
     
     # 创建Hook实例
     hook = QianNiuHookStd()
     
-    # 设置消息处理回调
+    # 设置消息处理回调（保存、解析由引擎在后台完成）
     def handle_message(message_data):
         print(f"\n[新消息] {message_data['timestamp']}")
         print(f"来源: {message_data['source']}")
         print(f"类型: {message_data['type']}")
         print(f"内容: {message_data['content'][:100]}...")
-        
-        # 保存到JSON文件
-        save_message_to_json(message_data)
     
     hook.on_message(handle_message)
     
@@ -397,12 +306,13 @@ def interactive_mode():
         
         try:
             while True:
-                user_input = input("\n输入命令 (h帮助, c复制, q退出): ").strip().lower()
+                user_input = input("\n输入命令 (h帮助, c复制, s统计, q退出): ").strip().lower()
                 
                 if user_input == 'h':
                     print("命令帮助:")
                     print("  h - 显示帮助")
                     print("  c - 复制当前剪贴板内容")
+                    print("  s - 查看处理队列统计")
                     print("  q - 退出程序")
                 
                 elif user_input == 'c':
@@ -410,17 +320,13 @@ def interactive_mode():
                     if clipboard_text:
                         print(f"剪贴板内容: {clipboard_text[:100]}...")
                         # 手动触发消息处理
-                        message_data = {
-                            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-                            'content': clipboard_text,
-                            'full_content': clipboard_text,
-                            'source': 'manual_copy',
-                            'type': 'manual'
-                        }
-                        handle_message(message_data)
+                        hook.engine.handle(clipboard_text, source='manual_copy', record_type='manual')
                     else:
                         print("剪贴板为空")
                 
+                elif user_input == 's':
+                    print(json.dumps(hook.engine.stats(), ensure_ascii=False, indent=2))
+                
                 elif user_input == 'q':
                     break
                 
@@ -5,6 +5,11 @@ import pyperclip
 from PIL import ImageGrab, Image
 import io
 import os
+import re
+
+# set_year_window 在这里重新导出：解析器和 chat_timestamps 的转换共用同一个年份范围
+from chat_timestamps import get_year_window, on_year_window_change, set_year_window
+from image_store import get_image_store
 
 # text = pyperclip.paste()   使用pyperclip 的 paste返回读取剪贴板的数据
 # ImageGrab.grabclipboard()  PIL 的imageGrab 的grapbclipboard()方法 可以获取剪贴板中的图片数据
@@ -32,26 +37,22 @@ def read_clipboard_content(save_folder):
             return f"读取文本失败: {str(e)}"
     
     def _read_clipboard_image():
-        """读取剪贴板图像内容并保存"""
+        """读取剪贴板图像内容并提交保存，返回 Future（没有图像时返回 None）"""
         try:
             image = ImageGrab.grabclipboard()
             if image:
-                # 生成唯一文件名
-                from datetime import datetime
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                filename = f"clipboard_image_{timestamp}.png"
-                filepath = os.path.join(save_folder, filename)
-                
-                # 保存图像
-                image.save(filepath, 'PNG')
-                return filename
+                # 按像素内容命名，重复的图片只保存一次；PNG编码在后台线程完成
+                return get_image_store(save_folder).submit(image)
             return None
         except Exception as e:
             return f"读取图像失败: {str(e)}"
     
-    # 读取剪贴板内容
-    text_content = _read_clipboard_text()
+    # 读取剪贴板内容：图像先提交编码，读取文本的同时在后台写文件
     image_filename = _read_clipboard_image()
+    text_content = _read_clipboard_text()
+    if image_filename is not None and not isinstance(image_filename, str):
+        # 等待写入完成；编码失败时不返回文件名，避免消息引用不存在的文件
+        image_filename = image_filename.result()
     
     result = {
         'text': text_content,
@@ -65,6 +66,227 @@ def read_clipboard_content(save_folder):
     return result
 
 
+# ---------------------------------------------------------------------------
+# 千牛聊天记录解析
+#
+# 解析分两步：先对每一行做一次分类（打标签），再按标签组装消息。
+# 每行只被正则/切分检查一次，组装阶段只需要看当前行和下一行的标签。
+# ---------------------------------------------------------------------------
+
+# 行标签
+LINE_BLANK = 'blank'
+LINE_RECALL = 'recall'
+LINE_HEADER = 'header'
+LINE_URL = 'url'
+LINE_SKIP = 'skip'
+LINE_STATUS = 'status'
+LINE_BODY = 'body'
+
+RECALL_TEXT = '撤回了一条消息'
+_RECALL_SUFFIX = ' ' + RECALL_TEXT
+TRANSFER_SEP = ' --> '
+STATUS_FLAGS = frozenset(['已读', '未读', '发送中'])
+SKIP_KEYWORDS = frozenset([
+    '当前用户来自', '商品详情页', '商品推荐', '这些非常适合您的商品可以一起看看～～',
+    '由 服务助手 转交给', '原因：【离线留言自动分配】', '千牛'
+])
+
+# 匹配时间戳模式：YYYY-M-D H:MM:SS（支持用户名直接连接时间）
+_TIME_TAIL_RE = re.compile(r'((\d{4})-(\d{1,2})-(\d{1,2}) (\d{1,2}):(\d{2}):(\d{2}))$')
+_URL_PREFIXES = ('http', '`http')
+_SKIP_PREFIXES = ('¥', '电影')
+# 消息头时间戳允许的年份范围：与 chat_timestamps 共用，用 set_year_window 修改
+_YEAR_MIN, _YEAR_MAX = get_year_window()
+
+
+def _apply_year_window(min_year, max_year):
+    global _YEAR_MIN, _YEAR_MAX
+    _YEAR_MIN, _YEAR_MAX = min_year, max_year
+
+
+on_year_window_change(_apply_year_window)
+
+
+def _is_valid_time_format(time_str):
+    """检查是否是有效的时间格式"""
+    try:
+        parts = time_str.split()
+        if len(parts) == 2:
+            date_part = parts[0]
+            time_part = parts[1]
+            date_parts = date_part.split('-')
+            if len(date_parts) == 3:
+                year, month, day = date_parts
+                if (year.isdigit() and month.isdigit() and day.isdigit() and
+                    _YEAR_MIN <= int(year) <= _YEAR_MAX and 1 <= int(month) <= 12 and 1 <= int(day) <= 31):
+                    time_parts = time_part.split(':')
+                    if len(time_parts) == 3:
+                        hour, minute, second = time_parts
+                        if (hour.isdigit() and minute.isdigit() and second.isdigit() and
+                            0 <= int(hour) <= 23 and 0 <= int(minute) <= 59 and 0 <= int(second) <= 59):
+                            return True
+    except:
+        pass
+    return False
+
+
+def _is_valid_time_match(time_match):
+    """检查 _TIME_TAIL_RE 的匹配结果是否是有效时间，等价于 _is_valid_time_format"""
+    year, month, day, hour, minute, second = map(int, time_match.groups()[1:])
+    return (_YEAR_MIN <= year <= _YEAR_MAX and 1 <= month <= 12 and 1 <= day <= 31 and
+            hour <= 23 and minute <= 59 and second <= 59)
+
+
+def _classify_content(line):
+    """对消息正文中的一行分类，返回 (标签, 值)"""
+    if line.startswith(_URL_PREFIXES):
+        return LINE_URL, line.strip('`')
+    if line.startswith(_SKIP_PREFIXES) or line in SKIP_KEYWORDS:
+        return LINE_SKIP, None
+    if line in STATUS_FLAGS:
+        return LINE_STATUS, line
+    return LINE_BODY, line
+
+
+def classify_line(line):
+    """
+    对一行（已去除首尾空白）打标签，每行只调用一次
+
+    返回 (标签, 是否为新消息开始, 行文本, 值)：
+        - recall 的值是用户名
+        - header 的值是 (用户名, 时间戳)
+        - url/status/body 的值是对应文本
+    "是否为新消息开始"不包含"下一行以20开头"这条规则，该规则在组装时根据下一行判断。
+    """
+    if not line:
+        return LINE_BLANK, False, line, None
+
+    # 撤回消息：以 " 撤回了一条消息" 结尾且只出现一次
+    if line.endswith(RECALL_TEXT):
+        if line.endswith(_RECALL_SUFFIX) and line.count(_RECALL_SUFFIX) == 1:
+            return LINE_RECALL, True, line, line[:-len(_RECALL_SUFFIX)].strip()
+        tag, value = _classify_content(line)
+        return tag, True, line, value
+
+    # 所有时间相关规则都需要 "H:MM:SS"，没有冒号的行直接当作正文
+    if ':' not in line:
+        tag, value = _classify_content(line)
+        return tag, False, line, value
+
+    # 用户名+时间（支持无空格连接）
+    time_match = _TIME_TAIL_RE.search(line)
+    if time_match and _is_valid_time_match(time_match):
+        username = line[:time_match.start()].strip()
+        if username:
+            return LINE_HEADER, True, line, (username, time_match.group(1))
+
+    parts = line.split()
+    is_start = len(parts) >= 3 and _is_valid_time_format(' '.join(parts[-2:]))
+
+    # 转交消息：a --> b 时间
+    if TRANSFER_SEP in line:
+        try:
+            user_part, rest = line.split(TRANSFER_SEP, 1)
+            receiver, time_part = rest.rsplit(' ', 1)
+            if _is_valid_time_format(time_part):
+                return LINE_HEADER, is_start, line, (user_part + TRANSFER_SEP + receiver, time_part)
+        except ValueError:
+            pass
+
+    tag, value = _classify_content(line)
+    return tag, is_start, line, value
+
+
+class _MessageBuilder:
+    """根据行标签组装消息，只保留当前消息和一行的前瞻，组装好的消息追加到 out"""
+
+    _OUTER = 0
+    _TIMESTAMP = 1
+    _BODY = 2
+
+    def __init__(self, out):
+        self.out = out
+        self.state = self._OUTER
+        self.username = None
+        self.timestamp = None
+        self.message_content = []
+        self.status_flags = []
+        self.url_content = []
+
+    def _begin(self, username, timestamp):
+        self.username = username
+        self.timestamp = timestamp
+        self.message_content = []
+        self.status_flags = []
+        self.url_content = []
+
+    def _finish(self):
+        """结束当前消息，有内容时追加到输出"""
+        self.state = self._OUTER
+        message_str = '\n'.join(self.message_content).strip()
+        if message_str or self.status_flags or self.url_content:
+            message_data = {
+                'username': self.username,
+                'timestamp': self.timestamp,
+                'message': message_str,
+                'status': self.status_flags[-1] if self.status_flags else None
+            }
+
+            # 添加URL信息
+            if self.url_content:
+                message_data['urls'] = self.url_content
+
+            self.out.append(message_data)
+
+    def push(self, record, next_is_time):
+        """
+        处理一行标签，next_is_time 表示下一行是否以 '20' 开头
+        """
+        tag, is_start, line, value = record
+
+        if self.state == self._TIMESTAMP:
+            # 两行格式：用户名一行，时间一行
+            self.timestamp = line
+            self.state = self._BODY
+            return
+
+        if self.state == self._BODY:
+            if tag != LINE_BLANK and (is_start or next_is_time):
+                self._finish()
+            else:
+                if tag == LINE_HEADER:
+                    tag, value = _classify_content(line)
+                if tag == LINE_URL:
+                    self.url_content.append(value)
+                elif tag == LINE_STATUS:
+                    self.status_flags.append(value)
+                elif tag == LINE_BODY:
+                    self.message_content.append(value)
+                return
+
+        if tag == LINE_BLANK:
+            pass
+        elif tag == LINE_RECALL:
+            self.out.append({
+                'username': value,
+                'timestamp': None,
+                'message': RECALL_TEXT,
+                'status': None
+            })
+        elif tag == LINE_HEADER:
+            self._begin(*value)
+            self.state = self._BODY
+        elif next_is_time:
+            self._begin(line, None)
+            self.state = self._TIMESTAMP
+
+    def close(self):
+        """输入结束，输出最后一条未结束的消息"""
+        if self.state == self._BODY:
+            self._finish()
+        self.state = self._OUTER
+
+
 def parse_qianniu_chat_to_json(text_content):
     """
     将千牛聊天记录解析为JSON格式
@@ -72,198 +294,79 @@ def parse_qianniu_chat_to_json(text_content):
     """
     if not text_content:
         return []
-    
-    # 分割消息块
+
     messages = []
-    lines = text_content.split('\r\n')
-    
-    def _is_valid_time_format(time_str):
-        """检查是否是有效的时间格式"""
-        try:
-            parts = time_str.split()
-            if len(parts) == 2:
-                date_part = parts[0]
-                time_part = parts[1]
-                date_parts = date_part.split('-')
-                if len(date_parts) == 3:
-                    year, month, day = date_parts
-                    if (year.isdigit() and month.isdigit() and day.isdigit() and
-                        2020 <= int(year) <= 2030 and 1 <= int(month) <= 12 and 1 <= int(day) <= 31):
-                        time_parts = time_part.split(':')
-                        if len(time_parts) == 3:
-                            hour, minute, second = time_parts
-                            if (hour.isdigit() and minute.isdigit() and second.isdigit() and
-                                0 <= int(hour) <= 23 and 0 <= int(minute) <= 59 and 0 <= int(second) <= 59):
-                                return True
-        except:
-            pass
-        return False
-
-    def _extract_username_timestamp(line):
-        """从行中提取用户名和时间戳，支持无空格连接"""
-        import re
-        # 匹配时间戳模式：YYYY-M-D H:MM:SS
-        time_match = re.search(r'(\d{4}-\d{1,2}-\d{1,2} \d{1,2}:\d{2}:\d{2})$', line)
-        if time_match:
-            timestamp = time_match.group(1)
-            username = line[:time_match.start()].strip()
-            if _is_valid_time_format(timestamp):
-                return username, timestamp
-        return None, None
-
-    def _is_new_message_start(line, current_index, all_lines):
-        """检查是否是新消息的开始"""
-        line = line.strip()
-        if not line:
-            return False
-        
-        # 检查撤回消息
-        if line.endswith('撤回了一条消息'):
-            return True
-        
-        # 检查无空格连接的用户名+时间
-        username, timestamp = _extract_username_timestamp(line)
-        if username and timestamp:
-            return True
-        
-        # 原有检查
-        parts = line.split()
-        if len(parts) >= 3 and _is_valid_time_format(' '.join(parts[-2:])):
-            return True
-        
-        if ' --> ' in line and len(parts) >= 4 and _is_valid_time_format(' '.join(parts[-2:])):
-            return True
-        
-        if (current_index + 1 < len(all_lines) and 
-            all_lines[current_index + 1].strip().startswith('20')):
-            return True
-        
-        return False
-    
-    def _is_skip_line(line):
-        """检查是否需要跳过该行"""
-        skip_keywords = [
-            '当前用户来自', '商品详情页', '商品推荐', '这些非常适合您的商品可以一起看看～～', 
-            '由 服务助手 转交给', '原因：【离线留言自动分配】', '千牛'
-        ]
-        
-        if not line:
-            return True
-        
-        if line.startswith('http') or line.startswith('`http'):
-            return True
-            
-        if line.startswith('¥') or line == '¥':
-            return True
-            
-        if line.startswith('电影'):
-            return True
-            
-        for keyword in skip_keywords:
-            if line == keyword:
-                return True
-                
-        return False
-    
-    i = 0
-    while i < len(lines):
-        line = lines[i].strip()
-        if not line:
-            i += 1
-            continue
-            
-        # 检查撤回消息
-        if '撤回了一条消息' in line:
-            parts = line.split(' 撤回了一条消息')
-            if len(parts) == 2 and parts[1] == '':
-                messages.append({
-                    'username': parts[0].strip(),
-                    'timestamp': None,
-                    'message': '撤回了一条消息',
-                    'status': None
-                })
-                i += 1
-                continue
-        
-        # 尝试提取用户名和时间
-        username, timestamp = _extract_username_timestamp(line)
-        new_format_match = bool(username and timestamp)
-        
-        if not new_format_match:
-            # 检查特殊格式
-            if ' --> ' in line:
-                try:
-                    user_part, rest = line.split(' --> ', 1)
-                    receiver, time_part = rest.rsplit(' ', 1)
-                    if _is_valid_time_format(time_part):
-                        username = user_part + ' --> ' + receiver
-                        timestamp = time_part
-                        new_format_match = True
-                except:
-                    pass
-        
-        # 如果匹配成功，或者旧格式
-        if new_format_match or (i + 1 < len(lines) and lines[i + 1].strip().startswith('20')):
-            if not new_format_match:
-                username = line
-                timestamp = lines[i + 1].strip()
-                i += 2
-            else:
-                i += 1
-            
-            message_content = []
-            status_flags = []
-            url_content = []
-            
-            while i < len(lines):
-                content_line = lines[i].strip()
-                
-                if _is_new_message_start(content_line, i, lines):
-                    break
-                
-                # 收集URL
-                if content_line.startswith('http') or content_line.startswith('`http'):
-                    # 提取URL
-                    url = content_line.strip('`')
-                    url_content.append(url)
-                    i += 1
-                    continue
-                
-                # 跳过系统消息和特殊内容
-                if _is_skip_line(content_line):
-                    i += 1
-                    continue
-                
-                if content_line in ['已读', '未读', '发送中']:
-                    status_flags.append(content_line)
-                    i += 1
-                    continue
-                
-                if content_line:
-                    message_content.append(content_line)
-                
-                i += 1
-            
-            message_str = '\n'.join(message_content).strip()
-            if message_str or status_flags or url_content:
-                message_data = {
-                    'username': username,
-                    'timestamp': timestamp,
-                    'message': message_str,
-                    'status': status_flags[-1] if status_flags else None
-                }
-                
-                # 添加URL信息
-                if url_content:
-                    message_data['urls'] = url_content
-                
-                messages.append(message_data)
-        else:
-            i += 1
-    
+    records = [classify_line(line.strip()) for line in text_content.split('\r\n')]
+    _assemble(records, _MessageBuilder(messages))
     return messages
 
 
+def _assemble(records, builder):
+    """把非空的行标签列表交给组装器，每行附带下一行是否以 '20' 开头"""
+    push = builder.push
+    for record, next_record in zip(records, records[1:]):
+        push(record, next_record[2].startswith('20'))
+    push(records[-1], False)
+    builder.close()
+
+
+class QianniuChatStreamParser:
+    """
+    千牛聊天记录增量解析器
+
+    按块喂入文本（例如每次剪贴板新增的内容），消息边界一经确认就返回该消息。
+    只缓存未结束的一行、一行前瞻和当前消息，内存不随会话长度增长。
+    所有块喂完并调用 close() 后，结果与 parse_qianniu_chat_to_json(全文) 一致。
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pending = None
+        self._messages = []
+        self._builder = _MessageBuilder(self._messages)
+
+    def _drain(self):
+        messages = self._messages[:]
+        del self._messages[:]
+        return messages
+
+    def _push_line(self, line):
+        record = classify_line(line.strip())
+        if self._pending is not None:
+            self._builder.push(self._pending, record[2].startswith('20'))
+        self._pending = record
+
+    def feed(self, chunk):
+        """喂入一段文本，返回本次确认结束的消息列表"""
+        if not chunk:
+            return []
+        lines = (self._buffer + chunk).split('\r\n')
+        # 最后一段可能是不完整的行，留到下次
+        self._buffer = lines.pop()
+        for line in lines:
+            self._push_line(line)
+        return self._drain()
+
+    def close(self):
+        """输入结束，返回剩余的消息，并重置解析器"""
+        self._push_line(self._buffer)
+        self._builder.push(self._pending, False)
+        self._builder.close()
+        self._buffer = ''
+        self._pending = None
+        return self._drain()
+
+
+def iter_qianniu_chat_messages(chunks):
+    """逐块解析千牛聊天记录，边解析边产出消息"""
+    parser = QianniuChatStreamParser()
+    for chunk in chunks:
+        for message_data in parser.feed(chunk):
+            yield message_data
+    for message_data in parser.close():
+        yield message_data
+
+
 if __name__ == "__main__":
     save_folder = "千牛复制数据解析"
     result = read_clipboard_content(save_folder)
@@ -276,3 +379,10 @@ if __name__ == "__main__":
     print(result)
     print("\n解析后的JSON格式:")
     print(json.dumps(chat_json, ensure_ascii=False, indent=2))
+
+    # 合并到解析消息存储，重复复制的片段只保存一次
+    from message_dedup import merge_new_messages, open_chat_archive
+    index, store = open_chat_archive()
+    with index, store:
+        new_messages = merge_new_messages(chat_json, index, store)
+    print(f"\n新增 {len(new_messages)} 条消息，跳过重复 {len(chat_json) - len(new_messages)} 条")
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批量重新解析归档的剪贴板内容
+解析规则修改后，用进程池把整个目录重新跑一遍 parse_qianniu_chat_to_json，
+结果去重后流式写入一个JSONL文件
+先写入 输出文件.tmp，全部完成后才替换原输出；单个文件读取或解析失败只记入错误列表，不中断整批
+
+支持的输入：
+    *.txt    - 保存下来的原始剪贴板文本（保留 \\r\\n）
+    *.jsonl  - Hook 保存的记录（取 content 字段；窗口文本记录只有新增部分，按 reset 拼成整段再解析）
+    *.json   - 旧版 Hook 保存的记录列表（取 content 字段）
+
+用法：
+    python reparse_archive.py 归档目录 -o reparsed_messages.jsonl -j 4
+"""
+
+import argparse
+import json
+import os
+import time
+from multiprocessing import Pool
+
+from chat_records import to_records
+from chat_timestamps import get_year_window, use_year_window
+from message_dedup import MessageDedupIndex, tag_recalls
+from message_store import JsonlMessageStore, iter_messages
+from readcliper import parse_qianniu_chat_to_json
+
+RAW_TEXT_EXTENSIONS = ('.txt',)
+RECORD_EXTENSIONS = ('.jsonl', '.json')
+
+
+def _parse_task(task):
+    """
+    子进程：解析一个任务，返回 (来源, 输入条数, 消息列表, 错误列表)，消息为紧凑的 ChatMessage
+    读取或解析失败的文本跳过，错误信息放进错误列表
+    """
+    kind, source, payload, year_window = task
+    # 年份范围作为参数传入，spawn 方式启动的子进程不会继承主进程里的 set_year_window
+    use_year_window(year_window)
+    if kind == 'error':
+        return source, 0, [], [payload]
+    if kind == 'file':
+        try:
+            # newline='' 保留原始的 \r\n，解析依赖它分行
+            with open(source, 'r', encoding='utf-8', newline='') as f:
+                texts = [f.read()]
+        except (OSError, UnicodeDecodeError) as e:
+            return source, 0, [], [f"读取失败: {e}"]
+    else:
+        texts = payload
+
+    messages = []
+    errors = []
+    for text in texts:
+        try:
+            text_messages = parse_qianniu_chat_to_json(text)
+            # 撤回按各自文本里的位置区分，与 Hook 去重时的键相同
+            tag_recalls(text_messages)
+            messages.extend(to_records(text_messages))
+        except Exception as e:
+            errors.append(f"解析失败: {type(e).__name__}: {e}")
+    return source, len(texts), messages, errors
+
+
+def _iter_record_contents(path):
+    """
+    逐条读取记录文件中的 content 字段
+    窗口文本记录（带 reset 字段）是新增部分，一条消息可能跨两条记录：
+    同一段（到下一个 reset 为止）的新增部分依次拼接成窗口全文，作为一段文本产出
+    """
+    if path.endswith('.jsonl'):
+        records = iter_messages(path)
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            records = json.load(f)
+    segment = []
+    for record in records:
+        if not isinstance(record, dict) or not record.get('content'):
+            continue
+        if 'reset' in record:
+            if record['reset'] and segment:
+                yield ''.join(segment)
+                segment = []
+            segment.append(record['content'])
+            continue
+        if segment:
+            yield ''.join(segment)
+            segment = []
+        yield record['content']
+    if segment:
+        yield ''.join(segment)
+
+
+def iter_tasks(input_dir, batch_size=200):
+    """
+    遍历目录，生成解析任务；记录文件按 batch_size 条一批拆分
+    记录文件读取失败时生成一个 'error' 任务，已读到的批次照常解析
+    """
+    for root, dirs, files in os.walk(input_dir):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            if name.endswith(RAW_TEXT_EXTENSIONS):
+                yield 'file', path, None
+            elif name.endswith(RECORD_EXTENSIONS):
+                batch = []
+                try:
+                    for content in _iter_record_contents(path):
+                        batch.append(content)
+                        if len(batch) >= batch_size:
+                            yield 'texts', path, batch
+                            batch = []
+                except (OSError, ValueError) as e:
+                    # UnicodeDecodeError 和 JSON 格式错误都是 ValueError
+                    yield 'error', path, f"读取失败: {e}"
+                if batch:
+                    yield 'texts', path, batch
+
+
+def reparse_archive(input_dir, output_file, workers=None, batch_size=200):
+    """
+    重新解析目录下所有归档，去重后写入 output_file
+    先写入 output_file + '.tmp'，整批完成后才替换已有的 output_file，中途出错时原输出保持不变
+    返回统计信息字典，errors 为 [(来源, 错误信息)]
+    """
+    tmp_output = output_file + '.tmp'
+    if os.path.exists(tmp_output):
+        os.remove(tmp_output)
+
+    stats = {'inputs': 0, 'parsed': 0, 'written': 0, 'errors': []}
+    index = MessageDedupIndex(filename=None)
+    started = time.perf_counter()
+
+    try:
+        with Pool(processes=workers) as pool, JsonlMessageStore(tmp_output, fsync_every=1000) as store:
+            # imap 按任务顺序返回结果，输出顺序稳定；结果一到就写入，不在内存中堆积
+            year_window = get_year_window()
+            tasks = (task + (year_window,) for task in iter_tasks(input_dir, batch_size))
+            for source, count, messages, errors in pool.imap(_parse_task, tasks):
+                stats['inputs'] += count
+                stats['parsed'] += len(messages)
+                stats['errors'].extend((source, error) for error in errors)
+                for message_data in messages:
+                    if index.add(message_data):
+                        store.append(message_data.to_dict())
+                        stats['written'] += 1
+    except BaseException:
+        if os.path.exists(tmp_output):
+            os.remove(tmp_output)
+        raise
+    os.replace(tmp_output, output_file)
+
+    stats['seconds'] = round(time.perf_counter() - started, 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量重新解析归档的千牛剪贴板内容")
+    parser.add_argument('input_dir', help='归档目录（.txt 原始文本 / .jsonl / .json 记录）')
+    parser.add_argument('-o', '--output', default='reparsed_messages.jsonl', help='输出JSONL文件')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='进程数，默认CPU核数')
+    parser.add_argument('--batch-size', type=int, default=200, help='记录文件每个任务包含的记录数')
+    args = parser.parse_args()
+
+    stats = reparse_archive(args.input_dir, args.output, args.workers, args.batch_size)
+    print(f"输入 {stats['inputs']} 段文本，解析出 {stats['parsed']} 条消息，"
+          f"去重后写入 {stats['written']} 条到 {args.output}，耗时 {stats['seconds']} 秒")
+    if stats['errors']:
+        print(f"⚠️ {len(stats['errors'])} 个输入读取或解析失败，已跳过：")
+        for source, error in stats['errors']:
+            print(f"  {source}: {error}")
+
+
+if __name__ == "__main__":
+    main()
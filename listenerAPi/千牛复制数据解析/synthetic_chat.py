@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+千牛聊天记录合成数据
+按 parse_qianniu_chat_to_json 支持的所有格式随机生成聊天文本，用于基准测试和回放：
+    - 用户名直接连接时间（无空格）：mob649e8168b4062025-03-14 06:54:26
+    - 用户名 空格 时间：tb123456 2025-9-19 17:56:53
+    - 两行格式：用户名一行，时间一行
+    - 转交：服务助手 --> 客服小王 2025-9-19 17:56:53
+    - 撤回：tb123456 撤回了一条消息
+    - 已读/未读/发送中 状态行、URL 行、需要跳过的系统提示
+"""
+
+import random
+
+CUSTOMER_COUNT = 2000
+AGENTS = ['店小二:小王', '店小二:小李', '店小二:阿杰']
+
+BODY_LINES = [
+    '亲，在的呢', '这个商品什么时候发货', '好的 谢谢', '价格还能优惠吗？', '有现货吗',
+    '订单号 3921456678123', '麻烦帮我改一下地址', '亲，已经为您备注了哦', '收到',
+    '尺码偏大还是偏小', '可以开发票吗', '已经发货了，请耐心等待', '我想退货',
+]
+URL_LINES = [
+    'https://item.taobao.com/item.htm?id=6823456789',
+    '`https://detail.tmall.com/item.htm?id=7012345678`',
+    'http://img.alicdn.com/imgextra/i1/123/abc.jpg',
+]
+SKIP_LINES = [
+    '当前用户来自', '商品详情页', '商品推荐', '这些非常适合您的商品可以一起看看～～',
+    '由 服务助手 转交给', '原因：【离线留言自动分配】', '千牛', '¥', '¥129.00', '电影票优惠',
+]
+STATUS_LINES = ['已读', '未读', '发送中']
+
+
+def _timestamp(rng):
+    return (f"2025-{rng.randint(1, 12)}-{rng.randint(1, 28)} "
+            f"{rng.randint(0, 23)}:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}")
+
+
+def _username(rng):
+    if rng.random() < 0.6:
+        return f"tb{rng.randint(1, CUSTOMER_COUNT) + 10000000}"
+    return rng.choice(AGENTS)
+
+
+def iter_message_lines(rng):
+    """生成一条消息的所有行"""
+    kind = rng.random()
+    if kind < 0.03:
+        yield f"{_username(rng)} 撤回了一条消息"
+        return
+    if kind < 0.25:
+        # 用户名直接连接时间
+        yield _username(rng) + _timestamp(rng)
+    elif kind < 0.35:
+        # 两行格式
+        yield _username(rng)
+        yield _timestamp(rng)
+    elif kind < 0.40:
+        yield f"服务助手 --> {rng.choice(AGENTS)} {_timestamp(rng)}"
+    else:
+        yield f"{_username(rng)} {_timestamp(rng)}"
+
+    for _ in range(rng.randint(1, 4)):
+        yield rng.choice(BODY_LINES)
+    if rng.random() < 0.2:
+        yield rng.choice(URL_LINES)
+    if rng.random() < 0.15:
+        yield rng.choice(SKIP_LINES)
+    if rng.random() < 0.8:
+        yield rng.choice(STATUS_LINES)
+    if rng.random() < 0.5:
+        yield ''
+
+
+def iter_transcript_lines(line_count, seed=0):
+    """生成 line_count 行聊天记录"""
+    rng = random.Random(seed)
+    produced = 0
+    while produced < line_count:
+        for line in iter_message_lines(rng):
+            yield line
+            produced += 1
+            if produced >= line_count:
+                return
+
+
+def generate_transcript(line_count, seed=0):
+    """生成 line_count 行聊天记录，使用剪贴板的 \\r\\n 换行"""
+    return '\r\n'.join(iter_transcript_lines(line_count, seed))
+
+
+if __name__ == "__main__":
+    print(generate_transcript(40))
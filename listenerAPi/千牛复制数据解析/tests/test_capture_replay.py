@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+import tempfile
+
+from capture_replay import KIND_WINDOW_TEXT, generate_events, replay_events, replay_settings
+from message_store import iter_messages
+
+
+def test_window_replay_keeps_all_text(tmp_path):
+    events = generate_events(60, interval=0.001, kind=KIND_WINDOW_TEXT, lines_per_event=5)
+    # 不限速注入，多次追加会在两次轮询之间合并
+    report = replay_events(events, speed=0, settings=replay_settings(str(tmp_path), poll_interval=0.02))
+    records = list(iter_messages(report['messages_file']))
+    assert report['missed'] > 0
+    assert ''.join(record['content'] for record in records) == ''.join(event['content'] for event in events)
+
+
+def test_clipboard_replay_credits_the_event_read(tmp_path):
+    events = generate_events(40, interval=0.001, lines_per_event=3, window_lines=6)
+    report = replay_events(events, speed=0, settings=replay_settings(str(tmp_path), poll_interval=0.02))
+    records = list(iter_messages(report['messages_file']))
+    assert records
+    # 读到的内容必须属于记下的那个事件，不能被算到之后注入的事件上
+    for record in records:
+        assert record['content'] == events[record['replay_event']]['content']
+
+
+def test_replay_defaults_to_temp_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    temp_root = tmp_path / 'temp'
+    temp_root.mkdir()
+    monkeypatch.setattr(tempfile, 'tempdir', str(temp_root))
+    report = replay_events(generate_events(3, interval=0.001), speed=0, poll_interval=0.02)
+    assert report['captured'] > 0
+    # 临时目录在回放结束后删除
+    assert report['messages_file'] is None
+    assert list(temp_root.iterdir()) == []
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['temp']
@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import subprocess
+import sys
+from datetime import datetime
+
+import pytest
+
+import chat_archive_sqlite
+from chat_archive_sqlite import SqliteChatArchive, normalize_timestamp
+
+
+def test_normalize_matches_chat_timestamps():
+    assert normalize_timestamp(' 2025-9-2 8:05:00 ') == '2025-09-02 08:05:00'
+    assert normalize_timestamp(datetime(2025, 9, 2, 8, 5)) == '2025-09-02 08:05:00'
+    for invalid in ('2025-13-01 10:00:00', '2025-01-40 10:00:00', '2025-2-30 10:00:00', '1999-01-01 10:00:00'):
+        assert normalize_timestamp(invalid) is None
+
+
+def test_invalid_query_bounds_rejected(tmp_path):
+    with SqliteChatArchive(str(tmp_path / 'chat.db')) as archive:
+        archive.add({'username': 'tb1', 'timestamp': '2025-9-2 8:05:00', 'message': '你好'})
+        assert len(list(archive.query(start='2025-9-1 0:00:00', end='2025-9-3 0:00:00'))) == 1
+        with pytest.raises(ValueError):
+            archive.query(start='2025-13-01 0:00:00')
+
+    result = subprocess.run([sys.executable, chat_archive_sqlite.__file__, '--db', str(tmp_path / 'chat.db'),
+                             'query', '--end', '2025-9-40 0:00:00'], capture_output=True, text=True)
+    assert result.returncode == 2
+    assert '无法识别的时间' in result.stderr
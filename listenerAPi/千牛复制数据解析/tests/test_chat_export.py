@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+import os
+
+from chat_export import ChatColumnarExporter
+
+
+def _messages(days, per_day):
+    for day in range(1, days + 1):
+        for minute in range(per_day):
+            yield {'username': 'tb1', 'timestamp': f'2025-01-{day:02d} 10:{minute:02d}:00', 'message': '你好'}
+
+
+def test_buffered_rows_capped(tmp_path):
+    exporter = ChatColumnarExporter(str(tmp_path), 'csv', chunk_size=1000, max_buffered_rows=10)
+    peak = 0
+    for message_data in _messages(days=20, per_day=6):
+        exporter.add(message_data)
+        peak = max(peak, sum(len(rows) for rows in exporter._buffers.values()))
+    exporter.close()
+    assert peak <= 10
+    # 按时间顺序输入时每天只写一个分块
+    folders = sorted(os.listdir(tmp_path))
+    assert len(folders) == 20
+    assert all(os.listdir(tmp_path / folder) == ['part-00000.csv'] for folder in folders)
+    lines = sum(len(open(tmp_path / folder / 'part-00000.csv', encoding='utf-8').read().splitlines()) - 1
+                for folder in folders)
+    assert lines == exporter.rows == 120
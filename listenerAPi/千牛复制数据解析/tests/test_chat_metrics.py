@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from chat_metrics import ServiceMetrics
+
+
+def _agent(message, status='未读'):
+    return {'username': '店铺:小王', 'timestamp': '2025-01-01 10:01:00', 'message': message, 'status': status}
+
+
+def test_restart_keeps_current_customer(tmp_path):
+    snapshot_file = str(tmp_path / 'metrics.json')
+    metrics = ServiceMetrics()
+    metrics.add({'username': 'tb1', 'timestamp': '2025-01-01 10:00:00', 'message': '在吗'})
+    metrics.save(snapshot_file)
+
+    metrics = ServiceMetrics.load(snapshot_file)
+    metrics.add(_agent('在的'))
+    snapshot = metrics.snapshot()
+    assert snapshot['customers']['tb1']['unread'] == 1
+    assert snapshot['customers']['tb1']['responses'] == 1
+    assert snapshot['unread_total'] == 1
+
+
+def test_unknown_customer_not_in_totals():
+    metrics = ServiceMetrics()
+    metrics.add(_agent('您好'))
+    metrics.add(_agent('请问有什么可以帮您'))
+    snapshot = metrics.snapshot()
+    assert snapshot['unread_total'] == sum(stats['unread'] for stats in snapshot['customers'].values()) == 0
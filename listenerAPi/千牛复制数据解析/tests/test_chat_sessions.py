@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+import time
+
+from chat_sessions import ConversationSessionizer, iter_conversations
+
+
+def _message(username, timestamp, message='你好'):
+    return {'username': username, 'timestamp': timestamp, 'message': message, 'status': None}
+
+
+def test_out_of_order_customers_are_not_split():
+    # tbA 的消息时间比 tbB 晚一天，但先出现（历史记录粘贴、导出会话）
+    messages = [
+        _message('tbA', '2025-01-02 10:00:00'),
+        _message('店铺:小王', '2025-01-02 10:01:00'),
+        _message('tbA', '2025-01-02 10:02:00'),
+        _message('tbB', '2025-01-01 09:00:00'),
+        _message('tbB', '2025-01-01 09:01:00'),
+        _message('店铺:小李', '2025-01-01 09:02:00'),
+        _message('tbB', '2025-01-01 09:03:00'),
+        _message('tbB', '2025-01-01 09:04:00'),
+    ]
+    conversations = list(iter_conversations(messages, idle_gap=1800))
+    by_customer = {c['customer']: c for c in conversations}
+    assert len(conversations) == 2
+    assert by_customer['tbA']['message_count'] == 3
+    assert by_customer['tbB']['message_count'] == 5
+    assert by_customer['tbB']['start'] == '2025-01-01 09:00:00'
+    assert by_customer['tbB']['end'] == '2025-01-01 09:04:00'
+    assert by_customer['tbB']['agents'] == ['店铺:小李']
+
+
+def test_interleaved_customers_split_on_own_gap():
+    messages = [
+        _message('tbA', '2025-01-01 10:00:00'),
+        _message('tbB', '2025-01-01 08:00:00'),
+        _message('tbA', '2025-01-01 10:10:00'),
+        _message('tbB', '2025-01-01 08:05:00'),
+        # tbA 自己隔了两小时，开始新会话
+        _message('tbA', '2025-01-01 12:10:00'),
+        _message('tbB', '2025-01-01 08:06:00'),
+    ]
+    conversations = list(iter_conversations(messages, idle_gap=1800))
+    counts = sorted((c['customer'], c['message_count']) for c in conversations)
+    assert counts == [('tbA', 1), ('tbA', 2), ('tbB', 3)]
+
+
+def test_idle_sessions_expire_by_arrival_time():
+    now = [0.0]
+    closed = []
+    sessionizer = ConversationSessionizer(idle_gap=60, on_close=closed.append, clock=lambda: now[0])
+    sessionizer.add(_message('tbA', '2025-01-01 10:00:00'))
+    now[0] = 30
+    sessionizer.add(_message('tbB', '2025-01-01 10:00:30'))
+    assert closed == []
+    now[0] = 100
+    sessionizer.add(_message('tbB', '2025-01-01 10:01:00'))
+    assert [c['customer'] for c in closed] == ['tbA']
+    assert len(sessionizer) == 1
+
+
+def test_max_open_closes_least_recently_active():
+    sessionizer = ConversationSessionizer(idle_gap=1800, max_open=2)
+    sessionizer.add(_message('tbA', '2025-01-01 10:00:00'))
+    sessionizer.add(_message('tbB', '2025-01-01 10:00:00'))
+    sessionizer.add(_message('tbA', '2025-01-01 10:01:00'))
+    closed = sessionizer.add(_message('tbC', '2025-01-01 10:02:00'))
+    assert [c['customer'] for c in closed] == ['tbB']
+
+
+def test_expire_closes_quiet_sessions_without_new_messages():
+    now = [0.0]
+    closed = []
+    sessionizer = ConversationSessionizer(idle_gap=60, on_close=closed.append, clock=lambda: now[0])
+    sessionizer.add(_message('tbA', '2025-01-01 10:00:00'))
+    now[0] = 30
+    sessionizer.add(_message('tbB', '2025-01-01 10:00:30'))
+    assert sessionizer.expire() == []
+    # 之后没有任何消息，tbA 空闲超过 idle_gap
+    now[0] = 70
+    assert [c['customer'] for c in sessionizer.expire()] == ['tbA']
+    assert [c['customer'] for c in sessionizer.expire(now=200)] == ['tbB']
+    assert len(closed) == 2 and len(sessionizer) == 0
+
+
+def test_engine_expires_quiet_sessions_while_idle(tmp_path):
+    from capture_replay import replay_settings
+    from hook_core import CaptureBackend, HookEngine
+    from message_store import iter_messages
+
+    class IdleCapture(CaptureBackend):
+        source = 'idle'
+        record_type = 'qianniu_chat'
+
+        def read(self, timeout):
+            time.sleep(timeout)
+            return None
+
+    conversations_file = str(tmp_path / 'conversations.jsonl')
+    engine = HookEngine(replay_settings(str(tmp_path), conversations_file=conversations_file,
+                                        session_idle_gap=0.05, poll_interval=0.01))
+    engine.handle('tbA 2025-01-01 10:00:00\r\n你好\r\n', record_type='qianniu_chat')
+    engine.start(IdleCapture())
+    deadline = time.monotonic() + 5
+    while engine.sessionizer.closed == 0 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # 没有新消息，会话在采集空闲时结束，而不是等到 stop
+    assert engine.sessionizer.closed == 1
+    engine.stop()
+    assert [c['customer'] for c in iter_messages(conversations_file)] == ['tbA']
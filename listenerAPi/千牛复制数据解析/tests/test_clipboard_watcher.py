@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+import pytest
+
+import clipboard_watcher
+from clipboard_watcher import ClipboardBackend, FakeClipboardBackend, create_clipboard_backend
+from hook_core import ClipboardCapture
+
+
+def test_fake_wait_wakes_on_change():
+    backend = FakeClipboardBackend()
+    sequence = backend.get_sequence()
+    timer = threading.Timer(0.05, backend.set_text, args=('tb1 2025-01-01 10:00:00',))
+    timer.start()
+    started = time.monotonic()
+    new_sequence = backend.wait_for_change(sequence, 5)
+    # 不按固定间隔轮询，复制后立即返回
+    assert time.monotonic() - started < 1
+    assert new_sequence != sequence
+    assert backend.text_for_sequence(new_sequence) == 'tb1 2025-01-01 10:00:00'
+    assert backend.wait_for_change(new_sequence, 0.05) is None
+
+
+def test_polling_wait_returns_changed_sequence():
+    class CountingBackend(ClipboardBackend):
+        poll_interval = 0.01
+
+        def __init__(self):
+            self.calls = 0
+
+        def get_sequence(self):
+            self.calls += 1
+            return self.calls // 3
+
+        def read_text(self):
+            return 'text'
+
+    backend = CountingBackend()
+    assert backend.wait_for_change(0, 1) == 1
+    assert backend.text_for_sequence(1) == 'text'
+    assert backend.wait_for_change(backend.get_sequence(), 0) is None
+
+
+def test_clipboard_capture_skips_unchanged_text():
+    backend = FakeClipboardBackend()
+    capture = ClipboardCapture(backend)
+    assert capture.read(0.01) is None
+    backend.set_text('你好')
+    assert capture.read(0.01) == ('你好', '你好')
+    # 重新复制同样的内容，序号变了但文本没变
+    backend.set_text('你好')
+    assert capture.read(0.01) is None
+
+
+def test_backend_selection(monkeypatch):
+    assert isinstance(create_clipboard_backend('fake'), FakeClipboardBackend)
+
+    class Available(FakeClipboardBackend):
+        name = 'pyperclip'
+
+    def unavailable():
+        raise ImportError('missing')
+
+    monkeypatch.setattr(clipboard_watcher.sys, 'platform', 'linux')
+    monkeypatch.setattr(clipboard_watcher, 'PyperclipBackend', Available)
+    monkeypatch.setattr(clipboard_watcher, 'PowerShellBackend', unavailable)
+    assert isinstance(create_clipboard_backend(), Available)
+
+    monkeypatch.setattr(clipboard_watcher, 'PyperclipBackend', unavailable)
+    with pytest.raises(RuntimeError):
+        create_clipboard_backend()
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+from capture_replay import replay_settings
+from export_session import KEY_COPY, ExportCheckpoint, ExportSession, FakeKeySender
+from hook_core import HookEngine
+
+
+def _transcript(customer):
+    return f"{customer} 2025-01-01 10:00:00\r\n你好，我是{customer}\r\n"
+
+
+class FlakyKeySender(FakeKeySender):
+    """指定客户的前几次 Ctrl+C 不更新剪贴板"""
+
+    def __init__(self, transcripts, fail_customer, fail_times):
+        super().__init__(transcripts)
+        self.fail_customer = fail_customer
+        self.fail_times = fail_times
+
+    def send(self, keys):
+        if keys == KEY_COPY and self.fail_customer in self.transcripts[self.position] and self.fail_times:
+            self.fail_times -= 1
+            self.sent.append(keys)
+            return
+        super().send(keys)
+
+
+def _session(tmp_path, keys, **options):
+    engine = HookEngine(replay_settings(str(tmp_path / 'out')))
+    checkpoint = ExportCheckpoint(str(tmp_path / 'checkpoint.jsonl'))
+    return ExportSession(keys, keys.clipboard, engine, checkpoint, copy_timeout=0.01,
+                         copy_retries=0, retry_delay=0, end_after=2, **options)
+
+
+def test_failed_customer_retried_from_top(tmp_path):
+    customers = ['tb1', 'tb2', 'tb3', 'tb4']
+    keys = FlakyKeySender([_transcript(c) for c in customers], 'tb2', fail_times=1)
+    session = _session(tmp_path, keys)
+    session.run()
+    session.close()
+    assert session.checkpoint.done == set(customers)
+    assert session.failures == []
+    assert session.failed == 1
+
+
+def test_resume_skips_by_customer_after_reorder(tmp_path):
+    customers = ['tb1', 'tb2', 'tb3', 'tb4']
+    session = _session(tmp_path, FakeKeySender([_transcript(c) for c in customers]))
+    session.run(max_customers=2)
+    session.close()
+    assert session.checkpoint.done == {'tb1', 'tb2'}
+
+    # 客户有新消息后排到了列表最前面
+    reordered = ['tb4', 'tb1', 'tb3', 'tb2']
+    session = _session(tmp_path, FakeKeySender([_transcript(c) for c in reordered]))
+    session.run()
+    session.close()
+    assert session.checkpoint.done == set(customers)
+    assert session.exported == 2
+    assert session.skipped == 2
+    assert not any(key.startswith('{DOWN ') for key in session.keys.sent)
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+from capture_replay import replay_settings
+from chat_archive_sqlite import SqliteChatArchive
+from hook_core import HookEngine
+
+
+def test_sqlite_archive_setting(tmp_path):
+    db_file = str(tmp_path / 'chat.db')
+    engine = HookEngine(replay_settings(str(tmp_path), sqlite_archive_file=db_file))
+    engine.handle('tb1 2025-01-01 10:00:00\r\n你好\r\ntb2 2025-01-01 10:01:00\r\n在吗\r\n')
+    engine.stop()
+    with SqliteChatArchive(db_file) as archive:
+        assert archive.customers() == [('tb1', 1), ('tb2', 1)]
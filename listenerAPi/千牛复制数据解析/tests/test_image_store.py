@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pytest
+
+Image = pytest.importorskip('PIL.Image')
+
+from image_store import ClipboardImageStore
+
+
+def test_put_returns_name_after_file_written(tmp_path):
+    store = ClipboardImageStore(str(tmp_path))
+    try:
+        image = Image.new('RGB', (4, 4), 'red')
+        filename = store.put(image)
+        assert os.path.exists(os.path.join(str(tmp_path), filename))
+        # 相同像素复用同一个文件
+        assert store.put(image.copy()) == filename
+        assert store.stats()['saved'] == 1
+        assert store.stats()['reused'] == 1
+    finally:
+        store.close()
+
+
+def test_failed_encode_returns_no_name(tmp_path, monkeypatch):
+    store = ClipboardImageStore(str(tmp_path))
+    try:
+        def broken_save(self, *args, **kwargs):
+            raise OSError('磁盘已满')
+        monkeypatch.setattr(Image.Image, 'save', broken_save)
+        image = Image.new('RGB', (4, 4), 'blue')
+        future = store.submit(image)
+        # 编码失败时不给文件名，消息不会引用不存在的文件
+        assert future.result() is None
+        assert os.listdir(str(tmp_path)) == []
+        assert store.stats()['failed'] == 1
+
+        # 失败的图片不算已保存，下次复制会重新编码
+        monkeypatch.undo()
+        filename = store.put(image)
+        assert os.path.exists(os.path.join(str(tmp_path), filename))
+    finally:
+        store.close()
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from message_dedup import MessageDedupIndex
+from message_pipeline import MessagePipeline
+from readcliper import parse_qianniu_chat_to_json
+
+PASTE = '\r\n'.join([
+    'tb1 2025-01-01 10:00:00',
+    '你好',
+    'tb1 撤回了一条消息',
+    '店铺:小王 2025-01-01 10:01:00',
+    '在的',
+    'tb1 撤回了一条消息',
+    'tb1 撤回了一条消息',
+])
+
+
+def test_recalls_by_same_user_are_kept():
+    index = MessageDedupIndex(filename=None)
+    stored = []
+    pipeline = MessagePipeline(message_sinks=[stored.append], parse=parse_qianniu_chat_to_json, dedup_index=index)
+    pipeline.start()
+    pipeline.submit({'content': PASTE})
+    # 再复制一次同样的内容，不会重复保存
+    pipeline.submit({'content': PASTE})
+    assert pipeline.stop(5)
+    recalls = [m for m in stored if m['timestamp'] is None]
+    assert len(recalls) == 3
+    assert len(stored) == 5
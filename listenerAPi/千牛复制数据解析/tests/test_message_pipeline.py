@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+import threading
+import time
+
+from message_dedup import MessageDedupIndex
+from message_pipeline import POLICY_DROP_NEWEST, POLICY_DROP_OLDEST, MessagePipeline
+
+
+def _messages(count):
+    return [{'username': 'tb1', 'timestamp': f'2025-01-01 10:00:{i:02d}', 'message': f'消息{i}', 'status': None}
+            for i in range(count)]
+
+
+def _run(index, policy, release, stored):
+    """主存储在 release 之前一直阻塞，队列只能放一条"""
+    def store(message_data):
+        release.wait(5)
+        stored.append(message_data)
+
+    pipeline = MessagePipeline(message_sinks=[store], parse=lambda content: _messages(10),
+                               dedup_index=index, queue_size=1, policy=policy)
+    pipeline.start()
+    pipeline.submit({'content': 'x'})
+    return pipeline
+
+
+def _drop_run(policy):
+    index = MessageDedupIndex(filename=None)
+    stored = []
+    release = threading.Event()
+    pipeline = _run(index, policy, release, stored)
+    # 等流水线把消息分发完（大部分被丢弃），再放行主存储
+    while pipeline.stats()['processed'] < 1:
+        threading.Event().wait(0.01)
+    release.set()
+    assert pipeline.stop(5)
+    return index, stored
+
+
+def test_dropped_messages_are_not_indexed():
+    for policy in (POLICY_DROP_NEWEST, POLICY_DROP_OLDEST):
+        index, stored = _drop_run(policy)
+        assert 0 < len(stored) < 10
+        # 只有真正写入的消息登记到索引
+        assert len(index) == len(stored)
+        assert all(message_data in index for message_data in stored)
+
+
+def test_dropped_messages_are_delivered_on_next_copy():
+    index, stored = _drop_run(POLICY_DROP_NEWEST)
+    release = threading.Event()
+    release.set()
+    pipeline = MessagePipeline(message_sinks=[stored.append], parse=lambda content: _messages(10),
+                               dedup_index=index, queue_size=100)
+    pipeline.start()
+    pipeline.submit({'content': 'x'})
+    assert pipeline.stop(5)
+    assert sorted(m['message'] for m in stored) == sorted(m['message'] for m in _messages(10))
+    assert len(index) == 10
+
+
+def test_failed_store_write_is_not_indexed():
+    index = MessageDedupIndex(filename=None)
+
+    def failing_store(message_data):
+        raise OSError('disk full')
+
+    pipeline = MessagePipeline(message_sinks=[failing_store], parse=lambda content: _messages(3), dedup_index=index)
+    pipeline.start()
+    pipeline.submit({'content': 'x'})
+    assert pipeline.stop(5)
+    assert len(index) == 0
+    assert pipeline.stats()['errors'] == 3
+
+
+def test_stop_reports_unfinished_sinks():
+    release = threading.Event()
+    pipeline = MessagePipeline(message_sinks=[lambda message_data: release.wait(5)],
+                               parse=lambda content: _messages(1))
+    pipeline.start()
+    pipeline.submit({'content': 'x'})
+    assert not pipeline.stop(0.1)
+    release.set()
+    assert pipeline.stop(5)
+
+
+def test_stop_times_out_when_capture_queue_full():
+    release = threading.Event()
+    pipeline = MessagePipeline(record_sinks=[lambda record: release.wait(5)], queue_size=1)
+    pipeline.start()
+    # 输出卡住后处理线程卡在放入输出队列，采集队列被填满，提交线程也阻塞
+    submitter = threading.Thread(target=lambda: [pipeline.submit({'content': 'x'}) for _ in range(10)], daemon=True)
+    submitter.start()
+    while not pipeline.capture_channel.queue.full() or pipeline.stats()['processed'] < 2:
+        time.sleep(0.01)
+    started = time.monotonic()
+    assert not pipeline.stop(0.2)
+    assert time.monotonic() - started < 1
+    release.set()
+
+
+def test_secondary_sinks_only_get_committed_messages():
+    index = MessageDedupIndex(filename=None)
+    failures = [OSError('disk full')]
+    counted = []
+
+    def flaky_store(message_data):
+        if failures:
+            raise failures.pop()
+
+    pipeline = MessagePipeline(message_sinks=[flaky_store, counted.append], parse=lambda content: _messages(1),
+                               dedup_index=index)
+    pipeline.start()
+    # 第一次写入失败，键被释放；同样的内容再复制一次才写入
+    pipeline.submit({'content': 'x'})
+    while pipeline.stats()['errors'] < 1:
+        time.sleep(0.01)
+    pipeline.submit({'content': 'x'})
+    assert pipeline.stop(5)
+    assert len(index) == 1
+    assert counted == _messages(1)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+"""
+解析结果回归测试：fixtures 里的 *.json 是重写前的 parse_qianniu_chat_to_json 对同名 *.txt 的输出，
+分类规则、组装器或并行切分改动后结果必须完全一致
+"""
+import json
+import os
+
+import pytest
+
+from parallel_parse import parse_qianniu_chat_parallel, split_transcript
+from readcliper import parse_qianniu_chat_to_json
+
+FIXTURE_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURES = sorted(name[:-4] for name in os.listdir(FIXTURE_DIR) if name.endswith('.txt'))
+
+
+def _load(name):
+    with open(os.path.join(FIXTURE_DIR, name + '.txt'), 'r', encoding='utf-8', newline='') as f:
+        text = f.read()
+    with open(os.path.join(FIXTURE_DIR, name + '.json'), 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+    return text, expected
+
+
+@pytest.mark.parametrize('name', FIXTURES)
+def test_serial_matches_fixture(name):
+    text, expected = _load(name)
+    assert parse_qianniu_chat_to_json(text) == expected
+
+
+@pytest.mark.parametrize('name', FIXTURES)
+@pytest.mark.parametrize('parts', [2, 3, 7])
+def test_split_chunks_match_fixture(name, parts):
+    text, expected = _load(name)
+    messages = []
+    for chunk in split_transcript(text, parts):
+        messages.extend(parse_qianniu_chat_to_json(chunk))
+    assert messages == expected
+
+
+def test_parallel_matches_fixture():
+    text, expected = _load('paste_synthetic')
+    assert len(split_transcript(text, 3)) == 3
+    assert parse_qianniu_chat_parallel(text, workers=3, min_chunk_chars=1) == expected
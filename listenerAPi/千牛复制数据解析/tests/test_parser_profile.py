@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+from parser_profile import ParserProfile
+from readcliper import parse_qianniu_chat_to_json
+from synthetic_chat import generate_transcript
+
+KNOWN_PASTE = '\r\n'.join([
+    'tb111 2025-01-02 10:00:00',                # header
+    '你好',                                      # body
+    'mob6492025-01-02 10:01:00',                # glued_header
+    'https://item.taobao.com/item.htm?id=1',    # url
+    '已读',                                      # status
+    '店铺:小王 2025-01-02 10:02:00',             # header
+    '¥129.00',                                  # skip
+    '服务助手 --> 客服小王 2025-01-02 10:03:00',  # transfer
+    '',                                         # blank
+    'tb222 撤回了一条消息',                       # recall
+    'tb333',                                    # body + two_line_header
+    '2025-01-02 10:04:00',                      # body（两行格式的时间行）
+    '在吗',                                      # body
+])
+
+
+def test_rule_hits_on_known_input():
+    profile = ParserProfile()
+    messages = profile.parse(KNOWN_PASTE)
+    assert messages == parse_qianniu_chat_to_json(KNOWN_PASTE)
+    assert profile.hits == {
+        'blank': 1, 'recall': 1, 'header': 2, 'glued_header': 1, 'two_line_header': 1,
+        'transfer': 1, 'skip': 1, 'status': 1, 'url': 1, 'body': 4,
+    }
+    assert profile.lines == 13
+    assert profile.messages == len(messages) == 4
+
+
+def test_synthetic_transfers_are_counted():
+    text = generate_transcript(5000)
+    profile = ParserProfile()
+    assert profile.parse(text) == parse_qianniu_chat_to_json(text)
+    transfers = sum(1 for m in parse_qianniu_chat_to_json(text) if ' --> ' in m['username'])
+    assert profile.hits['transfer'] >= transfers > 0
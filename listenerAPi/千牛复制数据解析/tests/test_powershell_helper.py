@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+from powershell_helper import HelperError, PowerShellHelper, stub_helper_command
+
+
+@pytest.fixture
+def helper():
+    helper = PowerShellHelper(command=stub_helper_command(), timeout=10)
+    yield helper
+    helper.close()
+
+
+def test_clipboard_round_trip(helper):
+    assert helper.ping()
+    # 制表符、换行和中文都经过 base64，不会破坏按行的协议
+    text = 'tb1 2025-01-01 10:00:00\r\n你好\t在吗\n'
+    helper.set_clipboard(text)
+    assert helper.get_clipboard() == text
+    helper.send_keys('^a')
+    helper.send_keys('^c')
+    assert helper.get_clipboard() == '^a\n^c'
+    with pytest.raises(HelperError):
+        helper.call('unknown')
+    assert helper.calls == 7
+
+
+def test_restart_after_helper_dies(helper):
+    helper.set_clipboard('旧内容')
+    helper.process.kill()
+    helper.process.wait(5)
+    # 进程已退出：下一次调用重新启动（桩进程的剪贴板是新的）
+    assert helper.ping()
+    assert helper.restarts == 1
+    assert helper.get_clipboard() == ''
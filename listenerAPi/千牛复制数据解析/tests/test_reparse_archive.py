@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+import json
+
+from message_store import iter_messages
+from reparse_archive import reparse_archive
+
+
+def test_bad_files_reported_and_output_replaced(tmp_path):
+    archive = tmp_path / 'archive'
+    archive.mkdir()
+    (archive / 'a.txt').write_bytes('tb1 2025-01-01 10:00:00\r\n你好\r\n'.encode('utf-8'))
+    (archive / 'b.txt').write_bytes('tb2 2025-01-01 10:00:00\r\n你好\r\n'.encode('gbk'))
+    (archive / 'c.json').write_text('[{"content": ', encoding='utf-8')
+    output = tmp_path / 'out.jsonl'
+    output.write_text('{"old": true}\n', encoding='utf-8')
+
+    stats = reparse_archive(str(archive), str(output), workers=2)
+
+    assert sorted(source.rsplit('/', 1)[-1] for source, _ in stats['errors']) == ['b.txt', 'c.json']
+    assert [m['username'] for m in iter_messages(str(output))] == ['tb1']
+    assert not (tmp_path / 'out.jsonl.tmp').exists()
+
+
+def test_output_kept_when_run_fails(tmp_path, monkeypatch):
+    archive = tmp_path / 'archive'
+    archive.mkdir()
+    (archive / 'a.txt').write_text('tb1 2025-01-01 10:00:00\r\n你好\r\n', encoding='utf-8', newline='')
+    output = tmp_path / 'out.jsonl'
+    output.write_text('{"old": true}\n', encoding='utf-8')
+
+    def disk_full(self, message_data):
+        raise OSError('磁盘已满')
+
+    monkeypatch.setattr('message_store.JsonlMessageStore.append', disk_full)
+    try:
+        reparse_archive(str(archive), str(output), workers=1)
+    except OSError:
+        pass
+    assert output.read_text(encoding='utf-8') == '{"old": true}\n'
+    assert not (tmp_path / 'out.jsonl.tmp').exists()
+
+
+def test_window_delta_records_joined_per_segment(tmp_path):
+    archive = tmp_path / 'archive'
+    archive.mkdir()
+    deltas = [('tb1 2025-01-01 10:00:00\r\n', True), ('你好\r\ntb2 2025-01-01 10:01:00\r\n', False),
+              ('在吗\r\n', False), ('tb3 2025-01-02 09:00:00\r\n', True), ('早', False)]
+    with open(archive / 'qianniu_messages.jsonl', 'w', encoding='utf-8') as f:
+        for content, reset in deltas:
+            record = {'content': content, 'source': 'window_text', 'type': 'new_message', 'offset': 0, 'reset': reset}
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+    output = tmp_path / 'out.jsonl'
+
+    stats = reparse_archive(str(archive), str(output), workers=1, batch_size=1)
+
+    assert stats['errors'] == []
+    messages = [(m['username'], m['message']) for m in iter_messages(str(output))]
+    assert messages == [('tb1', '你好'), ('tb2', '在吗'), ('tb3', '早')]
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+from hook_core import WindowTextCapture
+
+
+def _capture_all(texts):
+    """依次把 texts 作为窗口全文读取，返回 [(新增内容, offset, reset)]"""
+    texts = iter(texts)
+    current = {'text': ''}
+
+    def read_text():
+        return current['text']
+
+    capture = WindowTextCapture(read_text, poll_interval=0)
+    results = []
+    for text in texts:
+        current['text'] = text
+        captured = capture.read(0)
+        if captured is not None:
+            metadata = capture.metadata()
+            results.append((captured[0], metadata['offset'], metadata['reset']))
+    return results
+
+
+def _rebuild(results):
+    """按 offset/reset 把保存下来的新增部分拼回窗口全文"""
+    transcript = ''
+    for content, offset, reset in results:
+        if reset:
+            transcript = ''
+        assert offset == len(transcript)
+        transcript += content
+    return transcript
+
+
+def test_deltas_rebuild_window_text():
+    texts = ['hello', 'hello\r\nb 2', 'hello\r\nb 2\r\n', 'hello\r\nb 2\r\n  \r\n', 'hello\r\nb 2\r\n  \r\nc 3 ']
+    results = _capture_all(texts)
+    # 只有空白的新增不单独保存
+    assert len(results) == 3
+    assert _rebuild(results) == texts[-1]
+
+
+def test_reset_drops_held_whitespace():
+    texts = ['tb1 2025-01-01 10:00:00\r\n你好', 'tb1 2025-01-01 10:00:00\r\n你好\r\n',
+             'tb2 2025-01-02 11:00:00\r\n在吗', 'tb2 2025-01-02 11:00:00\r\n在吗\r\n好的']
+    results = _capture_all(texts)
+    assert [reset for _, _, reset in results] == [True, True, False]
+    assert _rebuild(results) == texts[-1]
+
+
+def test_message_split_across_deltas(tmp_path):
+    from capture_replay import replay_settings
+    from hook_core import HookEngine
+    from message_store import iter_messages
+
+    settings = replay_settings(str(tmp_path))
+    engine = HookEngine(settings)
+    deltas = [('tb1 2025-01-01 10:00:00\r\n', True), ('你好\r\ntb2 2025-01-01 10:01:00\r\n', False),
+              ('在吗\r\n', False), ('tb3 2025-01-02 09:00:00\r\n', True), ('早\r\n', False)]
+    for content, reset in deltas:
+        engine.handle(content, source='window_text', record_type='new_message',
+                      extra={'offset': 0, 'reset': reset})
+    engine.stop()
+    messages = [(m['username'], m['message']) for m in iter_messages(settings.chat_file)]
+    assert messages == [('tb1', '你好'), ('tb2', '在吗'), ('tb3', '早')]
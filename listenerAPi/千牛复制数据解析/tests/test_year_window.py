@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+import multiprocessing
+
+import pytest
+
+from chat_timestamps import get_year_window, set_year_window, to_epoch
+from parallel_parse import parse_qianniu_chat_parallel
+from readcliper import parse_qianniu_chat_to_json
+
+PASTE = '\r\n'.join(['tb1 2018-05-01 10:00:00', '你好', 'tb2 2025-05-01 10:00:00', '在吗'] * 50)
+
+
+@pytest.fixture
+def wide_window():
+    original = get_year_window()
+    set_year_window(2015, 2035)
+    yield
+    set_year_window(*original)
+
+
+def test_parser_and_normalizer_share_window(wide_window):
+    messages = parse_qianniu_chat_to_json(PASTE)
+    assert messages[0]['timestamp'] == '2018-05-01 10:00:00'
+    assert to_epoch(messages[0]['timestamp']) is not None
+
+
+def test_default_window_rejects_2018():
+    assert get_year_window() == (2020, 2030)
+    assert to_epoch('2018-05-01 10:00:00') is None
+    assert all(m['username'] != 'tb1' for m in parse_qianniu_chat_to_json('tb1 2018-05-01 10:00:00\r\n你好'))
+
+
+def test_spawned_workers_use_parent_window(wide_window):
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(2) as pool:
+        messages = parse_qianniu_chat_parallel(PASTE, workers=2, pool=pool, min_chunk_chars=100)
+    assert messages == parse_qianniu_chat_to_json(PASTE)
+
+
+def test_format_detector_follows_window(wide_window):
+    from chat_format import simple_chat_detector
+
+    assert simple_chat_detector('x 2018-05-01 10:00')
+    set_year_window(2020, 2030)
+    assert not simple_chat_detector('x 2018-05-01 10:00')
+    assert simple_chat_detector('x 2025-05-01 10:00')
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+聊天窗口文本增量检测
+只记录已处理文本的长度和末尾一小段（锚点），每次只取出新追加的部分，
+不再用 current_text.replace(last_text, "") 复制和搜索整段记录。
+内存只有锚点和几个计数，与窗口运行多久无关；
+配合 offset/last_reset 可以只保存新增部分（见 HookSettings.store_full_content）。
+"""
+
+
+class TranscriptDiff:
+    """
+    追踪一段只会在末尾追加的文本（聊天窗口记录）
+
+    feed(text) 返回相对上次新增的文本：
+        - 锚点仍在原位置：只返回 text[已处理长度:]，开销与新增文本成正比
+        - 锚点位置变了（窗口滚动裁掉了前面的记录）：在全文中找锚点最后一次出现的位置
+        - 找不到锚点（切换了会话）：把全文当作新文本
+
+    每次有新文本时：
+        last_offset - 新文本在本段记录中的起始位置（各次新文本依次拼接后的偏移）
+        last_reset  - 是否开始了新的一段记录（第一次输入或切换了会话），此时 last_offset 为0
+    """
+
+    def __init__(self, anchor_size=256):
+        self.anchor_size = anchor_size
+        # 已处理文本的长度
+        self.consumed = 0
+        # 已处理文本的末尾
+        self.anchor = ""
+        # 本段记录已输出的新文本总长度
+        self.offset = 0
+        self.last_offset = 0
+        self.last_reset = False
+
+    def reset(self):
+        """清空状态，下次 feed 的全文都当作新文本"""
+        self.consumed = 0
+        self.anchor = ""
+        self.offset = 0
+
+    def _advance(self, text, new_text, reset=False):
+        self.consumed = len(text)
+        self.anchor = text[-self.anchor_size:]
+        if reset:
+            self.offset = 0
+        self.last_reset = reset
+        self.last_offset = self.offset
+        self.offset += len(new_text)
+
+    def feed(self, text):
+        """输入当前完整文本，返回新追加的文本（没有变化返回空字符串）"""
+        consumed = self.consumed
+        anchor = self.anchor
+
+        if not anchor:
+            self._advance(text, text, reset=True)
+            return text
+
+        start = consumed - len(anchor)
+        if len(text) >= consumed and text.startswith(anchor, start):
+            if len(text) == consumed:
+                return ""
+            new_text = text[consumed:]
+            self._advance(text, new_text)
+            return new_text
+
+        position = text.rfind(anchor)
+        if position >= 0:
+            new_text = text[position + len(anchor):]
+            self._advance(text, new_text)
+        else:
+            new_text = text
+            self._advance(text, new_text, reset=True)
+        return new_text